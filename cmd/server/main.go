@@ -35,6 +35,7 @@ func main() {
 	http.HandleFunc("/coverage-list", handlers.CoverageListHandler)
 	http.HandleFunc("/coverage-limits", handlers.CoverageLimitsHandler)
 	http.HandleFunc("/sub-coverage-limits", handlers.SubCoverageLimitsHandler)
+	http.HandleFunc("/insurance-comparison", handlers.InsuranceComparisonHandler)
 
 	// Legacy handlers
 	http.HandleFunc("/insurance-providers", handlers.InsuranceProvidersHandler)
@@ -6,6 +6,8 @@ import (
 	"net/http"
 	"os"
 	"path/filepath"
+	"strconv"
+	"strings"
 
 	"github.com/vf0429/Petwell_Backend/internal/models"
 
@@ -15,19 +17,36 @@ import (
 const insuranceDBPath = "database/pet_insurance.db"
 
 func OpenInsuranceDB() (*sql.DB, error) {
-	if _, err := os.Stat(insuranceDBPath); err == nil {
-		return sql.Open("sqlite3", insuranceDBPath)
+	if path, info := findInsuranceDB(); info != nil {
+		return openInsuranceFile(path, info)
+	}
+	return sql.Open("sqlite3", insuranceDBPath)
+}
+
+// findInsuranceDB looks for the database in the working directory, then next to the
+// executable. It returns a nil FileInfo when neither exists.
+func findInsuranceDB() (string, os.FileInfo) {
+	if info, err := os.Stat(insuranceDBPath); err == nil {
+		return insuranceDBPath, info
 	}
 
 	ex, err := os.Executable()
 	if err == nil {
 		path := filepath.Join(filepath.Dir(ex), insuranceDBPath)
-		if _, err := os.Stat(path); err == nil {
-			return sql.Open("sqlite3", path)
+		if info, err := os.Stat(path); err == nil {
+			return path, info
 		}
 	}
+	return "", nil
+}
 
-	return sql.Open("sqlite3", insuranceDBPath)
+// openInsuranceFile opens a read-only file (published by scripts/publish_served_db.py,
+// which replaces it instead of writing to it) as immutable: no locking or change checks.
+func openInsuranceFile(path string, info os.FileInfo) (*sql.DB, error) {
+	if info.Mode().Perm()&0222 == 0 {
+		return sql.Open("sqlite3", "file:"+path+"?mode=ro&immutable=1")
+	}
+	return sql.Open("sqlite3", path)
 }
 
 func InsuranceCompaniesHandler(w http.ResponseWriter, r *http.Request) {
@@ -35,6 +54,9 @@ func InsuranceCompaniesHandler(w http.ResponseWriter, r *http.Request) {
 	if r.Method == http.MethodOptions {
 		return
 	}
+	if serveSnapshot(w, r, "insurance-companies") {
+		return
+	}
 
 	db, err := OpenInsuranceDB()
 	if err != nil {
@@ -67,6 +89,9 @@ func InsuranceProductsHandler(w http.ResponseWriter, r *http.Request) {
 	if r.Method == http.MethodOptions {
 		return
 	}
+	if serveDelta(w, r, "insurance-products") {
+		return
+	}
 
 	db, err := OpenInsuranceDB()
 	if err != nil {
@@ -107,6 +132,9 @@ func CoverageListHandler(w http.ResponseWriter, r *http.Request) {
 	if r.Method == http.MethodOptions {
 		return
 	}
+	if serveSnapshot(w, r, "coverage-list") {
+		return
+	}
 
 	db, err := OpenInsuranceDB()
 	if err != nil {
@@ -138,6 +166,9 @@ func CoverageLimitsHandler(w http.ResponseWriter, r *http.Request) {
 	if r.Method == http.MethodOptions {
 		return
 	}
+	if serveDelta(w, r, "coverage-limits") {
+		return
+	}
 
 	db, err := OpenInsuranceDB()
 	if err != nil {
@@ -169,6 +200,9 @@ func SubCoverageLimitsHandler(w http.ResponseWriter, r *http.Request) {
 	if r.Method == http.MethodOptions {
 		return
 	}
+	if serveDelta(w, r, "sub-coverage-limits") {
+		return
+	}
 
 	db, err := OpenInsuranceDB()
 	if err != nil {
@@ -197,6 +231,92 @@ func SubCoverageLimitsHandler(w http.ResponseWriter, r *http.Request) {
 	json.NewEncoder(w).Encode(limits)
 }
 
+// InsuranceComparisonHandler serves the materialized comparison rows.
+// GET /insurance-comparison?pet_type=dog&provider_id=1 (both optional)
+func InsuranceComparisonHandler(w http.ResponseWriter, r *http.Request) {
+	EnableCors(&w)
+	if r.Method == http.MethodOptions {
+		return
+	}
+
+	db, err := OpenInsuranceDB()
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+		return
+	}
+	defer db.Close()
+
+	query := `SELECT pet_type, provider_id, product_id, coverage_id, company_name, company_name_zh,
+		insurance_name, insurance_name_zh, coverage_type, coverage_type_zh, coverage_limit, limit_remark, limit_remark_zh,
+		sub_limits, coinsurance, coinsurance_zh, coinsurance_bands, tag, tag_zh
+		FROM product_coverage_comparison WHERE 1 = 1`
+	var args []interface{}
+	if petType := r.URL.Query().Get("pet_type"); petType != "" {
+		query += " AND pet_type = ?"
+		args = append(args, strings.ToLower(petType))
+	}
+	if providerID := r.URL.Query().Get("provider_id"); providerID != "" {
+		id, err := strconv.Atoi(providerID)
+		if err != nil {
+			http.Error(w, "Invalid provider_id", http.StatusBadRequest)
+			return
+		}
+		query += " AND provider_id = ?"
+		args = append(args, id)
+	}
+	if coverageID := r.URL.Query().Get("coverage_id"); coverageID != "" {
+		id, err := strconv.Atoi(coverageID)
+		if err != nil {
+			http.Error(w, "Invalid coverage_id", http.StatusBadRequest)
+			return
+		}
+		query += " AND coverage_id = ?"
+		args = append(args, id)
+	}
+	// Typed columns from scripts/numeric_fields.py; "Unlimited" sorts above every amount
+	if minLimit := r.URL.Query().Get("min_limit"); minLimit != "" {
+		limit, err := strconv.ParseInt(minLimit, 10, 64)
+		if err != nil {
+			http.Error(w, "Invalid min_limit", http.StatusBadRequest)
+			return
+		}
+		query += " AND coverage_limit_value >= ?"
+		args = append(args, limit)
+	}
+	if age := r.URL.Query().Get("age"); age != "" {
+		years, err := strconv.ParseFloat(age, 64)
+		if err != nil {
+			http.Error(w, "Invalid age", http.StatusBadRequest)
+			return
+		}
+		query += " AND (min_age_years IS NULL OR min_age_years <= ?) AND (max_age_years IS NULL OR max_age_years >= ?)"
+		args = append(args, years, years)
+	}
+	query += " ORDER BY pet_type, provider_id, product_id, coverage_id"
+
+	rows, err := db.Query(query, args...)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+		return
+	}
+	defer rows.Close()
+
+	var comparisons []models.InsuranceComparison
+	for rows.Next() {
+		var c models.InsuranceComparison
+		var subLimits, bands string
+		if err := rows.Scan(&c.PetType, &c.ProviderId, &c.ProductId, &c.CoverageId, &c.CompanyName, &c.CompanyNameZh,
+			&c.InsuranceName, &c.InsuranceNameZh, &c.CoverageType, &c.CoverageTypeZh, &c.CoverageLimit, &c.LimitRemark, &c.LimitRemarkZh,
+			&subLimits, &c.Coinsurance, &c.CoinsuranceZh, &bands, &c.Tag, &c.TagZh); err == nil {
+			c.SubLimits = json.RawMessage(subLimits)
+			c.CoinsuranceBands = json.RawMessage(bands)
+			comparisons = append(comparisons, c)
+		}
+	}
+	w.Header().Set("Content-Type", "application/json")
+	json.NewEncoder(w).Encode(comparisons)
+}
+
 // Legacy Handlers - Return empty
 func InsuranceProvidersHandler(w http.ResponseWriter, r *http.Request) {
 	EnableCors(&w)
@@ -0,0 +1,147 @@
+package handlers
+
+import (
+	"encoding/json"
+	"net/http"
+	"os"
+	"path/filepath"
+	"strings"
+	"sync"
+	"time"
+)
+
+// snapshotDir is where scripts/export_static_snapshots.py writes pre-serialized responses.
+const snapshotDir = "data/snapshots"
+
+type snapshotEntry struct {
+	ETag        string            `json:"etag"`
+	ContentType string            `json:"content_type"`
+	Files       map[string]string `json:"files"`
+}
+
+type snapshotManifest struct {
+	Version   int                      `json:"version"`
+	Source    *manifestSource          `json:"source,omitempty"`
+	Endpoints map[string]snapshotEntry `json:"endpoints"`
+}
+
+// manifestSource identifies the database file a manifest was generated from.
+type manifestSource struct {
+	Size    int64 `json:"size"`
+	MtimeNs int64 `json:"mtime_ns"`
+}
+
+// manifestCache holds a parsed manifest; it is reloaded when the file's mtime changes.
+type manifestCache struct {
+	mu       sync.RWMutex
+	dir      string
+	modTime  time.Time
+	manifest *snapshotManifest
+}
+
+var snapshotCache manifestCache
+
+// resolveDataDir returns dir relative to the working directory, or else next to the executable.
+func resolveDataDir(dir string) string {
+	if _, err := os.Stat(dir); err == nil {
+		return dir
+	}
+	if ex, err := os.Executable(); err == nil {
+		return filepath.Join(filepath.Dir(ex), dir)
+	}
+	return dir
+}
+
+func (c *manifestCache) load(relDir string) (*snapshotManifest, string) {
+	dir := resolveDataDir(relDir)
+	info, err := os.Stat(filepath.Join(dir, "manifest.json"))
+	if err != nil {
+		return nil, ""
+	}
+
+	c.mu.RLock()
+	if c.manifest != nil && c.dir == dir && c.modTime.Equal(info.ModTime()) {
+		manifest := c.manifest
+		c.mu.RUnlock()
+		return manifest, dir
+	}
+	c.mu.RUnlock()
+
+	data, err := os.ReadFile(filepath.Join(dir, "manifest.json"))
+	if err != nil {
+		return nil, ""
+	}
+	var manifest snapshotManifest
+	if err := json.Unmarshal(data, &manifest); err != nil {
+		return nil, ""
+	}
+
+	c.mu.Lock()
+	c.dir = dir
+	c.modTime = info.ModTime()
+	c.manifest = &manifest
+	c.mu.Unlock()
+	return &manifest, dir
+}
+
+func loadSnapshotManifest() (*snapshotManifest, string) {
+	return snapshotCache.load(snapshotDir)
+}
+
+// acceptsEncoding reports whether an Accept-Encoding header allows the given coding.
+func acceptsEncoding(header, coding string) bool {
+	for _, part := range strings.Split(header, ",") {
+		name, params, _ := strings.Cut(strings.TrimSpace(part), ";")
+		if !strings.EqualFold(strings.TrimSpace(name), coding) {
+			continue
+		}
+		return strings.ReplaceAll(strings.TrimSpace(params), " ", "") != "q=0"
+	}
+	return false
+}
+
+// serveSnapshot writes the exported snapshot for endpoint, picking the brotli or gzip
+// variant when the client accepts it and answering If-None-Match with 304.
+// It returns false if there is no snapshot, so the caller can build the response itself.
+func serveSnapshot(w http.ResponseWriter, r *http.Request, endpoint string) bool {
+	manifest, dir := loadSnapshotManifest()
+	if manifest == nil {
+		return false
+	}
+	entry, ok := manifest.Endpoints[endpoint]
+	if !ok {
+		return false
+	}
+	return serveEntry(w, r, dir, entry)
+}
+
+// serveEntry writes one manifest entry's file from dir, honouring Accept-Encoding and conditional requests.
+func serveEntry(w http.ResponseWriter, r *http.Request, dir string, entry snapshotEntry) bool {
+	encoding := "identity"
+	acceptEncoding := r.Header.Get("Accept-Encoding")
+	if _, ok := entry.Files["br"]; ok && acceptsEncoding(acceptEncoding, "br") {
+		encoding = "br"
+	} else if _, ok := entry.Files["gzip"]; ok && acceptsEncoding(acceptEncoding, "gzip") {
+		encoding = "gzip"
+	}
+
+	f, err := os.Open(filepath.Join(dir, entry.Files[encoding]))
+	if err != nil {
+		return false
+	}
+	defer f.Close()
+	info, err := f.Stat()
+	if err != nil {
+		return false
+	}
+
+	h := w.Header()
+	h.Set("Content-Type", entry.ContentType)
+	h.Set("ETag", entry.ETag)
+	h.Set("Vary", "Accept-Encoding")
+	if encoding != "identity" {
+		h.Set("Content-Encoding", encoding)
+	}
+	http.ServeContent(w, r, "", info.ModTime(), f)
+	return true
+}
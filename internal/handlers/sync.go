@@ -0,0 +1,43 @@
+package handlers
+
+import (
+	"net/http"
+	"strconv"
+)
+
+// syncDir is where scripts/sync_feed.py writes the pre-merged delta change sets.
+const syncDir = "data/sync"
+
+var syncCache manifestCache
+
+// serveDelta answers ?since=<version> with the change set from that data version to the
+// current one, and sets X-Data-Version on every response of a synced endpoint.
+// It returns false when there is no feed, no since parameter, or no delta for that
+// version (too old or unknown), so the caller sends the full payload instead.
+// The version is only sent while the served database is the file the feed was
+// released from; after a publish without a release the full payload goes out unversioned.
+func serveDelta(w http.ResponseWriter, r *http.Request, endpoint string) bool {
+	manifest, dir := syncCache.load(syncDir)
+	if manifest == nil || !describesServedDB(manifest) {
+		return false
+	}
+	h := w.Header()
+	h.Set("X-Data-Version", strconv.Itoa(manifest.Version))
+	h.Set("Access-Control-Expose-Headers", "X-Data-Version")
+
+	since, err := strconv.Atoi(r.URL.Query().Get("since"))
+	if err != nil {
+		return false
+	}
+	entry, ok := manifest.Endpoints[endpoint+".since-"+strconv.Itoa(since)]
+	if !ok {
+		return false
+	}
+	return serveEntry(w, r, dir, entry)
+}
+
+func describesServedDB(manifest *snapshotManifest) bool {
+	_, info := findInsuranceDB()
+	return manifest.Source != nil && info != nil &&
+		info.Size() == manifest.Source.Size && info.ModTime().UnixNano() == manifest.Source.MtimeNs
+}
@@ -18,6 +18,9 @@ func VaccinesHandler(w http.ResponseWriter, r *http.Request) {
 		http.Error(w, "Method not allowed", http.StatusMethodNotAllowed)
 		return
 	}
+	if serveSnapshot(w, r, "vaccines") {
+		return
+	}
 
 	ex, err := os.Executable()
 	if err != nil {
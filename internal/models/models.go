@@ -123,6 +123,30 @@ type SubCoverageLimit struct {
 	SubCoverageRemarkZh NullJsonString `json:"sub_coverage_remark_zh,omitempty"`
 }
 
+// InsuranceComparison is one row of the materialized product_coverage_comparison
+// table built by scripts/comparison_tables.py.
+type InsuranceComparison struct {
+	PetType          string          `json:"pet_type"`
+	ProviderId       int             `json:"provider_id"`
+	ProductId        int             `json:"product_id"`
+	CoverageId       int             `json:"coverage_id"`
+	CompanyName      NullJsonString  `json:"company_name,omitempty"`
+	CompanyNameZh    NullJsonString  `json:"company_name_zh,omitempty"`
+	InsuranceName    NullJsonString  `json:"insurance_name,omitempty"`
+	InsuranceNameZh  NullJsonString  `json:"insurance_name_zh,omitempty"`
+	CoverageType     NullJsonString  `json:"coverage_type,omitempty"`
+	CoverageTypeZh   NullJsonString  `json:"coverage_type_zh,omitempty"`
+	CoverageLimit    NullJsonString  `json:"coverage_limit,omitempty"`
+	LimitRemark      NullJsonString  `json:"limit_remark,omitempty"`
+	LimitRemarkZh    NullJsonString  `json:"limit_remark_zh,omitempty"`
+	SubLimits        json.RawMessage `json:"sub_limits"`
+	Coinsurance      NullJsonString  `json:"coinsurance,omitempty"`
+	CoinsuranceZh    NullJsonString  `json:"coinsurance_zh,omitempty"`
+	CoinsuranceBands json.RawMessage `json:"coinsurance_bands"`
+	Tag              NullJsonString  `json:"tag,omitempty"`
+	TagZh            NullJsonString  `json:"tag_zh,omitempty"`
+}
+
 type ServiceSubcategory struct {
 	ID           int    `json:"id"`
 	Name         string `json:"name"`
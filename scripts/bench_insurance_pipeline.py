@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark the insurance data pipeline
+
+Generates synthetic `Pet Insurance Comparison.csv` / `Coverage Limits.csv`
+files at a chosen scale, runs each stage of build_insurance_db.py against
+them and records wall time, rows/sec and peak RSS per stage. With
+--migrations it also builds a legacy-shaped pet_insurance.db of the same
+scale and times migrate_pet_insurance_db.py on it.
+
+Results are written as JSON so runs can be compared between commits.
+
+Usage:
+    python3 scripts/bench_insurance_pipeline.py --limit-rows 1000000 --output bench.json
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import build_insurance_db as build
+import migrate_pet_insurance_db as migrations
+import validate_insurance_db as validation
+from instrumentation import peak_rss_kb
+
+# Synthetic data vocabulary, modelled on the real exports
+COMPANIES = ["One Degree", "Blue Cross", "bolttech", "MSIG", "Prudential", "FWD", "AXA", "Zurich"]
+PLANS = ["Essential Plan", "Plus Plan", "Ultra Plan", "Prestige Plan", "Love Pet - Type A",
+         "Love Pet - Type B", "Love Pet - Type C", "HappyTail - Dog Premier Plan", "Pet Care - Plan 2"]
+SEPARATORS = [" —— ", "----", None]  # None: no plan part in the provider name
+CATEGORIES = ["Medical", "Surgical", "Outpatient", "Third Party Liability", "Additional Benefits"]
+AMOUNT_FORMATS = ["{n}", "{n:,}", "Unlimited", "As charged", ""]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=build.REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generate_csvs(out_dir, providers, limit_rows, seed):
+    """Write the two synthetic CSVs and return their paths."""
+    rng = random.Random(seed)
+    insurance_csv = os.path.join(out_dir, "Pet Insurance Comparison.csv")
+    limits_csv = os.path.join(out_dir, "Coverage Limits.csv")
+
+    keys = [f"PK{i:06d}" for i in range(providers)]
+    with open(insurance_csv, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Provider Key", "Insurance Provider", "Category", "Subcategory",
+                         "Coverage Percentage", "Cancer Cash (HKD)", "Cancer Cash Notes",
+                         "Additional Critical Cash Benefit"])
+        for key in keys:
+            company = rng.choice(COMPANIES)
+            separator = rng.choice(SEPARATORS)
+            name = company if separator is None else f"{company}{separator}{rng.choice(PLANS)}"
+            cancer_cash = rng.choice(["{n}", "{n:,}", ""]).format(n=rng.randrange(5, 100) * 1000)
+            writer.writerow([key, name, rng.choice(CATEGORIES), rng.choice(build.SERVICE_SUBCATEGORIES),
+                             f"{rng.choice([50, 70, 80, 90, 100])}%", cancer_cash, "",
+                             rng.choice(["", str(rng.randrange(1, 20) * 1000)])])
+
+    with open(limits_csv, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Limit Item", "Provider Key", "Level", "Category", "Subcategory",
+                         "Coverage Amount (HKD)", "Notes"])
+        for _ in range(limit_rows):
+            amount = rng.choice(AMOUNT_FORMATS).format(n=rng.randrange(1, 200) * 500)
+            writer.writerow([rng.choice(build.SERVICE_SUBCATEGORIES), rng.choice(keys), str(rng.randrange(1, 4)),
+                             rng.choice(CATEGORIES), rng.choice(build.SERVICE_SUBCATEGORIES), amount,
+                             rng.choice(["", "Per policy year", "Per condition"])])
+
+    return insurance_csv, limits_csv
+
+
+def generate_legacy_db(path, rows, seed):
+    """Create a pet_insurance.db in the pre-migration shape with `rows` coverage/sub-coverage rows."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript("""
+            CREATE TABLE insurance_provider (company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                company_name TEXT NOT NULL, company_logo TEXT);
+            CREATE TABLE product (insurance_id INTEGER PRIMARY KEY AUTOINCREMENT, provider_id INTEGER,
+                insurance_name TEXT, min_age TEXT, max_age TEXT, suitable_pet_type TEXT, cat_breed_type TEXT,
+                dog_breed_type TEXT, breed_type_remark TEXT, payment_mode TEXT, waiting_period TEXT,
+                information_link TEXT, update_time TEXT);
+            CREATE TABLE coverage (coverage_id INTEGER PRIMARY KEY, product_id INTEGER, coverage_type TEXT,
+                coverage_limit TEXT, coverage_remark TEXT);
+            CREATE TABLE sub_coverage (sub_coverage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                parent_coverage_id INTEGER NOT NULL, sub_coverage_remark TEXT, Field4 INTEGER);
+            CREATE TABLE coinsurance_info (provider_id INTEGER, min_age TEXT, max_age TEXT, vet_type TEXT,
+                coinsurance_percentage NUMERIC);
+            CREATE TABLE coverage_limit (coverage_id INTEGER, product_id INTEGER, coverage_limit INTEGER,
+                PRIMARY KEY(coverage_id, product_id));
+        """)
+        conn.executemany("INSERT INTO insurance_provider (company_name, company_logo) VALUES (?, ?)",
+                         [(c, "") for c in COMPANIES])
+        products = max(1, rows // 50)
+        conn.executemany("""
+            INSERT INTO product (provider_id, insurance_name, min_age, max_age, suitable_pet_type)
+            VALUES (?, ?, '8 weeks', '9 years', 'cat, dog')
+        """, ((rng.randrange(1, len(COMPANIES) + 1), rng.choice(PLANS)) for _ in range(products)))
+        conn.executemany("INSERT INTO coverage VALUES (?, ?, ?, ?, '')",
+                         ((i, rng.randrange(1, products + 1), rng.choice(build.SERVICE_SUBCATEGORIES),
+                           str(rng.randrange(1, 200) * 500)) for i in range(1, rows + 1)))
+        conn.executemany("INSERT INTO sub_coverage (parent_coverage_id, sub_coverage_remark, Field4) VALUES (?, ?, 0)",
+                         ((rng.randrange(1, rows + 1), "Per condition") for _ in range(rows)))
+        conn.executemany("INSERT INTO coinsurance_info VALUES (?, '0', '8', 'network', ?)",
+                         ((p, rng.choice([70, 80, 90])) for p in range(1, len(COMPANIES) + 1)))
+        conn.executemany("INSERT OR IGNORE INTO coverage_limit VALUES (?, ?, ?)",
+                         ((i, rng.randrange(1, products + 1), rng.randrange(1, 200) * 500)
+                          for i in range(1, rows + 1)))
+    conn.close()
+
+
+class StageRecorder:
+    """Times stages and collects one result dict per stage."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.stages = []
+
+    def run(self, name, func, *args, rows=None):
+        # Builder functions print progress; keep it out of the report unless asked
+        sink = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        with sink:
+            result = func(*args)
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+
+        if rows is None and isinstance(result, int):
+            rows = result
+        stage = {
+            "stage": name,
+            "seconds": round(seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "rows": rows,
+            "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+            "peak_rss_kb": peak_rss_kb(),
+        }
+        self.stages.append(stage)
+        rate = f"  {stage['rows_per_sec']:>12,.0f} rows/s" if stage["rows_per_sec"] else ""
+        print(f"  {name:<30} {seconds:9.3f}s{rate}  peak RSS {stage['peak_rss_kb'] / 1024:,.1f} MiB",
+              file=sys.stderr)
+        return result
+
+
+def bench_build(recorder, work_dir, insurance_csv, limits_csv, batch_size):
+    """Run the build_insurance_db.py stages in order on a fresh DB."""
+    db_path = os.path.join(work_dir, "insurance.db")
+    conn = sqlite3.connect(db_path)
+    build.apply_loader_pragmas(conn)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            recorder.run("create_tables", build.create_tables, conn)
+            recorder.run("import_insurance_providers", build.import_insurance_providers,
+                         conn, batch_size, insurance_csv)
+            recorder.run("import_coverage_limits", build.import_coverage_limits,
+                         conn, batch_size, limits_csv)
+            recorder.run("import_service_subcategories", build.import_service_subcategories, conn)
+            recorder.run("populate_numeric_columns", build.populate_numeric_columns, conn)
+            recorder.run("create_indexes", build.create_indexes, conn)
+            recorder.run("record_row_hashes", build.record_row_hashes, conn)
+        recorder.run("validate", validation.validate, conn)
+        recorder.run("check_integrity", build.check_integrity, conn)
+    finally:
+        conn.close()
+    return os.path.getsize(db_path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the insurance data pipeline on synthetic data.")
+    parser.add_argument("--limit-rows", type=int, default=100_000,
+                        help="rows in the synthetic Coverage Limits.csv (1k to 10M; default: 100000)")
+    parser.add_argument("--providers", type=int, default=None,
+                        help="rows in the synthetic Pet Insurance Comparison.csv (default: limit rows / 40)")
+    parser.add_argument("--batch-size", type=int, default=build.BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--migrations", action="store_true",
+                        help="also time migrate_pet_insurance_db.py on a legacy DB of the same scale")
+    parser.add_argument("--output", default="bench_insurance_pipeline.json", help="JSON results file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated files and DBs")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    providers = args.providers or max(1, args.limit_rows // 40)
+    recorder = StageRecorder(args.verbose)
+
+    work_dir = tempfile.mkdtemp(prefix="petwell-bench-")
+    print(f"Benchmarking {args.limit_rows:,} limit rows / {providers:,} providers in {work_dir}", file=sys.stderr)
+    try:
+        insurance_csv, limits_csv = recorder.run(
+            "generate_csvs", generate_csvs, work_dir, providers, args.limit_rows, args.seed,
+            rows=providers + args.limit_rows)
+        db_bytes = bench_build(recorder, work_dir, insurance_csv, limits_csv, args.batch_size)
+
+        if args.migrations:
+            legacy_db = os.path.join(work_dir, "pet_insurance.db")
+            recorder.run("generate_legacy_db", generate_legacy_db, legacy_db, args.limit_rows, args.seed)
+            recorder.run("migrate_pet_insurance_db", migrations.migrate, legacy_db,
+                         migrations.LATEST_VERSION, False, rows=args.limit_rows * 2)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "insurance_pipeline",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "params": {
+            "limit_rows": args.limit_rows,
+            "providers": providers,
+            "batch_size": args.batch_size,
+            "seed": args.seed,
+        },
+        "db_bytes": db_bytes,
+        "peak_rss_kb": peak_rss_kb(),
+        "total_seconds": round(sum(s["seconds"] for s in recorder.stages), 6),
+        "stages": recorder.stages,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
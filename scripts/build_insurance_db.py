@@ -8,13 +8,64 @@ Tables:
 - pet_insurance_comparison (provider_key as PRIMARY KEY)
 - coverage_limits (FOREIGN KEY to pet_insurance_comparison.provider_key)
 
+Rows are streamed from the CSVs into `executemany` in fixed-size batches
+inside a single transaction. Secondary indexes are created after the data
+is loaded.
+
+A full build writes to a temp file next to insurance.db, checks and
+compacts it, then swaps it in with os.replace, so readers never see a
+missing or half-built database.
+
+With --incremental, the existing DB is updated in place: per-file and
+per-row content hashes recorded by the previous build are compared with
+the CSVs and only inserted, changed or deleted rows are written. The
+build records which data directory it read; if that is not the default
+Data/ (e.g. the last build used --data-dir), a full rebuild runs instead.
+
+After a build that changed anything, the materialized comparison tables
+and the full-text search index in the served pet_insurance.db are
+refreshed if their source tables changed since they were last built (see
+comparison_tables.py and search_index.py). An incremental run with no
+source changes leaves pet_insurance.db untouched.
+
+With --data-dir, every CSV in a directory (e.g. per-insurer drops) is
+parsed in a process pool and inserted by this process; the kind of each
+file is detected from its header.
+
+Free-text amounts and percentages are also stored in typed, indexed
+columns (coverage_amount_value, coverage_percentage_value), filled by one
+UPDATE per column through the parsers in numeric_fields.py (on
+--incremental, only for the rows written); "Unlimited" is stored as
+numeric_fields.UNLIMITED_AMOUNT.
+
+Before a build is committed, validate_insurance_db.py checks it (orphan
+limits, unparsed amounts, duplicates, ...); more error rows than
+--max-errors (default 0) fails the build and the previous DB stays.
+
 Usage:
-    python3 scripts/build_insurance_db.py
+    python3 scripts/build_insurance_db.py [--batch-size N] [--incremental]
+    python3 scripts/build_insurance_db.py --data-dir DIR [--workers N]
+    python3 scripts/build_insurance_db.py --validation-report report.json [--max-errors N] [--max-warnings N]
+    python3 scripts/build_insurance_db.py --metrics build.jsonl --trace-sql [--profile build.prof]
+        (per-stage timings and SQL, see instrumentation.py)
 """
 
+import argparse
 import csv
+import hashlib
 import sqlite3
 import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import comparison_tables
+import instrumentation
+import numeric_fields
+import search_index
+import validate_insurance_db
 
 # Paths
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -25,11 +76,45 @@ DB_PATH = os.path.join(REPO_ROOT, "insurance.db")
 INSURANCE_CSV = os.path.join(DATA_DIR, "Pet Insurance Comparison.csv")
 LIMITS_CSV = os.path.join(DATA_DIR, "Coverage Limits.csv")
 
+# Number of rows handed to each executemany call
+BATCH_SIZE = 5000
+
+# PRAGMAs for the build connection. The DB file is rebuilt from the CSVs,
+# so durability during the load is not needed; MEMORY journaling still
+# allows the transaction to roll back on error.
+LOADER_PRAGMAS = (
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -65536",  # 64 MiB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = OFF",  # orphans are checked by validate_insurance_db.py after the load
+)
+
+INSERT_PROVIDER_SQL = """
+    INSERT OR REPLACE INTO pet_insurance_comparison
+    (provider_key, insurance_provider, company_name, plan_name, category, subcategory, coverage_percentage,
+     cancer_cash_hkd, cancer_cash_notes, additional_critical_cash_benefit, coverage_mode)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_LIMIT_SQL = """
+    INSERT INTO coverage_limits
+    (limit_item, provider_key, level, category, subcategory, coverage_amount_hkd, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
 
+def apply_loader_pragmas(conn):
+    """Tune the connection for a one-shot bulk load."""
+    for pragma in LOADER_PRAGMAS:
+        conn.execute(pragma)
+
+
+@instrumentation.staged
 def create_tables(conn):
     """Create the relational tables."""
     cursor = conn.cursor()
-    
+
     # Table 1: Pet Insurance Comparison
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS pet_insurance_comparison (
@@ -43,10 +128,11 @@ def create_tables(conn):
             cancer_cash_hkd REAL,
             cancer_cash_notes TEXT,
             additional_critical_cash_benefit REAL,
-            coverage_mode TEXT
+            coverage_mode TEXT,
+            coverage_percentage_value REAL
         )
     """)
-    
+
     # Table 2: Coverage Limits (with FK to pet_insurance_comparison)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS coverage_limits (
@@ -58,13 +144,11 @@ def create_tables(conn):
             subcategory TEXT,
             coverage_amount_hkd TEXT,
             notes TEXT,
+            coverage_amount_value INTEGER,
             FOREIGN KEY (provider_key) REFERENCES pet_insurance_comparison(provider_key)
         )
     """)
-    
-    # Create index for faster lookups
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_limits_provider_key ON coverage_limits(provider_key)")
-    
+
     # Table 3: Service Subcategories (reference table for all possible services)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS service_subcategories (
@@ -73,200 +157,817 @@ def create_tables(conn):
             display_order INTEGER
         )
     """)
-    
-    conn.commit()
+
+    create_metadata_tables(conn)
+
     print("Tables created successfully.")
 
 
-def import_insurance_providers(conn):
-    """Import data from Pet Insurance Comparison.csv"""
-    cursor = conn.cursor()
-    
-    with open(INSURANCE_CSV, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        count = 0
-        for row in reader:
-            provider_key = row.get('Provider Key', '').strip()
-            if not provider_key:
-                continue
-            
-            # Parse cancer cash
-            cancer_cash = row.get('Cancer Cash (HKD)', '').strip()
-            cancer_cash_val = float(cancer_cash) if cancer_cash and cancer_cash.isdigit() else None
-            
-            # Parse additional benefit
-            additional = row.get('Additional Critical Cash Benefit', '').strip()
-            additional_val = float(additional) if additional and additional.isdigit() else None
-            
-            # Split provider into company and plan
-            provider_full = row.get('Insurance Provider', '').strip()
-            if ' —— ' in provider_full:
-                company, plan = provider_full.split(' —— ', 1)
-            elif '----' in provider_full:
-                company, plan = provider_full.split('----', 1)
-            else:
-                company = provider_full
-                plan = ''
-            
-            # Determine coverage_mode based on company name
-            company_clean = company.strip().lower()
-            if 'one degree' in company_clean:
-                coverage_mode = 'big_bucket'
-            elif 'blue cross' in company_clean:
-                coverage_mode = 'bento_box'
-            else:
-                coverage_mode = 'unknown'
-
-            cursor.execute("""
-                INSERT OR REPLACE INTO pet_insurance_comparison 
-                (provider_key, insurance_provider, company_name, plan_name, category, subcategory, coverage_percentage, 
-                 cancer_cash_hkd, cancer_cash_notes, additional_critical_cash_benefit, coverage_mode)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                provider_key,
-                provider_full,
-                company.strip(),
-                plan.strip(),
-                row.get('Category', '').strip(),
-                row.get('Subcategory', '').strip(),
-                row.get('Coverage Percentage', '').strip(),
-                cancer_cash_val,
-                row.get('Cancer Cash Notes', '').strip(),
-                additional_val,
-                coverage_mode
-            ))
-            count += 1
-    
-    conn.commit()
-    print(f"Imported {count} insurance providers.")
-
-
-def import_coverage_limits(conn):
-    """Import data from Coverage Limits.csv"""
+def create_metadata_tables(conn):
+    """Create the tables that record source hashes for incremental rebuilds."""
     cursor = conn.cursor()
-    
-    with open(LIMITS_CSV, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        count = 0
-        for row in reader:
-            provider_key = row.get('Provider Key', '').strip()
-            limit_item = row.get('Limit Item', '').strip()
-            if not provider_key or not limit_item:
-                continue
-            
-            cursor.execute("""
-                INSERT INTO coverage_limits 
-                (limit_item, provider_key, level, category, subcategory, coverage_amount_hkd, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                limit_item,
-                provider_key,
-                row.get('Level', '').strip(),
-                row.get('Category', '').strip(),
-                row.get('Subcategory', '').strip(),
-                row.get('Coverage Amount (HKD)', '').strip(),
-                row.get('Notes', '').strip()
-            ))
-            count += 1
-    
-    conn.commit()
-    print(f"Imported {count} coverage limits.")
-
-
-def verify_relations(conn):
-    """Verify the relational integrity."""
+
+    # One row per source CSV: stat signature for a cheap check, content hash for a real one
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS build_source_files (
+            file_name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL
+        )
+    """)
+
+    # Build-wide facts, e.g. the data directory the sources were read from
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS build_info (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+    # One row per imported CSV row, keyed by its natural key
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS build_row_hashes (
+            table_name TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            row_id INTEGER,
+            PRIMARY KEY (table_name, row_key)
+        ) WITHOUT ROWID
+    """)
+
+
+@instrumentation.staged
+def create_indexes(conn):
+    """Create secondary indexes. Run after the bulk load so each index is built once."""
     cursor = conn.cursor()
-    
-    # Check FK integrity
+    # Provider lookups, and the duplicate-item check in validate_insurance_db.py
+    cursor.execute("DROP INDEX IF EXISTS idx_limits_provider_key")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_limits_provider_item ON coverage_limits(provider_key, limit_item, level)")
+    # Range queries such as "Surgery limit >= 50,000"
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_limits_subcategory_amount
+        ON coverage_limits(subcategory, coverage_amount_value)
+    """)
     cursor.execute("""
-        SELECT cl.limit_item, cl.provider_key 
-        FROM coverage_limits cl
-        LEFT JOIN pet_insurance_comparison pic ON cl.provider_key = pic.provider_key
-        WHERE pic.provider_key IS NULL
+        CREATE INDEX IF NOT EXISTS idx_comparison_coverage_percentage
+        ON pet_insurance_comparison(coverage_percentage_value)
     """)
-    orphans = cursor.fetchall()
-    
-    if orphans:
-        print(f"WARNING: Found {len(orphans)} coverage limits without matching provider:")
-        for o in orphans[:5]:
-            print(f"  - {o}")
+    # Partial indexes over just the rows each validation rule would flag
+    validate_insurance_db.create_rule_indexes(conn)
+    print("Indexes created successfully.")
+
+
+def as_real(value):
+    """Coerce a parsed number to what a REAL column stores."""
+    return None if value is None else float(value)
+
+
+def parse_provider_row(row):
+    """Normalise one Pet Insurance Comparison.csv row into an INSERT tuple.
+
+    Returns None for rows without a provider key.
+    """
+    provider_key = row.get('Provider Key', '').strip()
+    if not provider_key:
+        return None
+
+    # Parse cash benefits; "50,000" and "Unlimited" are kept (see numeric_fields).
+    # As floats, like the REAL columns return them, so incremental row hashes match.
+    cancer_cash_val = as_real(numeric_fields.parse_amount(row.get('Cancer Cash (HKD)', '').strip()))
+    additional_val = as_real(numeric_fields.parse_amount(row.get('Additional Critical Cash Benefit', '').strip()))
+
+    # Split provider into company and plan
+    provider_full = row.get('Insurance Provider', '').strip()
+    if ' —— ' in provider_full:
+        company, plan = provider_full.split(' —— ', 1)
+    elif '----' in provider_full:
+        company, plan = provider_full.split('----', 1)
+    else:
+        company = provider_full
+        plan = ''
+
+    # Determine coverage_mode based on company name
+    company_clean = company.strip().lower()
+    if 'one degree' in company_clean:
+        coverage_mode = 'big_bucket'
+    elif 'blue cross' in company_clean:
+        coverage_mode = 'bento_box'
     else:
-        print("All coverage limits have valid provider references.")
-    
-    # Summary
+        coverage_mode = 'unknown'
+
+    return (
+        provider_key,
+        provider_full,
+        company.strip(),
+        plan.strip(),
+        row.get('Category', '').strip(),
+        row.get('Subcategory', '').strip(),
+        row.get('Coverage Percentage', '').strip(),
+        cancer_cash_val,
+        row.get('Cancer Cash Notes', '').strip(),
+        additional_val,
+        coverage_mode
+    )
+
+
+def parse_limit_row(row):
+    """Normalise one Coverage Limits.csv row into an INSERT tuple.
+
+    Returns None for rows without a provider key or limit item.
+    """
+    provider_key = row.get('Provider Key', '').strip()
+    limit_item = row.get('Limit Item', '').strip()
+    if not provider_key or not limit_item:
+        return None
+
+    return (
+        limit_item,
+        provider_key,
+        row.get('Level', '').strip(),
+        row.get('Category', '').strip(),
+        row.get('Subcategory', '').strip(),
+        row.get('Coverage Amount (HKD)', '').strip(),
+        row.get('Notes', '').strip()
+    )
+
+
+def iter_csv_rows(path, parse):
+    """Stream parsed tuples from a CSV file, skipping rows `parse` rejects."""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            parsed = parse(row)
+            if parsed is not None:
+                yield parsed
+
+
+def insert_batches(conn, sql, rows, batch_size=BATCH_SIZE):
+    """Insert an iterable of tuples with executemany in fixed-size batches.
+
+    Returns the number of rows inserted. The caller owns the transaction.
+    """
+    cursor = conn.cursor()
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        cursor.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def _rate(count, elapsed):
+    return count / elapsed if elapsed > 0 else float(count)
+
+
+@instrumentation.staged
+def import_insurance_providers(conn, batch_size=BATCH_SIZE, path=None):
+    """Import data from Pet Insurance Comparison.csv"""
+    start = time.perf_counter()
+    count = insert_batches(conn, INSERT_PROVIDER_SQL,
+                           iter_csv_rows(path or INSURANCE_CSV, parse_provider_row), batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {count} insurance providers ({_rate(count, elapsed):,.0f} rows/sec).")
+    return count
+
+
+@instrumentation.staged
+def import_coverage_limits(conn, batch_size=BATCH_SIZE, path=None):
+    """Import data from Coverage Limits.csv"""
+    start = time.perf_counter()
+    count = insert_batches(conn, INSERT_LIMIT_SQL,
+                           iter_csv_rows(path or LIMITS_CSV, parse_limit_row), batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {count} coverage limits ({_rate(count, elapsed):,.0f} rows/sec).")
+    return count
+
+
+@instrumentation.staged
+def print_summary(conn):
+    """Print the row count of each relational table."""
+    cursor = conn.cursor()
+
     cursor.execute("SELECT COUNT(*) FROM pet_insurance_comparison")
     provider_count = cursor.fetchone()[0]
-    
+
     cursor.execute("SELECT COUNT(*) FROM coverage_limits")
     limits_count = cursor.fetchone()[0]
-    
+
     cursor.execute("SELECT COUNT(*) FROM service_subcategories")
     subcategory_count = cursor.fetchone()[0]
-    
+
     print(f"\nDatabase Summary:")
     print(f"  - Providers: {provider_count}")
     print(f"  - Coverage Limits: {limits_count}")
     print(f"  - Service Subcategories: {subcategory_count}")
 
 
+# Typed columns derived from free-text ones: (table, typed column, SQL type, parser, source column)
+NUMERIC_COLUMNS = [
+    ("pet_insurance_comparison", "coverage_percentage_value", "REAL", "parse_percentage", "coverage_percentage"),
+    ("coverage_limits", "coverage_amount_value", "INTEGER", "parse_amount", "coverage_amount_hkd"),
+]
+# The column the sync_* functions report written rows by
+ROW_KEY_COLUMNS = {"pet_insurance_comparison": "provider_key", "coverage_limits": "id"}
+
+
+@instrumentation.staged
+def populate_numeric_columns(conn, rows=None):
+    """Fill the typed columns in NUMERIC_COLUMNS from their text sources.
+
+    With `rows` ({table: [row key]}, as the sync_* functions return them)
+    only those rows are updated; without it, one UPDATE per column covers
+    the whole table. A column the DB predates is added and filled for
+    every row either way. Returns the columns that were added.
+    """
+    start = time.perf_counter()
+    numeric_fields.register_functions(conn)
+    cursor = conn.cursor()
+    added = []
+    for table, column, sql_type, parser, source in NUMERIC_COLUMNS:
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        unparsed_sql = f"""
+            SELECT COUNT(*) FROM {table}
+            WHERE {column} IS NULL AND TRIM(COALESCE({source}, '')) NOT IN ('', 'N/A', '-')
+        """
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+            added.append(f"{table}.{column}")
+        if rows is None or column not in existing:
+            cursor.execute(f"UPDATE {table} SET {column} = {parser}({source})")
+            unparsed = cursor.execute(unparsed_sql).fetchone()[0]
+        else:
+            key = ROW_KEY_COLUMNS[table]
+            keys = [(row_key,) for row_key in rows.get(table, ())]
+            cursor.executemany(f"UPDATE {table} SET {column} = {parser}({source}) WHERE {key} = ?", keys)
+            unparsed = sum(cursor.execute(f"{unparsed_sql} AND {key} = ?", row_key).fetchone()[0]
+                           for row_key in keys)
+        if unparsed:
+            print(f"  - {table}.{source}: {unparsed} values not numeric, left NULL")
+    print(f"Numeric columns populated in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    return added
+
+
+# All subcategories from Blue Cross Type A (the most comprehensive)
+# Sorted alphabetically
+SERVICE_SUBCATEGORIES = [
+    "Anaesthetists",
+    "Chemotherapy Benefit",
+    "Consultation",
+    "Euthanasia",
+    "Hospitalization",
+    "Medication",
+    "Miscellaneous",
+    "MRI & CT",
+    "Operating Theatre",
+    "Prosthesis or Wheelchair",
+    "Specialist Consultation",
+    "Surgery",
+    "Ultrasound & Lab Tests",
+    "X-rays",
+]
+
+
+@instrumentation.staged
 def import_service_subcategories(conn):
     """Create reference table of all possible service subcategories.
-    
+
     Based on Blue Cross Type A product which has the most comprehensive list.
     These are sorted alphabetically for consistent display.
     """
     cursor = conn.cursor()
-    
-    # All subcategories from Blue Cross Type A (the most comprehensive)
-    # Sorted alphabetically
-    subcategories = [
-        "Anaesthetists",
-        "Chemotherapy Benefit",
-        "Consultation",
-        "Euthanasia",
-        "Hospitalization",
-        "Medication",
-        "Miscellaneous",
-        "MRI & CT",
-        "Operating Theatre",
-        "Prosthesis or Wheelchair",
-        "Specialist Consultation",
-        "Surgery",
-        "Ultrasound & Lab Tests",
-        "X-rays",
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO service_subcategories (name, display_order)
+        VALUES (?, ?)
+    """, [(name, i) for i, name in enumerate(SERVICE_SUBCATEGORIES, start=1)])
+
+    print(f"Imported {len(SERVICE_SUBCATEGORIES)} service subcategories.")
+
+
+def source_files():
+    """Return the (table, CSV path) pairs tracked for incremental rebuilds."""
+    return [
+        ("pet_insurance_comparison", INSURANCE_CSV),
+        ("coverage_limits", LIMITS_CSV),
     ]
-    
-    for i, name in enumerate(subcategories, start=1):
-        cursor.execute("""
-            INSERT OR IGNORE INTO service_subcategories (name, display_order)
-            VALUES (?, ?)
-        """, (name, i))
-    
-    conn.commit()
-    print(f"Imported {len(subcategories)} service subcategories.")
-
-
-def main():
-    # Remove old DB if exists
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
-        print(f"Removed old database: {DB_PATH}")
-    
-    # Connect and build
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON")
-    
+
+
+def file_signature(path):
+    """Cheap change check: (size, mtime_ns) of a file."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def file_content_hash(path):
+    """SHA-256 of a file's contents, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_hash(values):
+    """Content hash of one parsed row tuple."""
+    return hashlib.sha1(repr(tuple(values)).encode('utf-8')).hexdigest()
+
+
+def keyed_provider_rows(rows):
+    """Yield (row_key, row) for provider tuples; provider_key is the natural key."""
+    for row in rows:
+        yield row[0], row
+
+
+def limit_row_key(row, seen):
+    """Key for a coverage limit tuple.
+
+    (provider_key, limit_item) is not unique in the CSV, so the occurrence
+    number of the pair, tracked in `seen`, is part of the key.
+    """
+    base = f"{row[1]}\x1f{row[0]}"
+    n = seen.get(base, 0)
+    seen[base] = n + 1
+    return f"{base}\x1f{n}"
+
+
+def keyed_limit_rows(rows):
+    """Yield (row_key, row) for coverage limit tuples in CSV order."""
+    seen = {}
+    for row in rows:
+        yield limit_row_key(row, seen), row
+
+
+def has_build_metadata(conn):
+    """True if the DB was produced by a build that recorded source hashes."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'build_source_files'")
+    if cursor.fetchone() is None:
+        return False
+    cursor.execute("SELECT COUNT(*) FROM build_source_files")
+    return cursor.fetchone()[0] > 0
+
+
+def record_data_dir(conn, data_dir):
+    """Remember which directory this build read its CSVs from."""
+    conn.execute("INSERT OR REPLACE INTO build_info (key, value) VALUES ('data_dir', ?)",
+                 (os.path.realpath(data_dir),))
+
+
+def recorded_data_dir(conn):
+    """The data directory of the build that produced the DB, or None if it predates build_info."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'build_info'")
+    if cursor.fetchone() is None:
+        return None
+    row = cursor.execute("SELECT value FROM build_info WHERE key = 'data_dir'").fetchone()
+    return row[0] if row else None
+
+
+@instrumentation.staged
+def record_source_files(conn, entries=None):
+    """Store the signature and content hash of each source CSV.
+
+    `entries` is a list of (path, size, mtime_ns, content_hash); when omitted
+    every tracked source file is hashed.
+    """
+    if entries is None:
+        entries = [(path, *file_signature(path), file_content_hash(path)) for _, path in source_files()]
+    conn.executemany("""
+        INSERT OR REPLACE INTO build_source_files (file_name, size, mtime_ns, content_hash)
+        VALUES (?, ?, ?, ?)
+    """, [(os.path.basename(path), size, mtime_ns, content_hash)
+          for path, size, mtime_ns, content_hash in entries])
+
+
+@instrumentation.staged
+def record_row_hashes(conn):
+    """Hash every loaded row so the next incremental run can diff against it."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM build_row_hashes")
+
+    providers = conn.execute("""
+        SELECT provider_key, insurance_provider, company_name, plan_name, category, subcategory, coverage_percentage,
+               cancer_cash_hkd, cancer_cash_notes, additional_critical_cash_benefit, coverage_mode
+        FROM pet_insurance_comparison
+    """)
+    cursor.executemany("""
+        INSERT INTO build_row_hashes (table_name, row_key, row_hash, row_id)
+        VALUES ('pet_insurance_comparison', ?, ?, NULL)
+    """, ((key, row_hash(row)) for key, row in keyed_provider_rows(providers)))
+
+    limits = conn.execute("""
+        SELECT id, limit_item, provider_key, level, category, subcategory, coverage_amount_hkd, notes
+        FROM coverage_limits ORDER BY id
+    """)
+    seen = {}
+    cursor.executemany("""
+        INSERT INTO build_row_hashes (table_name, row_key, row_hash, row_id)
+        VALUES ('coverage_limits', ?, ?, ?)
+    """, ((limit_row_key(row[1:], seen), row_hash(row[1:]), row[0]) for row in limits))
+
+
+@instrumentation.staged
+def changed_sources(conn):
+    """Return (table, path, size, mtime_ns, content_hash) for each CSV that differs from the last build.
+
+    Files whose size and mtime match the recorded signature are not read at all.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT file_name, size, mtime_ns, content_hash FROM build_source_files")
+    stored = {name: (size, mtime_ns, content_hash) for name, size, mtime_ns, content_hash in cursor.fetchall()}
+
+    changed = []
+    for table, path in source_files():
+        size, mtime_ns = file_signature(path)
+        old = stored.get(os.path.basename(path))
+        if old is not None and old[:2] == (size, mtime_ns):
+            continue
+        content_hash = file_content_hash(path)
+        if old is not None and old[2] == content_hash:
+            # Touched but identical: only refresh the signature
+            record_source_files(conn, [(path, size, mtime_ns, content_hash)])
+            continue
+        changed.append((table, path, size, mtime_ns, content_hash))
+    return changed
+
+
+def diff_rows(conn, table, keyed_rows):
+    """Diff keyed CSV rows against the stored row hashes of `table`.
+
+    Returns (inserted, changed, deleted):
+    - inserted: [(row_key, row_hash, row)]
+    - changed:  [(row_key, row_hash, row, row_id)]
+    - deleted:  [(row_key, row_id)]
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT row_key, row_hash, row_id FROM build_row_hashes WHERE table_name = ?", (table,))
+    stored = {key: (h, row_id) for key, h, row_id in cursor.fetchall()}
+
+    inserted, changed = [], []
+    for key, row in keyed_rows:
+        h = row_hash(row)
+        old = stored.pop(key, None)
+        if old is None:
+            inserted.append((key, h, row))
+        elif old[0] != h:
+            changed.append((key, h, row, old[1]))
+    deleted = [(key, row_id) for key, (_, row_id) in stored.items()]
+    return inserted, changed, deleted
+
+
+@instrumentation.staged
+def sync_insurance_providers(conn, path):
+    """Apply inserted/changed/deleted provider rows from Pet Insurance Comparison.csv.
+
+    Returns the provider keys written.
+    """
+    inserted, changed, deleted = diff_rows(
+        conn, "pet_insurance_comparison",
+        keyed_provider_rows(iter_csv_rows(path, parse_provider_row)))
+
+    cursor = conn.cursor()
+    upserts = inserted + [(key, h, row) for key, h, row, _ in changed]
+    cursor.executemany(INSERT_PROVIDER_SQL, [row for _, _, row in upserts])
+    cursor.executemany("DELETE FROM pet_insurance_comparison WHERE provider_key = ?",
+                       [(key,) for key, _ in deleted])
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO build_row_hashes (table_name, row_key, row_hash, row_id)
+        VALUES ('pet_insurance_comparison', ?, ?, NULL)
+    """, [(key, h) for key, h, _ in upserts])
+    cursor.executemany("DELETE FROM build_row_hashes WHERE table_name = 'pet_insurance_comparison' AND row_key = ?",
+                       [(key,) for key, _ in deleted])
+
+    print(f"Providers: {len(inserted)} inserted, {len(changed)} changed, {len(deleted)} deleted.")
+    return [key for key, _, _ in upserts]
+
+
+@instrumentation.staged
+def sync_coverage_limits(conn, path):
+    """Apply inserted/changed/deleted limit rows from Coverage Limits.csv.
+
+    Returns the ids of the rows written.
+    """
+    inserted, changed, deleted = diff_rows(
+        conn, "coverage_limits",
+        keyed_limit_rows(iter_csv_rows(path, parse_limit_row)))
+
+    cursor = conn.cursor()
+    cursor.executemany("""
+        UPDATE coverage_limits
+        SET limit_item = ?, provider_key = ?, level = ?, category = ?, subcategory = ?,
+            coverage_amount_hkd = ?, notes = ?
+        WHERE id = ?
+    """, [(*row, row_id) for _, _, row, row_id in changed])
+    cursor.executemany("DELETE FROM coverage_limits WHERE id = ?", [(row_id,) for _, row_id in deleted])
+
+    hashes = [(key, h, row_id) for key, h, _, row_id in changed]
+    for key, h, row in inserted:
+        cursor.execute(INSERT_LIMIT_SQL, row)
+        hashes.append((key, h, cursor.lastrowid))
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO build_row_hashes (table_name, row_key, row_hash, row_id)
+        VALUES ('coverage_limits', ?, ?, ?)
+    """, hashes)
+    cursor.executemany("DELETE FROM build_row_hashes WHERE table_name = 'coverage_limits' AND row_key = ?",
+                       [(key,) for key, _ in deleted])
+
+    print(f"Coverage limits: {len(inserted)} inserted, {len(changed)} changed, {len(deleted)} deleted.")
+    return [row_id for _, _, row_id in hashes]
+
+
+SYNC_FUNCTIONS = {
+    "pet_insurance_comparison": sync_insurance_providers,
+    "coverage_limits": sync_coverage_limits,
+}
+
+
+def incremental_update(conn, thresholds=validate_insurance_db.THRESHOLDS, report_path=None):
+    """Bring an existing DB in line with the CSVs, touching only rows that changed.
+
+    Validation runs before the commit, so a failing update leaves the DB as it was.
+    Returns True if anything was written.
+    """
+    with conn:
+        conn.execute("BEGIN")
+        changed = changed_sources(conn)
+        written = {}
+        for table, path, size, mtime_ns, content_hash in changed:
+            written[table] = SYNC_FUNCTIONS[table](conn, path)
+        if changed:
+            # Only the written rows, unless a DB from before the typed columns needs them filled in
+            if populate_numeric_columns(conn, written):
+                create_indexes(conn)
+            validate_insurance_db.gate(conn, thresholds, report_path, DB_PATH)
+        record_source_files(conn, [entry[1:] for entry in changed])
+    return bool(changed)
+
+
+# Directory ingest: header column that identifies each kind of CSV, and how to load it
+CSV_KINDS = {
+    "pet_insurance_comparison": ("Insurance Provider", parse_provider_row, INSERT_PROVIDER_SQL),
+    "coverage_limits": ("Limit Item", parse_limit_row, INSERT_LIMIT_SQL),
+}
+
+
+def detect_csv_kind(path):
+    """Return the CSV_KINDS key for a CSV file based on its header, or None."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f), [])
+    for kind, (marker, _, _) in CSV_KINDS.items():
+        if marker in header:
+            return kind
+    return None
+
+
+def parse_csv_file(path):
+    """Worker: parse and normalise one CSV file.
+
+    Returns (path, kind, rows, seconds) where rows are compact INSERT tuples.
+    Runs in a worker process, so it only takes and returns picklable values.
+    """
+    start = time.perf_counter()
+    kind = detect_csv_kind(path)
+    rows = []
+    if kind is not None:
+        rows = list(iter_csv_rows(path, CSV_KINDS[kind][1]))
+    return path, kind, rows, time.perf_counter() - start
+
+
+@instrumentation.staged
+def ingest_directory(conn, data_dir, workers=None, batch_size=BATCH_SIZE):
+    """Load every CSV in `data_dir`: parse in a process pool, insert on this connection.
+
+    Files are handed out one per task and their rows inserted in file-name
+    order as results arrive, so the result does not depend on worker timing.
+    Returns the list of files that were loaded.
+    """
+    paths = sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir)
+                   if name.lower().endswith('.csv'))
+    workers = workers or os.cpu_count() or 1
+
+    counts = {kind: 0 for kind in CSV_KINDS}
+    insert_seconds = {kind: 0.0 for kind in CSV_KINDS}
+    parse_seconds = 0.0
+    wait_seconds = 0.0
+    loaded = []
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(parse_csv_file, paths)
+        while True:
+            wait_start = time.perf_counter()
+            try:
+                path, kind, rows, seconds = next(results)
+            except StopIteration:
+                break
+            wait_seconds += time.perf_counter() - wait_start
+            parse_seconds += seconds
+
+            if kind is None:
+                print(f"Skipped {os.path.basename(path)}: unrecognised header.")
+                continue
+
+            insert_start = time.perf_counter()
+            counts[kind] += insert_batches(conn, CSV_KINDS[kind][2], rows, batch_size)
+            insert_seconds[kind] += time.perf_counter() - insert_start
+            loaded.append(path)
+    elapsed = time.perf_counter() - start
+
+    print(f"Ingested {len(loaded)} files from {data_dir} with {workers} workers in {elapsed:.2f}s:")
+    for kind in CSV_KINDS:
+        print(f"  - {kind}: {counts[kind]} rows ({_rate(counts[kind], insert_seconds[kind]):,.0f} rows/sec insert)")
+    stages = [("parse (summed over workers)", parse_seconds), ("waiting on workers", wait_seconds)]
+    stages += [(f"insert {kind}", insert_seconds[kind]) for kind in CSV_KINDS]
+    print("Stage timings:")
+    for label, seconds in stages:
+        print(f"  - {label + ':':<34} {seconds:.2f}s")
+    return loaded
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build insurance.db from the CSV exports.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"rows per executemany batch (default: {BATCH_SIZE})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="update the existing DB in place, touching only changed rows")
+    parser.add_argument("--data-dir",
+                        help="ingest every CSV in this directory (e.g. per-insurer drops) in parallel")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --data-dir (default: CPU count)")
+    parser.add_argument("--served-db", default=comparison_tables.DB_PATH,
+                        help="served DB to refresh the comparison tables in "
+                             f"(default: {comparison_tables.DB_PATH})")
+    parser.add_argument("--no-comparisons", action="store_true",
+                        help="skip refreshing the comparison tables")
+    parser.add_argument("--no-search", action="store_true",
+                        help="skip rebuilding the full-text search index")
+    parser.add_argument("--validation-report", metavar="PATH", help="write the validation report as JSON")
+    validate_insurance_db.add_threshold_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.incremental and args.data_dir:
+        parser.error("--incremental cannot be combined with --data-dir")
+    return args
+
+
+def create_shadow_file(db_path):
+    """Create an empty temp file next to `db_path` to build into.
+
+    Same directory, so the final os.replace is an atomic rename on one filesystem.
+    """
+    fd, path = tempfile.mkstemp(prefix=f".{os.path.basename(db_path)}.", suffix=".tmp",
+                                dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(fd)
+    return path
+
+
+@instrumentation.staged
+def check_integrity(conn):
+    """Run PRAGMA integrity_check; raise if SQLite reports any problem."""
+    problems = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+    if problems != ["ok"]:
+        raise RuntimeError(f"integrity_check failed: {problems[:5]}")
+    print("Integrity check passed.")
+
+
+@instrumentation.staged
+def compact_db(conn):
+    """Checkpoint any WAL content back into the file and VACUUM it."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+
+
+@instrumentation.staged
+def publish_db(shadow_path, db_path):
+    """Atomically swap the finished shadow file in place of `db_path`.
+
+    Readers that already hold the old file keep reading it; new opens see
+    the new file. There is no moment where `db_path` is missing or partial.
+    """
+    # mkstemp creates the file 0600; keep the permissions readers had before
+    if os.path.exists(db_path):
+        mode = os.stat(db_path).st_mode & 0o777
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(shadow_path, mode)
+
+    # The build ran with synchronous=OFF, so flush the file before the rename
+    with open(shadow_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(shadow_path, db_path)
+
+    # Persist the rename itself
+    dir_fd = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY)
     try:
-        create_tables(conn)
-        import_insurance_providers(conn)
-        import_coverage_limits(conn)
-        import_service_subcategories(conn)
-        verify_relations(conn)
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+@instrumentation.staged
+def full_build(args):
+    """Rebuild the DB from scratch in a shadow file, then swap it in."""
+    shadow_path = create_shadow_file(DB_PATH)
+    published = False
+
+    try:
+        # Connect and build
+        conn = instrumentation.trace_connection(sqlite3.connect(shadow_path))
+        apply_loader_pragmas(conn)
+
+        try:
+            # One transaction for the whole load; rolled back on any error
+            with conn:
+                conn.execute("BEGIN")
+                create_tables(conn)
+                if args.data_dir:
+                    loaded = ingest_directory(conn, args.data_dir, args.workers, args.batch_size)
+                    sources = [(path, *file_signature(path), file_content_hash(path)) for path in loaded]
+                else:
+                    import_insurance_providers(conn, args.batch_size)
+                    import_coverage_limits(conn, args.batch_size)
+                    sources = None
+                import_service_subcategories(conn)
+                populate_numeric_columns(conn)
+                create_indexes(conn)
+                record_row_hashes(conn)
+                record_source_files(conn, sources)
+                record_data_dir(conn, args.data_dir or DATA_DIR)
+                # Fails the build before anything is published
+                validate_insurance_db.gate(conn, validate_insurance_db.thresholds_from_args(args),
+                                           args.validation_report, DB_PATH)
+            print_summary(conn)
+            check_integrity(conn)
+            compact_db(conn)
+        finally:
+            conn.close()
+
+        publish_db(shadow_path, DB_PATH)
+        published = True
         print(f"\nDatabase created: {DB_PATH}")
+    finally:
+        if not published and os.path.exists(shadow_path):
+            os.remove(shadow_path)
+
+
+@instrumentation.staged
+def incremental_build(args):
+    """Update the DB in place.
+
+    Returns True if rows were written, False if nothing changed, and None if
+    there is nothing valid to diff against and a full rebuild is needed.
+    """
+    if not os.path.exists(DB_PATH):
+        print("No existing database; running a full rebuild.")
+        return None
+
+    start = time.perf_counter()
+    conn = instrumentation.trace_connection(sqlite3.connect(DB_PATH))
+    try:
+        if not has_build_metadata(conn):
+            print("No build metadata found; running a full rebuild.")
+            return None
+        built_from = recorded_data_dir(conn)
+        if built_from != os.path.realpath(DATA_DIR):
+            # The recorded hashes describe other files; diffing would delete their rows
+            print(f"Last build read {built_from or 'an unrecorded data directory'}, "
+                  f"not {DATA_DIR}; running a full rebuild.")
+            return None
+        if not incremental_update(conn, validate_insurance_db.thresholds_from_args(args), args.validation_report):
+            print(f"No source changes; {DB_PATH} is up to date ({(time.perf_counter() - start) * 1000:.1f} ms).")
+            return False
+        print_summary(conn)
+        print(f"\nDatabase updated: {DB_PATH}")
     finally:
         conn.close()
+    return True
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with instrumentation.run("build_insurance_db", args):
+        try:
+            if not args.incremental or incremental_build(args) is None:
+                full_build(args)
+        except validate_insurance_db.ValidationError as exc:
+            print(f"\nBuild rejected, {DB_PATH} left unchanged: {exc}")
+            sys.exit(1)
+
+        # Even with unchanged CSVs the served tables can be stale (update_tags.py,
+        # migrations); only_if_stale leaves pet_insurance.db untouched when they are not
+        if not args.no_comparisons:
+            comparison_tables.materialize(args.served_db, only_if_stale=True)
+        if not args.no_search:
+            search_index.materialize(args.served_db, only_if_stale=True)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Normalisation and deduplication of data/clinics.csv
+
+Turns the CSV into typed rows for clinic_spatial_index.py's build:
+
+- duplicates are merged: rows with the same google_place_id, or within
+  --max-distance-m of each other whose names are a fuzzy match
+  (name_similarity() >= --min-similarity). The lowest
+  clinic_id survives, blanks are filled from the others, and every merged
+  id is kept in clinic_alias so old links still resolve
+- opening_hours text ("Mon-Sat: 09:00-13:00; 14:00-19:00; Sun/PH: ...",
+  "Mon-Sun: 24-hour", or Google's "Monday: 9:00 AM – 7:00 PM") is compiled
+  into intervals of minutes since Monday 00:00, merged per day, with
+  overnight hours split at midnight
+- emergency_24h becomes 0/1, coordinates and rating REAL
+
+Tables written next to the R*Tree in clinics_index.db:
+    clinic        one typed row per physical clinic
+    clinic_alias  merged duplicate id -> surviving clinic_id
+    clinic_hours  (start_minute, end_minute, clinic_id), WITHOUT ROWID,
+                  keyed by start_minute
+
+so "open now" is one range lookup on the week minute instead of parsing
+strings per request. Times are Hong Kong local time (UTC+8, no DST).
+Public holiday hours ("PH") are not modelled; they are ignored.
+
+Usage:
+    python3 scripts/clinic_spatial_index.py build          # runs this pipeline
+    python3 scripts/clinic_pipeline.py report [--csv PATH]
+    python3 scripts/clinic_pipeline.py hours "Mon-Fri: 09:00-19:00; Sat: 10:00-13:00"
+    python3 scripts/clinic_pipeline.py open-now [--at "Sun 21:30"] [--emergency] [--db PATH]
+"""
+
+import argparse
+import csv
+import difflib
+import math
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLINICS_CSV = os.path.join(REPO_ROOT, "data", "clinics.csv")
+INDEX_DB_PATH = os.path.join(REPO_ROOT, "data", "clinics_index.db")
+
+CLINIC_TZ = timezone(timedelta(hours=8), "HKT")
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+MAX_DISTANCE_M = 100.0
+MIN_SIMILARITY = 0.85
+METRES_PER_DEGREE = 111_195.0
+
+HOURS_TOKEN_RE = re.compile(r"""
+    (?P<always>open\s+24\s+hours|24\s*-?\s*hours?|24\s*小時|24/7)
+  | (?P<closed>closed|休息|休診)
+  | (?P<range>(?P<h1>\d{1,2})(?:[:.](?P<m1>\d{2}))?\s*(?P<ap1>[ap]\.?m\.?)?
+        \s*(?:-|–|—|~|to)\s*
+        (?P<h2>\d{1,2})(?:[:.](?P<m2>\d{2}))?\s*(?P<ap2>[ap]\.?m\.?)?)
+  | (?P<day>mon|tue|wed|thu|fri|sat|sun|ph\b|public\s+holidays?)[a-z]*\.?
+  | (?P<dash>-|–|—|~|\bto\b)
+""", re.VERBOSE | re.IGNORECASE)
+
+CLINIC_COLUMNS = [
+    "clinic_id", "name", "address", "phone_regular", "phone_emergency", "whatsapp", "website_url",
+    "applemap_url", "latitude", "longitude", "rating", "google_place_id", "photo_reference",
+    "opening_hours", "emergency_24h", "open_24_7", "hours_parsed",
+]
+
+
+# --- Opening hours ---
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem[0].lower() == "p" else 0)
+    return hour * 60 + minute
+
+
+def _range_minutes(match):
+    """(open, close) minutes for a time range token; close may be <= open for overnight hours."""
+    ap1, ap2 = match.group("ap1"), match.group("ap2")
+    close = _minutes(match.group("h2"), match.group("m2"), ap2)
+    if ap1 or not ap2:
+        return _minutes(match.group("h1"), match.group("m1"), ap1), close
+    # "2:00 – 7:00 PM": the start shares the end's AM/PM unless that puts it after the end
+    start = _minutes(match.group("h1"), match.group("m1"), ap2)
+    if start > close:
+        start = _minutes(match.group("h1"), match.group("m1"), "am")
+    return start, close
+
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping or touching (start, end) pairs."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_opening_hours(text):
+    """Compile opening-hours text into week intervals.
+
+    Returns (intervals, parsed): sorted, merged (start_minute, end_minute)
+    pairs in minutes since Monday 00:00, and whether the text was understood.
+    Day groups apply to every time range that follows them until the next
+    group; ranges before any day apply to every day. A dangling "Sat-" joins
+    the next day ("Sat-; Sun: ..." is Sat-Sun).
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    by_day = {day: [] for day in range(7)}
+    days, collecting, pending_start, last_day = set(range(7)), False, None, None
+    understood = False
+    for match in HOURS_TOKEN_RE.finditer(text):
+        kind = next(name for name in ("always", "closed", "range", "day", "dash") if match.group(name))
+        if kind == "day":
+            name = match.group("day").lower()[:3]
+            day = WEEKDAYS.index(name) if name in WEEKDAYS else None  # public holidays are not modelled
+            if not collecting:
+                days, collecting = set(), True
+            if day is not None and pending_start is not None:
+                span = (day - pending_start) % 7
+                days.update((pending_start + offset) % 7 for offset in range(span + 1))
+            elif day is not None:
+                days.add(day)
+            pending_start, last_day = None, day
+            continue
+        if kind == "dash":
+            if collecting and last_day is not None:
+                pending_start = last_day
+            continue
+        collecting, pending_start = False, None
+        understood = True
+        if kind == "closed":
+            for day in days:
+                by_day[day] = []
+        elif kind == "always":
+            for day in days:
+                by_day[day].append((0, MINUTES_PER_DAY))
+        else:
+            start, end = _range_minutes(match)
+            if end == start:
+                end = start + MINUTES_PER_DAY
+            elif end == 0:
+                end = MINUTES_PER_DAY  # "6:00 PM - 12:00 AM" closes at midnight, not overnight
+            for day in days:
+                if end > start:
+                    by_day[day].append((start, min(end, MINUTES_PER_DAY)))
+                    if end > MINUTES_PER_DAY:
+                        by_day[(day + 1) % 7].append((0, end - MINUTES_PER_DAY))
+                else:
+                    # Overnight: until midnight, then on into the next day
+                    by_day[day].append((start, MINUTES_PER_DAY))
+                    by_day[(day + 1) % 7].append((0, end))
+    intervals = [(day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end)
+                 for day in range(7) for start, end in by_day[day]]
+    return merge_intervals(intervals), understood
+
+
+def week_minute(when=None):
+    """Minutes since Monday 00:00 Hong Kong time for an aware datetime (default: now)."""
+    when = (when or datetime.now(CLINIC_TZ)).astimezone(CLINIC_TZ)
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+def parse_when(text):
+    """"Sun 21:30" -> the week minute it names."""
+    match = re.fullmatch(r"\s*([a-z]{3})[a-z]*\s+(\d{1,2}):(\d{2})\s*", text, re.IGNORECASE)
+    if not match or match.group(1).lower() not in WEEKDAYS:
+        raise argparse.ArgumentTypeError(f"invalid time '{text}' (use e.g. 'Sun 21:30')")
+    return WEEKDAYS.index(match.group(1).lower()) * MINUTES_PER_DAY + int(match.group(2)) * 60 + int(match.group(3))
+
+
+def format_week_minute(minute, end=False):
+    """"Sun 21:30"; with end=True, midnight is shown as 24:00 of the day before."""
+    day, rest = divmod(minute, MINUTES_PER_DAY)
+    if end and rest == 0:
+        day, rest = day - 1, MINUTES_PER_DAY
+    return f"{WEEKDAYS[day % 7].title()} {rest // 60:02d}:{rest % 60:02d}"
+
+
+# --- Deduplication ---
+
+def normalise_name(name):
+    text = unicodedata.normalize("NFKC", name or "").casefold().replace("&", " and ")
+    return " ".join(re.findall(r"\w+", text))
+
+
+def name_similarity(a, b):
+    """Similarity of two normalised names in 0-1.
+
+    The better of difflib's ratio and the share of words that match, where
+    a word matches another it abbreviates ("vet" / "veterinary").
+    """
+    words_a, words_b = a.split(), b.split()
+    if not words_a or not words_b:
+        return 0.0
+    shorter, longer = sorted((words_a, words_b), key=len)
+    matched = sum(any(other.startswith(word) or word.startswith(other) for other in longer) for word in shorter)
+    return max(difflib.SequenceMatcher(None, a, b).ratio(), matched / len(longer))
+
+
+def distance_m(a, b):
+    """Equirectangular distance in metres; exact enough at clinic-to-clinic range."""
+    mean_lat = math.radians((a[0] + b[0]) / 2)
+    return math.hypot(a[0] - b[0], (a[1] - b[1]) * math.cos(mean_lat)) * METRES_PER_DEGREE
+
+
+def _coordinates(row):
+    try:
+        return float(row["latitude"]), float(row["longitude"])
+    except (TypeError, ValueError):
+        return None
+
+
+def duplicate_pairs(rows, max_distance_m=MAX_DISTANCE_M, min_similarity=MIN_SIMILARITY):
+    """(i, j, reason) for every pair of rows that look like the same clinic.
+
+    Candidates for the fuzzy check come from a grid of max_distance_m cells,
+    so only neighbouring cells are compared rather than every pair.
+    """
+    pairs = []
+    by_place = {}
+    for i, row in enumerate(rows):
+        place_id = row.get("google_place_id")
+        if place_id:
+            if place_id in by_place:
+                pairs.append((by_place[place_id], i, "place_id"))
+            else:
+                by_place[place_id] = i
+
+    cell = max_distance_m / METRES_PER_DEGREE
+    grid = {}
+    names = [normalise_name(row.get("name")) for row in rows]
+    for i, row in enumerate(rows):
+        point = _coordinates(row)
+        if point is None:
+            continue
+        # Longitude cells are as wide in metres as latitude cells at this latitude
+        key = (int(point[0] // cell), int(point[1] * math.cos(math.radians(point[0])) // cell))
+        for d_lat in (-1, 0, 1):
+            for d_lon in (-1, 0, 1):
+                for j, other in grid.get((key[0] + d_lat, key[1] + d_lon), ()):
+                    if row.get("google_place_id") and row["google_place_id"] == rows[j].get("google_place_id"):
+                        continue  # already paired above
+                    if distance_m(point, other) > max_distance_m:
+                        continue
+                    if name_similarity(names[i], names[j]) >= min_similarity:
+                        pairs.append((j, i, "nearby_name"))
+        grid.setdefault(key, []).append((i, point))
+    return pairs
+
+
+def deduplicate(rows, max_distance_m=MAX_DISTANCE_M, min_similarity=MIN_SIMILARITY):
+    """Merge duplicate clinics. Returns (rows, aliases, pairs).
+
+    The lowest clinic_id in each group survives with its own values, blanks
+    filled from the others; aliases maps each merged clinic_id to it.
+    """
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    pairs = duplicate_pairs(rows, max_distance_m, min_similarity)
+    for i, j, _ in pairs:
+        parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(rows)):
+        groups.setdefault(find(i), []).append(rows[i])
+    merged, aliases = [], {}
+    for group in groups.values():
+        group.sort(key=lambda row: int(row["clinic_id"]))
+        survivor = dict(group[0])
+        for other in group[1:]:
+            aliases[int(other["clinic_id"])] = int(survivor["clinic_id"])
+            for field, value in other.items():
+                if not survivor.get(field) and value:
+                    survivor[field] = value
+        merged.append(survivor)
+    merged.sort(key=lambda row: int(row["clinic_id"]))
+    return merged, aliases, pairs
+
+
+def read_clinics_csv(csv_path=CLINICS_CSV):
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        return [{field: (value or "").strip() for field, value in row.items()} for row in csv.DictReader(f)]
+
+
+def _float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def typed_clinic(row):
+    """A CLINIC_COLUMNS tuple and the clinic's hour intervals for one merged row."""
+    intervals, parsed = parse_opening_hours(row.get("opening_hours"))
+    open_24_7 = intervals == [(0, MINUTES_PER_WEEK)]
+    record = (
+        int(row["clinic_id"]), row["name"], row.get("address") or None,
+        row.get("phone_regular") or None, row.get("phone_emergency") or None, row.get("whatsapp") or None,
+        row.get("website_url") or None, row.get("applemap_url") or None,
+        _float_or_none(row.get("latitude")), _float_or_none(row.get("longitude")), _float_or_none(row.get("rating")),
+        row.get("google_place_id") or None, row.get("photo_reference") or None,
+        row.get("opening_hours") or None,
+        1 if (row.get("emergency_24h") or "").upper() == "TRUE" else 0,
+        int(open_24_7), int(parsed),
+    )
+    return record, intervals
+
+
+# --- Storage ---
+
+def create_clinic_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE clinic (
+            clinic_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            address TEXT,
+            phone_regular TEXT,
+            phone_emergency TEXT,
+            whatsapp TEXT,
+            website_url TEXT,
+            applemap_url TEXT,
+            latitude REAL,
+            longitude REAL,
+            rating REAL,
+            google_place_id TEXT UNIQUE,
+            photo_reference TEXT,
+            opening_hours TEXT,
+            emergency_24h INTEGER NOT NULL,
+            open_24_7 INTEGER NOT NULL,
+            hours_parsed INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_clinic_emergency ON clinic(clinic_id) WHERE emergency_24h = 1")
+    cursor.execute("""
+        CREATE TABLE clinic_alias (
+            alias_id INTEGER PRIMARY KEY,
+            clinic_id INTEGER NOT NULL REFERENCES clinic(clinic_id)
+        )
+    """)
+    # Minutes since Monday 00:00; an interval never spans Sunday midnight (it is split instead)
+    cursor.execute("""
+        CREATE TABLE clinic_hours (
+            start_minute INTEGER NOT NULL,
+            end_minute INTEGER NOT NULL,
+            clinic_id INTEGER NOT NULL REFERENCES clinic(clinic_id),
+            PRIMARY KEY (start_minute, clinic_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX idx_clinic_hours_clinic ON clinic_hours(clinic_id, start_minute)")
+
+
+def populate_clinic_tables(conn, rows, aliases):
+    """Write merged rows and their hours. Returns the number of clinics whose hours didn't parse."""
+    create_clinic_tables(conn)
+    unparsed = 0
+    records, hours = [], []
+    for row in rows:
+        record, intervals = typed_clinic(row)
+        records.append(record)
+        hours.extend((start, end, record[0]) for start, end in intervals)
+        unparsed += bool(record[13]) and not record[-1]
+    conn.executemany(
+        f"INSERT INTO clinic ({', '.join(CLINIC_COLUMNS)}) VALUES ({', '.join('?' * len(CLINIC_COLUMNS))})", records)
+    conn.executemany("INSERT INTO clinic_alias (alias_id, clinic_id) VALUES (?, ?)", aliases.items())
+    conn.executemany("INSERT INTO clinic_hours (start_minute, end_minute, clinic_id) VALUES (?, ?, ?)", hours)
+    return unparsed
+
+
+def open_clinics(conn, minute=None, emergency_only=False):
+    """Clinics open at `minute` of the week (default: now), by clinic_id, as dicts."""
+    minute = week_minute() if minute is None else minute
+    rows = conn.execute(f"""
+        SELECT {', '.join('c.' + column for column in CLINIC_COLUMNS)}, h.end_minute
+        FROM clinic_hours h
+        JOIN clinic c ON c.clinic_id = h.clinic_id
+        WHERE h.start_minute <= ? AND h.end_minute > ?
+          AND (? = 0 OR c.emergency_24h = 1)
+        ORDER BY c.clinic_id
+    """, (minute, minute, int(emergency_only)))
+    return [dict(zip(CLINIC_COLUMNS + ["open_until"], row)) for row in rows]
+
+
+# --- CLI ---
+
+def print_report(csv_path, max_distance_m, min_similarity):
+    rows = read_clinics_csv(csv_path)
+    merged, aliases, pairs = deduplicate(rows, max_distance_m, min_similarity)
+    by_id = {row["clinic_id"]: row for row in rows}
+    for i, j, reason in pairs:
+        print(f"duplicate ({reason}): #{rows[i]['clinic_id']} {rows[i]['name']} = #{rows[j]['clinic_id']} {rows[j]['name']}")
+    unparsed = [row for row in merged if row.get("opening_hours") and not parse_opening_hours(row["opening_hours"])[1]]
+    for row in unparsed:
+        print(f"unparsed hours: #{row['clinic_id']} {by_id[row['clinic_id']]['opening_hours']!r}")
+    print(f"{len(rows)} rows -> {len(merged)} clinics ({len(aliases)} merged), {len(unparsed)} with unparsed hours.")
+
+
+def print_hours(text):
+    intervals, parsed = parse_opening_hours(text)
+    for start, end in intervals:
+        print(f"{format_week_minute(start)} - {format_week_minute(end, end=True)}")
+    if not parsed:
+        print("Not understood.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalise and deduplicate clinics.csv, and query opening hours.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    report = sub.add_parser("report", help="list duplicates and opening hours that don't parse")
+    report.add_argument("--csv", default=CLINICS_CSV, help=f"clinics CSV (default: {CLINICS_CSV})")
+    report.add_argument("--max-distance-m", type=float, default=MAX_DISTANCE_M,
+                        help=f"furthest apart two rows of one clinic can be (default: {MAX_DISTANCE_M:g})")
+    report.add_argument("--min-similarity", type=float, default=MIN_SIMILARITY,
+                        help=f"name similarity for nearby rows to merge (default: {MIN_SIMILARITY})")
+
+    hours = sub.add_parser("hours", help="show how an opening-hours string compiles")
+    hours.add_argument("text")
+
+    open_now = sub.add_parser("open-now", help="clinics open now, or at --at")
+    open_now.add_argument("--at", type=parse_when, help="day and time instead of now, e.g. 'Sun 21:30'")
+    open_now.add_argument("--emergency", action="store_true", help="only 24h emergency clinics")
+    open_now.add_argument("--db", default=INDEX_DB_PATH, help=f"index database (default: {INDEX_DB_PATH})")
+
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        print_report(args.csv, args.max_distance_m, args.min_similarity)
+    elif args.command == "hours":
+        print_hours(args.text)
+    else:
+        if not os.path.exists(args.db):
+            raise SystemExit(f"{args.db} not found; run `clinic_spatial_index.py build` first")
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        try:
+            minute = week_minute() if args.at is None else args.at
+            start = time.perf_counter()
+            clinics = open_clinics(conn, minute, args.emergency)
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            conn.close()
+        for clinic in clinics:
+            flag = " [24h]" if clinic["emergency_24h"] else ""
+            print(f"#{clinic['clinic_id']} {clinic['name']}{flag} (until {format_week_minute(clinic['open_until'], end=True)})")
+        print(f"{len(clinics)} clinics open at {format_week_minute(minute)} ({elapsed:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Spatial index for data/clinics.csv
+
+Builds an SQLite R*Tree over the clinic coordinates and answers
+k-nearest and within-radius queries, optionally restricted to 24h
+emergency clinics. The R*Tree narrows a query to a bounding box, the
+candidates are ranked by great-circle distance (vectorized with numpy
+when it is installed), and k-nearest widens the box until it holds k
+clinics, so a lookup touches only the clinics near the query point
+instead of scanning the whole list like /emergency-clinics does.
+
+The build goes through clinic_pipeline.py first, so duplicate clinics
+are indexed once, and writes its typed clinic and opening-hours tables
+into the same database.
+
+Usage:
+    python3 scripts/clinic_spatial_index.py build [--csv PATH] [--db PATH]
+    python3 scripts/clinic_spatial_index.py nearest LAT LON [-k 5] [--emergency] [--max-km KM]
+    python3 scripts/clinic_spatial_index.py within LAT LON RADIUS_KM [--emergency]
+    python3 scripts/clinic_spatial_index.py bench [--clinics 5000] [--queries 2000]
+"""
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import clinic_pipeline
+
+try:
+    import numpy as np
+except ImportError:  # optional: distances fall back to a pure-Python loop
+    np = None
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLINICS_CSV = os.path.join(REPO_ROOT, "data", "clinics.csv")
+INDEX_DB_PATH = os.path.join(REPO_ROOT, "data", "clinics_index.db")
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# k-nearest starts with this search radius and doubles it until k clinics are found
+INITIAL_RADIUS_KM = 2.0
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM  # half the circumference covers every point
+
+CLINIC_COLUMNS = ["clinic_id", "name", "address", "phone_regular", "phone_emergency",
+                  "opening_hours", "emergency_24h", "latitude", "longitude", "rating"]
+
+
+def parse_clinic_row(row):
+    """Convert one clinics.csv record to a tuple of CLINIC_COLUMNS. Returns None if it has no coordinates."""
+    try:
+        latitude = float(row["latitude"])
+        longitude = float(row["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    try:
+        rating = float(row.get("rating") or "")
+    except ValueError:
+        rating = None
+    return (
+        int(row["clinic_id"]), row["name"], row.get("address", ""),
+        row.get("phone_regular", ""), row.get("phone_emergency", ""), row.get("opening_hours", ""),
+        1 if row.get("emergency_24h", "").strip().upper() == "TRUE" else 0,
+        latitude, longitude, rating,
+    )
+
+
+def load_clinics(csv_path=CLINICS_CSV):
+    """Deduplicated clinics as (index tuples, merged rows, aliases)."""
+    rows, aliases, _ = clinic_pipeline.deduplicate(clinic_pipeline.read_clinics_csv(csv_path))
+    if aliases:
+        print(f"Merged {len(aliases)} duplicate clinics.")
+    parsed = [parse_clinic_row(row) for row in rows]
+    clinics = [row for row in parsed if row is not None]
+    skipped = len(parsed) - len(clinics)
+    if skipped:
+        print(f"Skipped {skipped} clinics without valid coordinates.")
+    return clinics, rows, aliases
+
+
+def create_index_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE clinic_point (
+            clinic_id INTEGER PRIMARY KEY,
+            name TEXT,
+            address TEXT,
+            phone_regular TEXT,
+            phone_emergency TEXT,
+            opening_hours TEXT,
+            emergency_24h INTEGER NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            rating REAL
+        )
+    """)
+    # Points are stored as zero-area boxes; id is clinic_point.clinic_id
+    cursor.execute("""
+        CREATE VIRTUAL TABLE clinic_rtree USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )
+    """)
+
+
+def populate_index(conn, clinics):
+    with conn:
+        create_index_tables(conn)
+        conn.executemany(
+            f"INSERT INTO clinic_point ({', '.join(CLINIC_COLUMNS)}) VALUES ({', '.join('?' * len(CLINIC_COLUMNS))})",
+            clinics)
+        conn.executemany(
+            "INSERT INTO clinic_rtree (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+            ((c[0], c[7], c[7], c[8], c[8]) for c in clinics))
+
+
+def build_index(csv_path=CLINICS_CSV, db_path=INDEX_DB_PATH):
+    """Build the index into a temp file next to `db_path` and swap it in."""
+    start = time.perf_counter()
+    clinics, rows, aliases = load_clinics(csv_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=".clinics_index.", suffix=".db",
+                                    dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            populate_index(conn, clinics)
+            with conn:
+                unparsed = clinic_pipeline.populate_clinic_tables(conn, rows, aliases)
+        finally:
+            conn.close()
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if unparsed:
+        print(f"Opening hours of {unparsed} clinics could not be parsed; see `clinic_pipeline.py report`.")
+    print(f"Indexed {len(clinics)} clinics into {db_path} in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    return len(clinics)
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from (lat, lon) to each point in `lats`/`lons`."""
+    if np is not None:
+        lat1 = math.radians(lat)
+        lat2 = np.radians(np.asarray(lats, dtype=float))
+        dlat = lat2 - lat1
+        dlon = np.radians(np.asarray(lons, dtype=float) - lon)
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+    lat1 = math.radians(lat)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for other_lat, other_lon in zip(lats, lons):
+        lat2 = math.radians(other_lat)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + cos_lat1 * math.cos(lat2) * math.sin(math.radians(other_lon - lon) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+def bounding_boxes(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) boxes covering the circle, split at the antimeridian."""
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+
+    # The circle's widest longitude span is at the latitude nearest a pole
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+    if dlon >= 180:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return [(min_lat, max_lat, min_lon + 360, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+
+class ClinicIndex:
+    """k-nearest and radius queries over an index built by build_index()."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @classmethod
+    def open(cls, db_path=INDEX_DB_PATH):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"{db_path} not found; run `clinic_spatial_index.py build` first")
+        return cls(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True))
+
+    @classmethod
+    def from_clinics(cls, clinics):
+        """In-memory index, e.g. for tests and benchmarks."""
+        conn = sqlite3.connect(":memory:")
+        populate_index(conn, clinics)
+        return cls(conn)
+
+    def close(self):
+        self.conn.close()
+
+    def _candidates(self, lat, lon, radius_km, emergency_only):
+        rows = []
+        for min_lat, max_lat, min_lon, max_lon in bounding_boxes(lat, lon, radius_km):
+            rows.extend(self.conn.execute(f"""
+                SELECT {', '.join('p.' + c for c in CLINIC_COLUMNS)}
+                FROM clinic_rtree r
+                JOIN clinic_point p ON p.clinic_id = r.id
+                WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?
+                  AND (? = 0 OR p.emergency_24h = 1)
+            """, (max_lat, min_lat, max_lon, min_lon, int(emergency_only))))
+        return rows
+
+    def within(self, lat, lon, radius_km, emergency_only=False):
+        """Clinics within `radius_km` of (lat, lon), nearest first, each with a distance_km key."""
+        rows = self._candidates(lat, lon, radius_km, emergency_only)
+        if not rows:
+            return []
+        distances = haversine_km(lat, lon, [r[7] for r in rows], [r[8] for r in rows])
+        ranked = sorted((d, r) for d, r in zip(distances, rows) if d <= radius_km)
+        return [dict(zip(CLINIC_COLUMNS, row), distance_km=round(d, 3)) for d, row in ranked]
+
+    def nearest(self, lat, lon, k=5, emergency_only=False, max_km=None):
+        """The `k` clinics nearest to (lat, lon), optionally no further than `max_km`."""
+        limit = min(max_km, MAX_RADIUS_KM) if max_km is not None else MAX_RADIUS_KM
+        radius = min(INITIAL_RADIUS_KM, limit)
+        while True:
+            # Every clinic outside the radius is further away than those inside,
+            # so once k are found inside it they are the k nearest
+            found = self.within(lat, lon, radius, emergency_only)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius = min(radius * 2, limit)
+
+
+def synthetic_clinics(count, seed=0):
+    """Clinics scattered around a handful of cities, for benchmarking."""
+    rng = random.Random(seed)
+    cities = [(22.30, 114.17), (1.35, 103.82), (35.68, 139.69), (51.51, -0.13),
+              (40.71, -74.01), (-33.87, 151.21), (25.03, 121.56), (37.57, 126.98)]
+    clinics = []
+    for clinic_id in range(1, count + 1):
+        city_lat, city_lon = rng.choice(cities)
+        clinics.append((
+            clinic_id, f"Clinic {clinic_id}", "", "", "", "",
+            1 if rng.random() < 0.15 else 0,
+            city_lat + rng.gauss(0, 0.15), city_lon + rng.gauss(0, 0.15),
+            round(rng.uniform(3, 5), 1),
+        ))
+    return clinics, cities
+
+
+def run_bench(clinic_count, query_count, k, seed):
+    clinics, cities = synthetic_clinics(clinic_count, seed)
+    index = ClinicIndex.from_clinics(clinics)
+    rng = random.Random(seed + 1)
+    points = [(lat + rng.gauss(0, 0.1), lon + rng.gauss(0, 0.1))
+              for lat, lon in (rng.choice(cities) for _ in range(query_count))]
+
+    print(f"{clinic_count} synthetic clinics, {query_count} queries, k={k}, "
+          f"numpy {'on' if np is not None else 'off'}")
+    for label, emergency_only in (("nearest", False), ("nearest 24h", True)):
+        timings = []
+        for lat, lon in points:
+            start = time.perf_counter()
+            index.nearest(lat, lon, k, emergency_only)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"  {label:<12} p50 {timings[len(timings) // 2]:.3f} ms  "
+              f"p99 {timings[int(len(timings) * 0.99)]:.3f} ms")
+
+    # Full scan, as /emergency-clinics does today, for comparison
+    start = time.perf_counter()
+    for lat, lon in points[:100]:
+        sorted(zip(haversine_km(lat, lon, [c[7] for c in clinics], [c[8] for c in clinics]), clinics))[:k]
+    print(f"  {'full scan':<12} mean {(time.perf_counter() - start) * 10:.3f} ms")
+    index.close()
+
+
+def print_results(results):
+    if not results:
+        print("No clinics found.")
+    for clinic in results:
+        flag = " [24h]" if clinic["emergency_24h"] else ""
+        print(f"{clinic['distance_km']:>8.2f} km  #{clinic['clinic_id']} {clinic['name']}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query a spatial index of clinics.csv.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build the R*Tree index from clinics.csv")
+    build.add_argument("--csv", default=CLINICS_CSV, help=f"clinics CSV (default: {CLINICS_CSV})")
+    build.add_argument("--db", default=INDEX_DB_PATH, help=f"index database (default: {INDEX_DB_PATH})")
+
+    nearest = sub.add_parser("nearest", help="k nearest clinics to a point")
+    nearest.add_argument("lat", type=float)
+    nearest.add_argument("lon", type=float)
+    nearest.add_argument("-k", type=int, default=5, help="number of clinics (default: 5)")
+    nearest.add_argument("--max-km", type=float, help="ignore clinics further than this")
+
+    within = sub.add_parser("within", help="clinics within a radius of a point")
+    within.add_argument("lat", type=float)
+    within.add_argument("lon", type=float)
+    within.add_argument("radius_km", type=float)
+
+    for query in (nearest, within):
+        query.add_argument("--emergency", action="store_true", help="only 24h emergency clinics")
+        query.add_argument("--db", default=INDEX_DB_PATH, help=f"index database (default: {INDEX_DB_PATH})")
+
+    bench = sub.add_parser("bench", help="time queries against synthetic clinics")
+    bench.add_argument("--clinics", type=int, default=5000, help="synthetic clinic count (default: 5000)")
+    bench.add_argument("--queries", type=int, default=2000, help="query count (default: 2000)")
+    bench.add_argument("-k", type=int, default=5, help="k for nearest queries (default: 5)")
+    bench.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_index(args.csv, args.db)
+    elif args.command == "bench":
+        run_bench(args.clinics, args.queries, args.k, args.seed)
+    else:
+        index = ClinicIndex.open(args.db)
+        try:
+            start = time.perf_counter()
+            if args.command == "nearest":
+                results = index.nearest(args.lat, args.lon, args.k, args.emergency, args.max_km)
+            else:
+                results = index.within(args.lat, args.lon, args.radius_km, args.emergency)
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            index.close()
+        print_results(results)
+        print(f"({elapsed:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Materialized comparison tables for pet_insurance.db
+
+Builds `product_coverage_comparison`: one row per (pet type, product,
+coverage type) with the coverage limit, sub-limits, coinsurance and tags
+already joined, so a comparison screen is a single indexed range scan
+instead of dumping product, coverage_limit and sub_coverage_limit and
+joining them on the device.
+
+Rows are expanded per pet type (from product.suitable_pet_type) so the
+primary key (pet_type, provider_id, product_id, coverage_id) serves both
+"all dog plans" and "dog plans from provider X" as prefix range scans.
+Sub-limits and coinsurance bands are stored as JSON arrays.
+
+The limit and the product's age bounds are also stored as numbers
+(coverage_limit_value, min_age_years, max_age_years; see numeric_fields.py),
+so "dog plans with a Surgery limit of at least HK$50,000 that accept a
+9-year-old" is a range scan on idx_comparison_limit_value.
+
+Each rebuild records a fingerprint of the source tables it read in
+`derived_table_sources`, so build_insurance_db.py can skip the rebuild (and
+leave the file, and its mtime, untouched) when nothing it reads changed.
+
+Run by build_insurance_db.py after each build, or on its own:
+    python3 scripts/comparison_tables.py [--db PATH]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+
+import instrumentation
+import numeric_fields
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+
+# Pet types a product row is expanded into
+PET_TYPES = ("cat", "dog")
+
+# Tables populate_comparison_table reads
+SOURCE_TABLES = ("product", "insurance_provider", "coverage_list", "coverage_limit",
+                 "sub_coverage_limit", "coinsurance_info")
+
+
+def source_fingerprint(conn, tables):
+    """SHA-256 over every row of `tables`; changes whenever their content does."""
+    digest = hashlib.sha256()
+    for table in tables:
+        digest.update(f"\x00{table}\x00".encode("utf-8"))
+        for row in conn.execute(f"SELECT * FROM {table}"):
+            digest.update(repr(row).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def record_sources(conn, name, tables):
+    """Store the fingerprint `name` was built from. Call inside the rebuild's transaction."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS derived_table_sources (
+            name TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR REPLACE INTO derived_table_sources VALUES (?, ?)",
+                 (name, source_fingerprint(conn, tables)))
+
+
+def is_up_to_date(conn, name, tables):
+    """True if table `name` exists and was built from the current content of `tables`."""
+    known = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name IN (?, 'derived_table_sources')", (name,))}
+    if known != {name, "derived_table_sources"}:
+        return False
+    row = conn.execute("SELECT fingerprint FROM derived_table_sources WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] == source_fingerprint(conn, tables)
+
+
+def create_comparison_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS product_coverage_comparison")
+    cursor.execute("""
+        CREATE TABLE product_coverage_comparison (
+            pet_type TEXT NOT NULL,
+            provider_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            coverage_id INTEGER NOT NULL,
+            company_name TEXT,
+            company_name_zh TEXT,
+            insurance_name TEXT,
+            insurance_name_zh TEXT,
+            coverage_type TEXT,
+            coverage_type_zh TEXT,
+            coverage_limit,
+            coverage_limit_value INTEGER,
+            limit_remark TEXT,
+            limit_remark_zh TEXT,
+            sub_limits TEXT,
+            coinsurance TEXT,
+            coinsurance_zh TEXT,
+            coinsurance_bands TEXT,
+            tag TEXT,
+            tag_zh TEXT,
+            min_age_years REAL,
+            max_age_years REAL,
+            PRIMARY KEY (pet_type, provider_id, product_id, coverage_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def create_comparison_indexes(conn):
+    cursor = conn.cursor()
+    # WITHOUT ROWID secondary indexes carry the primary key, so these also
+    # cover key-only lookups by provider or product
+    cursor.execute("""
+        CREATE INDEX idx_comparison_provider_pet
+        ON product_coverage_comparison(provider_id, pet_type)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_comparison_product
+        ON product_coverage_comparison(product_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_comparison_limit_value
+        ON product_coverage_comparison(pet_type, coverage_id, coverage_limit_value)
+    """)
+
+
+def populate_comparison_table(conn):
+    """Fill product_coverage_comparison with one INSERT...SELECT. Returns the row count."""
+    pets = ", ".join(f"('{pet}')" for pet in PET_TYPES)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        WITH pets(pet_type) AS (VALUES {pets}),
+        sub AS (
+            SELECT product_id, parent_coverage_id,
+                   json_group_array(json_object(
+                       'name', sub_coverage_name, 'name_zh', sub_coverage_name_zh,
+                       'limit', sub_limit,
+                       'remark', sub_coverage_remark, 'remark_zh', sub_coverage_remark_zh
+                   )) AS sub_limits
+            FROM sub_coverage_limit
+            GROUP BY product_id, parent_coverage_id
+        ),
+        bands AS (
+            SELECT provider_id,
+                   json_group_array(json_object(
+                       'min_age', min_age, 'max_age', max_age, 'vet_type', vet_type,
+                       'percentage', coinsurance_percentage,
+                       'percentage_value', parse_percentage(coinsurance_percentage),
+                       'min_age_years', parse_age_years(min_age), 'max_age_years', parse_age_years(max_age)
+                   )) AS coinsurance_bands
+            FROM coinsurance_info
+            GROUP BY provider_id
+        )
+        INSERT INTO product_coverage_comparison (
+            pet_type, provider_id, product_id, coverage_id,
+            company_name, company_name_zh, insurance_name, insurance_name_zh,
+            coverage_type, coverage_type_zh, coverage_limit, coverage_limit_value, limit_remark, limit_remark_zh,
+            sub_limits, coinsurance, coinsurance_zh, coinsurance_bands, tag, tag_zh, min_age_years, max_age_years
+        )
+        SELECT
+            pets.pet_type, COALESCE(p.provider_id, 0), p.insurance_id, cl.coverage_id,
+            ip.company_name, ip.company_name_zh, p.insurance_name, p.insurance_name_zh,
+            lst.coverage_type, lst.coverage_type_zh, cl.coverage_limit, parse_amount(cl.coverage_limit),
+            cl.remark, cl.remark_zh, COALESCE(sub.sub_limits, '[]'), p.coinsurance, p.coinsurance_zh,
+            COALESCE(bands.coinsurance_bands, '[]'), p.tag, p.tag_zh,
+            parse_age_years(p.min_age), parse_age_years(p.max_age)
+        FROM coverage_limit cl
+        JOIN product p ON p.insurance_id = cl.product_id
+        JOIN pets ON p.suitable_pet_type IS NULL OR TRIM(p.suitable_pet_type) = ''
+                  OR INSTR(LOWER(p.suitable_pet_type), pets.pet_type) > 0
+        LEFT JOIN insurance_provider ip ON ip.company_id = p.provider_id
+        LEFT JOIN coverage_list lst ON lst.coverage_id = cl.coverage_id
+        LEFT JOIN sub ON sub.product_id = cl.product_id AND sub.parent_coverage_id = cl.coverage_id
+        LEFT JOIN bands ON bands.provider_id = p.provider_id
+    """)
+    # rowcount is not reported for statements that start with WITH
+    cursor.execute("SELECT COUNT(*) FROM product_coverage_comparison")
+    return cursor.fetchone()[0]
+
+
+def build_comparison_tables(conn):
+    """Rebuild the comparison table and its indexes in one transaction.
+
+    Readers see either the previous table or the complete new one.
+    """
+    start = time.perf_counter()
+    numeric_fields.register_functions(conn)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        create_comparison_table(conn)
+        count = populate_comparison_table(conn)
+        create_comparison_indexes(conn)
+        record_sources(conn, "product_coverage_comparison", SOURCE_TABLES)
+    conn.execute("ANALYZE product_coverage_comparison")
+    print(f"Materialized {count} comparison rows in {time.perf_counter() - start:.2f}s.")
+    return count
+
+
+@instrumentation.staged(name="comparison_tables")
+def materialize(db_path=DB_PATH, only_if_stale=False):
+    """Build the comparison tables in `db_path` if it exists.
+
+    With `only_if_stale`, nothing is written when the source tables are unchanged since the last build.
+    """
+    if not os.path.exists(db_path):
+        print(f"Skipping comparison tables: {db_path} not found.")
+        return None
+    conn = instrumentation.trace_connection(sqlite3.connect(db_path))
+    try:
+        if only_if_stale and is_up_to_date(conn, "product_coverage_comparison", SOURCE_TABLES):
+            print("Comparison tables are up to date.")
+            return None
+        return build_comparison_tables(conn)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize comparison tables in pet_insurance.db.")
+    parser.add_argument("--db", default=DB_PATH, help=f"database path (default: {DB_PATH})")
+    args = parser.parse_args(argv)
+    with instrumentation.run("comparison_tables"):
+        materialize(args.db)
+
+
+if __name__ == "__main__":
+    main()
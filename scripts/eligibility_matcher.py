@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+"""
+Batch eligibility and coinsurance matching of pet profiles against plans
+
+Whether a plan fits a pet is spread over free-text product columns,
+in English with _zh counterparts: min_age/max_age ("13 weeks",
+"11 years"), suitable_pet_type ("cat, dog", "貓，狗"),
+cat_breed_type/dog_breed_type ("None" = that species is not covered),
+breed_type_remark ("* Except the following dog breeds: ...") and the
+coinsurance text or the provider's coinsurance_info bands.
+
+compile_rules() turns each product into a ProductRule once: species,
+age bounds in years (numeric_fields.parse_age_years, inclusive like the
+/insurance-comparison age filter), excluded breed names and coinsurance
+bands [min, max) by attained age and vet type. Bands come from the
+product's own coinsurance text when it parses ("20% - Pet enrolled
+before Age 4", "Insured age at Age 1 or above: Network Clinic 90% |
+Non-Network Clinic 70%"), else from coinsurance_info for its provider.
+
+A batch of profiles (species, breed, age, preferred vet type) is then
+matched against every product in one NumPy pass per chunk: eligibility
+is a (profiles x products) mask, the effective coinsurance is the
+best-priority band per product found with np.minimum.reduceat, and
+plans are ranked by coinsurance (lower first, unknown last), then
+insurance_id. Breeds are compared once per distinct breed in the chunk
+(case/spelling-tolerant, cross breeds only where the remark says so).
+Without NumPy the same rules run per profile in pure Python.
+
+Every band holds the share of the bill the owner pays. Coinsurance text
+that states what the insurer reimburses instead (a rate per clinic or
+vet, "Network Clinic 90%", or "reimburse"/"賠償" wording) is converted
+to 100 - rate when it is compiled, so it ranks and is reported on the
+same scale as "20% - Pet enrolled before Age 4". coinsurance_info
+percentages are already the owner's share.
+
+Usage:
+    python3 scripts/eligibility_matcher.py rules [--db PATH | --products-json data/response.json]
+    python3 scripts/eligibility_matcher.py match --profiles profiles.csv [--top 5] [--output matches.csv]
+    python3 scripts/eligibility_matcher.py serve [--port 8005]
+        GET /recommendations?species=dog&breed=Poodle&age=3&vet_type=network&top=5
+    python3 scripts/eligibility_matcher.py bench [--profiles 200000] [--check]
+
+profiles.csv has profile_id,species,breed,age_years (or birth_date),vet_type.
+"""
+
+import argparse
+import csv
+import difflib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import date
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numeric_fields
+
+try:
+    import numpy as np
+except ImportError:  # optional: profiles are matched one at a time instead
+    np = None
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+
+DEFAULT_PORT = 8005
+CHUNK_SIZE = 50_000
+TOP_PLANS = 5
+BREED_MATCH_RATIO = 0.8
+
+SPECIES = ("dog", "cat")
+SPECIES_WORDS = {"dog": ("dog", "狗", "犬"), "cat": ("cat", "貓", "猫")}
+NOT_COVERED_WORDS = ("none", "not covered", "不適用", "不适用", "不受保", "無", "无")
+# Band vet types; a profile with no preference takes ANY_VET bands first
+ANY_VET, NETWORK, NON_NETWORK = 0, 1, 2
+VET_TYPES = ("any", "network", "non-network")
+
+CROSS_BREED_RE = re.compile(r"cross\s*-?\s*breed", re.IGNORECASE)
+CROSS_WORDS = {"mix", "mixed", "cross", "crossbreed", "x"}
+BREED_SPLIT_RE = re.compile(r"[,;:\n]|\band\b|\bor\b|\bsuch as\b|\bincluding but not limited to\b|\d+\.", re.IGNORECASE)
+BREED_STOPWORDS = {"except", "exclude", "the", "any", "certain", "all", "dog", "cat", "breeds", "chapter"}
+# "before Age 4", "from 0 - 8", "Age 1 or above", "13 weeks to 11 months"
+BEFORE_RE = re.compile(r"\b(?:before|under|below)\s+(?:age\s+)?(\d+(?:\.\d+)?\s*[^\d\s,:;-]*)", re.IGNORECASE)
+ABOVE_RE = re.compile(r"(?:age\s+)?(\d+(?:\.\d+)?\s*[a-z]*)\s+or\s+(?:above|over|older)", re.IGNORECASE)
+RANGE_RE = re.compile(r"(\d+(?:\.\d+)?\s*[a-z]*)\s*(?:-|–|to)\s*(\d+(?:\.\d+)?\s*[a-z]*)", re.IGNORECASE)
+# A rate the insurer pays: "Network Clinic 90%", "All HK registered vets 50%"
+REIMBURSEMENT_RE = re.compile(r"reimburs|\bclinics?\b|\bvets?\b|賠償|赔偿|賠付|赔付", re.IGNORECASE)
+VET_PART_RE = re.compile(r"(non[-\s]?network|network)?[^%|]*?(\d+(?:\.\d+)?)\s*%", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class CoinsuranceBand:
+    min_age_years: float
+    max_age_years: float  # exclusive
+    vet_type: int
+    percentage: float  # share the owner pays
+
+
+@dataclass(frozen=True)
+class ProductRule:
+    insurance_id: int
+    provider_id: int
+    name: str
+    name_zh: str
+    species: tuple
+    min_age_years: float
+    max_age_years: float
+    excluded_breeds: tuple
+    excludes_cross_breeds: bool
+    bands: tuple
+    band_source: str
+
+
+# --- Rule compilation ---
+
+def _text(*values):
+    """First non-empty value, stripped."""
+    for value in values:
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return ""
+
+
+def parse_species(product):
+    """Species the product covers: suitable_pet_type (EN, else ZH), minus any breed type of "None"."""
+    text = _text(product.get("suitable_pet_type"), product.get("suitable_pet_type_zh")).lower()
+    species = [s for s in SPECIES if not text or any(word in text for word in SPECIES_WORDS[s])]
+    for s in SPECIES:
+        breed_type = _text(product.get(f"{s}_breed_type"), product.get(f"{s}_breed_type_zh")).lower().rstrip("*")
+        if breed_type in NOT_COVERED_WORDS:
+            species = [x for x in species if x != s]
+    return tuple(species)
+
+
+def normalize_breed(text):
+    return " ".join(re.sub(r"[^a-z ]+", " ", (text or "").lower()).split())
+
+
+def parse_excluded_breeds(remark):
+    """Breed names listed in a breed_type_remark, and whether their cross breeds are excluded too."""
+    if not remark:
+        return (), False
+    names = []
+    for fragment in BREED_SPLIT_RE.split(" ".join(remark.replace("*", " ").split())):
+        words = fragment.strip(" .()").split()
+        if not 1 <= len(words) <= 3 or not words[0][:1].isupper() or words[0].lower() in BREED_STOPWORDS:
+            continue
+        name = normalize_breed(" ".join(words))
+        if name and name not in names and not any(w in BREED_STOPWORDS for w in name.split()):
+            names.append(name)
+    return tuple(names), bool(CROSS_BREED_RE.search(remark))
+
+
+@lru_cache(maxsize=65536)
+def breed_excluded(breed, excluded, excludes_cross_breeds):
+    """True if `breed` (free text) is one of the `excluded` names, allowing for spelling variants."""
+    words = normalize_breed(breed).split()
+    if not words or not excluded:
+        return False
+    is_cross = any(w in CROSS_WORDS for w in words)
+    pure = [w for w in words if w not in CROSS_WORDS]
+    name = " ".join(pure)
+    for excluded_name in excluded:
+        excluded_words = excluded_name.split()
+        if name == excluded_name or (len(pure) == len(excluded_words)
+                                     and difflib.SequenceMatcher(None, name, excluded_name).ratio()
+                                     >= BREED_MATCH_RATIO):
+            return not is_cross or excludes_cross_breeds
+        if set(excluded_words) <= set(pure) and (excludes_cross_breeds or not is_cross):
+            return True
+    return False
+
+
+def age_years(text):
+    return numeric_fields.parse_age_years(text.strip()) if text and text.strip() else None
+
+
+def age_after(text):
+    """Exclusive upper bound for an inclusive age ("8" -> 9 years, "11 months" -> 1 year)."""
+    match = numeric_fields.AGE_RE.search(numeric_fields._normalise(text))
+    if match is None:
+        return None
+    unit = (match.group(2) or "year").rstrip("s")
+    return age_years(text) + numeric_fields.AGE_UNITS_IN_YEARS.get(unit, 1.0)
+
+
+def parse_vet_type(text):
+    text = (text or "").lower()
+    if re.search(r"non[-\s]?network|非網絡|非网络", text):
+        return NON_NETWORK
+    if "network" in text or "網絡" in text or "网络" in text:
+        return NETWORK
+    return ANY_VET
+
+
+def parse_age_condition(text):
+    """[min, max) in years for a band's age wording; the whole range if there is none."""
+    if match := BEFORE_RE.search(text):
+        return 0.0, age_years(match.group(1))
+    if match := ABOVE_RE.search(text):
+        return age_years(match.group(1)), float("inf")
+    if match := RANGE_RE.search(text):
+        low, high = match.group(1).strip(), match.group(2).strip()
+        # "from 1 - 3 years": a bare lower number takes the upper bound's unit
+        unit = re.sub(r"[\d.\s]", "", high)
+        if low.replace(".", "").isdigit() and unit:
+            low = f"{low} {unit}"
+        return age_years(low), age_after(high)
+    return 0.0, float("inf")
+
+
+def parse_coinsurance_text(text):
+    """Bands from a product's coinsurance text, one or more per line, in order of appearance.
+
+    Reimbursement rates are turned into the owner's share.
+    """
+    bands = []
+    for line in (text or "").splitlines():
+        reimbursed = bool(REIMBURSEMENT_RE.search(line))
+        condition, _, rates = line.rpartition(":") if ":" in line else ("", "", line)
+        if "%" not in rates:
+            condition, rates = line, line
+        # "20% - Pet enrolled before Age 4": the condition follows the rate
+        low, high = parse_age_condition(condition if condition else rates.split("%", 1)[-1])
+        if low is None or high is None:
+            continue
+        for part in rates.split("|"):
+            match = VET_PART_RE.search(part)
+            if match:
+                rate = float(match.group(2))
+                bands.append(CoinsuranceBand(low, high, parse_vet_type(part), 100 - rate if reimbursed else rate))
+    return tuple(bands)
+
+
+def coinsurance_info_bands(rows):
+    """Bands from coinsurance_info rows (min_age, max_age, vet_type, percentage) for one provider."""
+    bands = []
+    for min_age, max_age, vet_type, percentage in rows:
+        value = numeric_fields.parse_percentage(percentage)
+        if value is None:
+            continue
+        low = age_years(str(min_age)) if min_age not in (None, "") else 0.0
+        high = age_after(str(max_age)) if max_age not in (None, "") else float("inf")
+        bands.append(CoinsuranceBand(low or 0.0, high if high is not None else float("inf"),
+                                     parse_vet_type(vet_type), value))
+    return tuple(bands)
+
+
+def compile_rule(product, provider_bands=()):
+    min_age = age_years(_text(product.get("min_age"), product.get("min_age_zh")))
+    max_age = age_years(_text(product.get("max_age"), product.get("max_age_zh")))
+    excluded, cross = parse_excluded_breeds(product.get("breed_type_remark"))
+    bands, source = parse_coinsurance_text(product.get("coinsurance")), "product"
+    if not bands and provider_bands:
+        bands, source = tuple(provider_bands), "coinsurance_info"
+    return ProductRule(
+        insurance_id=int(product["insurance_id"]),
+        provider_id=int(product.get("provider_id") or 0),
+        name=product.get("insurance_name") or "",
+        name_zh=product.get("insurance_name_zh") or "",
+        species=parse_species(product),
+        min_age_years=min_age if min_age is not None else float("-inf"),
+        max_age_years=max_age if max_age is not None else float("inf"),
+        excluded_breeds=excluded,
+        excludes_cross_breeds=cross,
+        bands=bands,
+        band_source=source if bands else "none",
+    )
+
+
+PRODUCT_COLUMNS = ("insurance_id", "provider_id", "insurance_name", "insurance_name_zh", "min_age", "min_age_zh",
+                   "max_age", "max_age_zh", "coinsurance", "suitable_pet_type", "suitable_pet_type_zh",
+                   "cat_breed_type", "cat_breed_type_zh", "dog_breed_type", "dog_breed_type_zh", "breed_type_remark")
+
+
+def load_products(db_path=DB_PATH, products_json=None):
+    """Product dicts and coinsurance_info rows by provider, from the DB or an /insurance-products response."""
+    if products_json:
+        with open(products_json, encoding="utf-8") as f:
+            return json.load(f), {}
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        available = {row[1] for row in conn.execute("PRAGMA table_info(product)")}
+        columns = [c for c in PRODUCT_COLUMNS if c in available]
+        products = [dict(zip(columns, row))
+                    for row in conn.execute(f"SELECT {', '.join(columns)} FROM product ORDER BY insurance_id")]
+        bands = {}
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'coinsurance_info'").fetchone():
+            for provider_id, *row in conn.execute(
+                    "SELECT provider_id, min_age, max_age, vet_type, coinsurance_percentage FROM coinsurance_info"):
+                bands.setdefault(provider_id, []).append(row)
+        return products, bands
+    finally:
+        conn.close()
+
+
+def compile_rules(db_path=DB_PATH, products_json=None):
+    """ProductRules in insurance_id order, which is also the tie-break order of the ranking."""
+    products, provider_rows = load_products(db_path, products_json)
+    rules = [compile_rule(p, coinsurance_info_bands(provider_rows.get(p.get("provider_id"), ())))
+             for p in products]
+    return sorted(rules, key=lambda rule: rule.insurance_id)
+
+
+# --- Profiles ---
+
+@dataclass(frozen=True)
+class Profile:
+    profile_id: str
+    species: str
+    breed: str
+    age_years: float
+    vet_type: int  # ANY_VET when there is no preference
+
+
+def parse_species_name(text):
+    text = (text or "").strip().lower()
+    return next((s for s in SPECIES if any(word in text for word in SPECIES_WORDS[s])), text)
+
+
+def make_profile(profile_id, species, breed, age, vet_type, as_of=None):
+    """A Profile from loose input; `age` is years, or an ISO birth date."""
+    age = str(age).strip()
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", age):
+        age = ((as_of or date.today()) - date.fromisoformat(age)).days / 365.25
+    return Profile(str(profile_id), parse_species_name(species), breed or "", float(age),
+                   parse_vet_type(vet_type) if vet_type else ANY_VET)
+
+
+def read_profiles(path, as_of=None):
+    with open(path, encoding="utf-8", newline="") as f:
+        return [make_profile(row["profile_id"], row.get("species"), row.get("breed"),
+                             row.get("age_years") or row.get("birth_date"), row.get("vet_type"), as_of)
+                for row in csv.DictReader(f)]
+
+
+# --- Pure-Python reference ---
+
+def band_priority(band, vet_type):
+    """Lower is preferred; None if the band does not apply to a profile preferring `vet_type`."""
+    if vet_type == ANY_VET:
+        return 0 if band.vet_type == ANY_VET else 1
+    if band.vet_type == vet_type:
+        return 0
+    return 1 if band.vet_type == ANY_VET else None
+
+
+def effective_band(rule, profile):
+    best = None
+    for order, band in enumerate(rule.bands):
+        priority = band_priority(band, profile.vet_type)
+        if priority is not None and band.min_age_years <= profile.age_years < band.max_age_years:
+            if best is None or (priority, order) < best[0]:
+                best = ((priority, order), band)
+    return best[1] if best else None
+
+
+def is_eligible(rule, profile):
+    return (profile.species in rule.species
+            and rule.min_age_years <= profile.age_years <= rule.max_age_years
+            and not breed_excluded(profile.breed, rule.excluded_breeds, rule.excludes_cross_breeds))
+
+
+def match_profile(rules, profile, top=TOP_PLANS):
+    """Ranked (rule, band or None) for the plans `profile` is eligible for."""
+    matches = [(rule, effective_band(rule, profile)) for rule in rules if is_eligible(rule, profile)]
+    matches.sort(key=lambda m: (m[1] is None, m[1].percentage if m[1] else 0, m[0].insurance_id))
+    return matches[:top] if top else matches
+
+
+# --- NumPy ---
+
+class RuleArrays:
+    """ProductRules as arrays: per product bounds and species, plus all bands flattened in product order."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.insurance_id = np.array([r.insurance_id for r in rules], dtype=np.int64)
+        self.min_age = np.array([r.min_age_years for r in rules], dtype=np.float64)
+        self.max_age = np.array([r.max_age_years for r in rules], dtype=np.float64)
+        # One row per species code, plus an all-False row for unknown species
+        self.species_ok = np.array([[s in r.species for r in rules] for s in SPECIES] + [[False] * len(rules)],
+                                   dtype=bool).reshape(len(SPECIES) + 1, len(rules))
+        bands = [(i, band) for i, rule in enumerate(rules) for band in rule.bands]
+        self.band_count = len(bands)
+        self.band_min = np.array([b.min_age_years for _, b in bands], dtype=np.float64)
+        self.band_max = np.array([b.max_age_years for _, b in bands], dtype=np.float64)
+        self.band_vet = np.array([b.vet_type for _, b in bands], dtype=np.int64)
+        self.band_percentage = np.array([b.percentage for _, b in bands], dtype=np.float64)
+        # Products with bands, and where each one's bands start, for np.minimum.reduceat
+        counts = np.array([len(r.bands) for r in rules], dtype=np.int64)
+        self.banded = np.flatnonzero(counts)
+        self.band_starts = (np.cumsum(counts) - counts)[self.banded]
+        # rank[vet preference, band] = priority * band_count + band index, or NO_BAND if not applicable
+        self.no_band = (2 + 1) * max(self.band_count, 1)
+        self.rank = np.full((len(VET_TYPES), self.band_count), self.no_band, dtype=np.int64)
+        for preference in range(len(VET_TYPES)):
+            for b, (_, band) in enumerate(bands):
+                priority = band_priority(band, preference)
+                if priority is not None:
+                    self.rank[preference, b] = priority * self.band_count + b
+        self._breed_rows = {}
+
+    def breed_exclusions(self, breeds):
+        """(distinct breeds x products) exclusion mask and each profile's row in it."""
+        distinct, inverse = np.unique(np.asarray(breeds, dtype=object).astype(str), return_inverse=True)
+        rows = []
+        for breed in distinct.tolist():
+            row = self._breed_rows.get(breed)
+            if row is None:
+                row = np.array([breed_excluded(breed, r.excluded_breeds, r.excludes_cross_breeds)
+                                for r in self.rules], dtype=bool)
+                self._breed_rows[breed] = row
+            rows.append(row)
+        return np.array(rows, dtype=bool).reshape(len(distinct), len(self.rules)), inverse
+
+
+def match_chunk(arrays, species_codes, breeds, ages, vet_types, top):
+    """Ranked plans for one chunk of profiles.
+
+    Returns (order, eligible count, coinsurance, band vet type): order is
+    (profiles x top) product indexes, best first; the other two are
+    (profiles x products) with NaN / -1 where no band applies.
+    """
+    ages = ages[:, None]
+    excluded, breed_rows = arrays.breed_exclusions(breeds)
+    eligible = (arrays.species_ok[species_codes]
+                & (ages >= arrays.min_age) & (ages <= arrays.max_age)
+                & ~excluded[breed_rows])
+
+    profiles, products = eligible.shape
+    coinsurance = np.full((profiles, products), np.nan)
+    vet = np.full((profiles, products), -1, dtype=np.int64)
+    if arrays.band_count:
+        in_band = (ages >= arrays.band_min) & (ages < arrays.band_max)
+        rank = np.where(in_band, arrays.rank[vet_types], arrays.no_band)
+        best = np.minimum.reduceat(rank, arrays.band_starts, axis=1)
+        found = best < arrays.no_band
+        band = np.where(found, best % arrays.band_count, 0)
+        coinsurance[:, arrays.banded] = np.where(found, arrays.band_percentage[band], np.nan)
+        vet[:, arrays.banded] = np.where(found, arrays.band_vet[band], -1)
+
+    # Lower coinsurance first, unknown after known, ineligible last; ties keep insurance_id order
+    key = np.where(np.isnan(coinsurance), 1e9, coinsurance)
+    key = np.where(eligible, key, np.inf)
+    order = np.argsort(key, axis=1, kind="stable")[:, :top]
+    return order, eligible.sum(axis=1), coinsurance, vet
+
+
+def match_profiles(rules, profiles, top=TOP_PLANS, chunk_size=CHUNK_SIZE, arrays=None):
+    """Yield (profile, [(rule, coinsurance or None, vet type or None), ...]) for every profile."""
+    if np is None:
+        for profile in profiles:
+            yield profile, [(rule, band.percentage if band else None, VET_TYPES[band.vet_type] if band else None)
+                            for rule, band in match_profile(rules, profile, top)]
+        return
+    arrays = arrays or RuleArrays(rules)
+    top = min(top or len(rules), len(rules))
+    for start in range(0, len(profiles), chunk_size):
+        chunk = profiles[start:start + chunk_size]
+        species = np.array([SPECIES.index(p.species) if p.species in SPECIES else len(SPECIES) for p in chunk])
+        order, counts, coinsurance, vet = match_chunk(
+            arrays, species, [p.breed for p in chunk], np.array([p.age_years for p in chunk], dtype=np.float64),
+            np.array([p.vet_type for p in chunk], dtype=np.int64), top)
+        # Gather the top plans' values once, then build the Python tuples from plain lists
+        top_coinsurance = np.take_along_axis(coinsurance, order, axis=1)
+        top_vet = np.take_along_axis(vet, order, axis=1)
+        for profile, indexes, values, vets, count in zip(chunk, order.tolist(), top_coinsurance.tolist(),
+                                                         top_vet.tolist(), counts.tolist()):
+            yield profile, [(rules[index], None if value != value else value, VET_TYPES[v] if v >= 0 else None)
+                            for index, value, v in zip(indexes[:count], values, vets)]
+
+
+# --- Output, server and benchmark ---
+
+def plan_json(rule, coinsurance, vet_type):
+    return {"insurance_id": rule.insurance_id, "provider_id": rule.provider_id, "insurance_name": rule.name,
+            "insurance_name_zh": rule.name_zh, "coinsurance": coinsurance, "coinsurance_vet_type": vet_type}
+
+
+def write_matches(results, out):
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["profile_id", "rank", "insurance_id", "insurance_name", "coinsurance", "coinsurance_vet_type"])
+    profiles = matched = 0
+    for profile, plans in results:
+        profiles += 1
+        matched += bool(plans)
+        for rank, (rule, coinsurance, vet_type) in enumerate(plans, 1):
+            writer.writerow([profile.profile_id, rank, rule.insurance_id, rule.name,
+                             "" if coinsurance is None else f"{coinsurance:g}", vet_type or ""])
+    return profiles, matched
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "eligibility-matcher"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/recommendations":
+            return self.send_json(404, {"detail": "Not found"})
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            profile = make_profile("", query.get("species"), query.get("breed"), query["age"], query.get("vet_type"))
+            top = int(query.get("top", TOP_PLANS))
+        except (KeyError, ValueError):
+            return self.send_json(400, {"detail": "species, age (years or YYYY-MM-DD) and an integer top are required"})
+        _, plans = next(match_profiles(self.server.rules, [profile], top, arrays=self.server.arrays))
+        self.send_json(200, [plan_json(*plan) for plan in plans])
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rules, verbose=False):
+        super().__init__(address, RecommendationHandler)
+        self.rules = rules
+        self.arrays = RuleArrays(rules) if np is not None else None
+        self.verbose = verbose
+
+
+def synthetic_profiles(count, seed=0):
+    rng = random.Random(seed)
+    breeds = {"dog": ["Poodle", "Golden Retriever", "Shiba Inu", "Pit Bull Terrier", "Tibetan Mastiff",
+                      "Bull Terrier mix", "Mixed", "Corgi", "Fila Brasileiro", "Labrador cross"],
+              "cat": ["British Shorthair", "Ragdoll", "Domestic Shorthair", "Maine Coon", "Persian"]}
+    profiles = []
+    for i in range(count):
+        species = "dog" if rng.random() < 0.6 else "cat"
+        profiles.append(Profile(str(i + 1), species, rng.choice(breeds[species]),
+                                round(rng.uniform(0.05, 14), 2), rng.choice((ANY_VET, NETWORK, NON_NETWORK))))
+    return profiles
+
+
+def run_bench(rules, count, top, chunk_size, check, seed):
+    profiles = synthetic_profiles(count, seed)
+    print(f"{count} profiles x {len(rules)} products")
+    results = None
+    if np is not None:
+        start = time.perf_counter()
+        results = list(match_profiles(rules, profiles, top, chunk_size))
+        elapsed = time.perf_counter() - start
+        print(f"  numpy        {elapsed:.2f}s ({count / elapsed:,.0f} profiles/s, chunks of {chunk_size})")
+    if np is None or check:
+        start = time.perf_counter()
+        reference = [match_profile(rules, p, top) for p in profiles]
+        elapsed = time.perf_counter() - start
+        print(f"  pure Python  {elapsed:.2f}s ({count / elapsed:,.0f} profiles/s)")
+        if results is not None:
+            mismatches = sum(
+                [(r.insurance_id, b.percentage if b else None) for r, b in expected]
+                != [(r.insurance_id, c) for r, c, _ in plans]
+                for expected, (_, plans) in zip(reference, results))
+            print(f"  check        {'OK' if not mismatches else f'{mismatches} mismatches'}")
+            if mismatches:
+                sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match pet profiles against insurance plans.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rules_parser = sub.add_parser("rules", help="print the compiled rule of every plan")
+
+    match = sub.add_parser("match", help="rank eligible plans for every profile in a CSV")
+    match.add_argument("--profiles", required=True, help="CSV with profile_id,species,breed,age_years|birth_date,vet_type")
+    match.add_argument("--as-of", type=date.fromisoformat, default=None, help="date birth dates are aged to")
+    match.add_argument("--output", help="output CSV (default: stdout)")
+
+    serve = sub.add_parser("serve", help="serve GET /recommendations")
+    serve.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    serve.add_argument("--verbose", action="store_true", help="log every request")
+
+    bench = sub.add_parser("bench", help="time synthetic profiles")
+    bench.add_argument("--profiles", type=int, default=200_000, help="synthetic profiles (default: 200000)")
+    bench.add_argument("--check", action="store_true", help="compare with the pure-Python reference")
+    bench.add_argument("--seed", type=int, default=0)
+    for command in (rules_parser, match, serve, bench):
+        command.add_argument("--db", default=DB_PATH, help=f"served DB to read plans from (default: {DB_PATH})")
+        command.add_argument("--products-json", help="read plans from an /insurance-products response instead")
+    for command in (match, bench):
+        command.add_argument("--top", type=int, default=TOP_PLANS, help=f"plans per profile, 0 for all (default: {TOP_PLANS})")
+        command.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                             help=f"profiles per vectorized chunk (default: {CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    rules = compile_rules(args.db, args.products_json)
+    if args.command == "rules":
+        for rule in rules:
+            print(json.dumps(asdict(rule), ensure_ascii=False))
+    elif args.command == "match":
+        start = time.perf_counter()
+        profiles = read_profiles(args.profiles, args.as_of)
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            count, matched = write_matches(match_profiles(rules, profiles, args.top, args.chunk_size), out)
+        finally:
+            if args.output:
+                out.close()
+        print(f"{count} profiles, {matched} with at least one eligible plan, in {time.perf_counter() - start:.2f}s",
+              file=sys.stderr)
+    elif args.command == "bench":
+        run_bench(rules, args.profiles, args.top, args.chunk_size, args.check, args.seed)
+    else:
+        server = RecommendationServer((args.host, args.port), rules, args.verbose)
+        print(f"Eligibility matcher on http://{args.host}:{args.port}/recommendations ({len(rules)} plans, "
+              f"{'numpy' if np is not None else 'pure Python'})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
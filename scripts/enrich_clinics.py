@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+Enrich data/clinics.csv from Google Places, through a persistent cache
+
+Does what the Go clinics service's background enrichment does (FindPlace
+for clinics without a google_place_id, then Place Details, merged with the
+same rules), but remembers every answer in data/places_cache.db:
+
+- place_lookup: normalised name + address -> place_id, including "not
+  found" answers, so unmatched clinics are not searched again every run
+- place_details: place_id -> the Details result, its ETag and a content
+  hash
+
+Entries expire after a TTL (--details-ttl-days, --lookup-ttl-days,
+--negative-ttl-days). Expired details are refreshed conditionally: the
+stored ETag goes out as If-None-Match, and a 304 or an identical content
+hash only extends the entry. If a refresh fails, the stale entry is used.
+A rerun within the TTLs makes no API calls at all.
+
+Requests go through a pool of --workers async workers sharing a token
+bucket of --rps requests per second, with retries and backoff on 429/5xx
+and OVER_QUERY_LIMIT. The CSV is rewritten atomically, and only if some
+clinic changed.
+
+Without network, --offline enriches from the cache alone, and
+`fake-server` serves FindPlace/Details answers built from clinics.csv to
+point --places-url at.
+
+Usage:
+    python3 scripts/enrich_clinics.py [--csv PATH] [--cache PATH] [--workers 5] [--rps 10]
+        [--offline] [--force-refresh] [--missing-only] [--dry-run]
+    python3 scripts/enrich_clinics.py fake-server [--port 8003]
+    python3 scripts/enrich_clinics.py --places-url http://localhost:8003/maps/api/place --api-key test
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from export_static_snapshots import load_maps_api_key, write_atomic
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLINICS_CSV = os.path.join(REPO_ROOT, "data", "clinics.csv")
+CACHE_DB_PATH = os.path.join(REPO_ROOT, "data", "places_cache.db")
+
+PLACES_URL = "https://maps.googleapis.com/maps/api/place"
+FAKE_SERVER_PORT = 8003
+
+# Only what the merge uses; Details bills per field group
+DETAILS_FIELDS = "place_id,geometry/location,rating,international_phone_number,website,opening_hours,photos"
+
+DAY = 86400
+DETAILS_TTL_DAYS = 30
+LOOKUP_TTL_DAYS = 180
+NEGATIVE_TTL_DAYS = 7
+
+RETRYABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+NOT_FOUND_STATUSES = {"ZERO_RESULTS", "NOT_FOUND"}
+
+CLINIC_FIELDS = [
+    "clinic_id", "name", "address", "phone_regular", "phone_emergency", "whatsapp",
+    "opening_hours", "emergency_24h", "website_url", "applemap_url", "latitude", "longitude",
+    "rating", "google_place_id", "photo_reference",
+]
+
+
+class PlacesError(Exception):
+    """A Places request that failed after its retries, or was refused."""
+
+
+def lookup_key(name, address):
+    """Cache key for a FindPlace query: NFKC, case-folded, punctuation and spacing collapsed."""
+    text = unicodedata.normalize("NFKC", f"{name} {address}").casefold()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def content_hash(result):
+    return hashlib.sha256(json.dumps(result, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+# --- Cache ---
+
+class PlacesCache:
+    """place_lookup and place_details in one SQLite file."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS place_lookup (
+                query_key TEXT PRIMARY KEY,
+                place_id TEXT,              -- NULL: Places found nothing
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS place_details (
+                place_id TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                etag TEXT,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,   -- last time the content changed
+                checked_at REAL NOT NULL,   -- last time it was confirmed
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def get_lookup(self, key):
+        """(place_id or None, expires_at), or None if never looked up."""
+        return self.conn.execute(
+            "SELECT place_id, expires_at FROM place_lookup WHERE query_key = ?", (key,)).fetchone()
+
+    def put_lookup(self, key, place_id, ttl):
+        now = time.time()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO place_lookup VALUES (?, ?, ?, ?)",
+                              (key, place_id, now, now + ttl))
+
+    def get_details(self, place_id):
+        """(result dict, etag, content_hash, expires_at), or None."""
+        row = self.conn.execute(
+            "SELECT result, etag, content_hash, expires_at FROM place_details WHERE place_id = ?",
+            (place_id,)).fetchone()
+        return (json.loads(row[0]),) + row[1:] if row else None
+
+    def put_details(self, place_id, result, etag, ttl):
+        """Store a fetched result. Returns True if its content differs from the cached one."""
+        now = time.time()
+        digest = content_hash(result)
+        previous = self.conn.execute(
+            "SELECT content_hash FROM place_details WHERE place_id = ?", (place_id,)).fetchone()
+        if previous and previous[0] == digest:
+            self.touch_details(place_id, ttl, etag)
+            return False
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO place_details VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (place_id, json.dumps(result, ensure_ascii=False), etag, digest, now, now, now + ttl))
+        return True
+
+    def touch_details(self, place_id, ttl, etag=None):
+        """Extend an entry the server confirmed unchanged."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE place_details SET checked_at = ?, expires_at = ?, etag = COALESCE(?, etag) WHERE place_id = ?",
+                (now, now + ttl, etag, place_id))
+
+    def close(self):
+        self.conn.close()
+
+
+# --- HTTP ---
+
+class RateLimiter:
+    """Token bucket shared by the workers: `rps` requests per second, bursts of up to `burst`."""
+
+    def __init__(self, rps, burst=None):
+        self.rate = rps
+        self.capacity = burst or max(1.0, rps)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PlacesClient:
+    """FindPlace and Place Details over the legacy JSON API, rate limited and retried."""
+
+    def __init__(self, base_url, api_key, limiter, stats, timeout=10.0, retries=3):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.limiter = limiter
+        self.stats = stats
+        self.timeout = timeout
+        self.retries = retries
+
+    def _get(self, path, params, etag):
+        """Blocking GET. Returns (http status, body dict or None, etag)."""
+        url = f"{self.base_url}/{path}?{urlencode({**params, 'key': self.api_key})}"
+        request = urllib.request.Request(url, headers={"Accept": "application/json"})
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read()), response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, None, e.headers.get("ETag") or etag
+            raise
+
+    async def get(self, path, params, etag=None):
+        """GET with retries. Returns (http status, body or None, etag)."""
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            self.stats["api_calls"] += 1
+            try:
+                status, body, new_etag = await asyncio.get_running_loop().run_in_executor(
+                    None, self._get, path, params, etag)
+            except urllib.error.HTTPError as e:
+                if e.code != 429 and e.code < 500:
+                    raise PlacesError(f"HTTP {e.code}") from e
+                error = f"HTTP {e.code}"
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                error = str(getattr(e, "reason", e))
+            else:
+                if body is None or body.get("status") not in RETRYABLE_STATUSES:
+                    return status, body, new_etag
+                error = body["status"]
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+        raise PlacesError(error)
+
+    async def find_place(self, text):
+        """place_id of the best match for `text`, or None if Places has none."""
+        _, body, _ = await self.get("findplacefromtext/json",
+                                    {"input": text, "inputtype": "textquery", "fields": "place_id"})
+        if body.get("status") in NOT_FOUND_STATUSES:
+            return None
+        if body.get("status") != "OK":
+            raise PlacesError(body.get("error_message") or body.get("status"))
+        candidates = body.get("candidates") or []
+        return candidates[0].get("place_id") if candidates else None
+
+    async def details(self, place_id, etag=None):
+        """(result, etag), (None, etag) on 304, or raises. A vanished place returns ({}, None)."""
+        status, body, new_etag = await self.get("details/json", {"place_id": place_id, "fields": DETAILS_FIELDS},
+                                                etag)
+        if status == 304:
+            return None, new_etag
+        if body.get("status") in NOT_FOUND_STATUSES:
+            return {}, None
+        if body.get("status") != "OK":
+            raise PlacesError(body.get("error_message") or body.get("status"))
+        return body.get("result") or {}, new_etag
+
+
+# --- Enrichment ---
+
+class Enricher:
+    """Resolves clinics to Places details, cache first."""
+
+    def __init__(self, cache, client, stats, args):
+        self.cache = cache
+        self.client = client
+        self.stats = stats
+        self.offline = client is None
+        self.force_refresh = args.force_refresh
+        self.details_ttl = args.details_ttl_days * DAY
+        self.lookup_ttl = args.lookup_ttl_days * DAY
+        self.negative_ttl = args.negative_ttl_days * DAY
+
+    def fresh(self, expires_at):
+        return not self.force_refresh and expires_at > time.time()
+
+    async def resolve_place_id(self, clinic):
+        place_id = clinic["google_place_id"]
+        if place_id:
+            return place_id
+        key = lookup_key(clinic["name"], clinic["address"])
+        cached = self.cache.get_lookup(key)
+        if cached and (self.offline or self.fresh(cached[1])):
+            self.stats["lookup_hits"] += 1
+            return cached[0]
+        if self.offline:
+            self.stats["cache_misses"] += 1
+            return None
+        try:
+            place_id = await self.client.find_place(f"{clinic['name']} {clinic['address']}")
+        except PlacesError as e:
+            self.stats["errors"] += 1
+            print(f"FindPlace failed for {clinic['name']}: {e}")
+            if cached:
+                self.stats["stale"] += 1
+                return cached[0]
+            return None
+        self.cache.put_lookup(key, place_id, self.lookup_ttl if place_id else self.negative_ttl)
+        return place_id
+
+    async def place_details(self, place_id):
+        cached = self.cache.get_details(place_id)
+        if cached and (self.offline or self.fresh(cached[3])):
+            self.stats["details_hits"] += 1
+            return cached[0]
+        if self.offline:
+            self.stats["cache_misses"] += 1
+            return None
+        result, etag = None, None
+        try:
+            result, etag = await self.client.details(place_id, cached[1] if cached else None)
+        except PlacesError as e:
+            self.stats["errors"] += 1
+            print(f"Details failed for {place_id}: {e}")
+            if cached:
+                self.stats["stale"] += 1
+                return cached[0]
+            return None
+        if result is None:
+            self.stats["not_modified"] += 1
+            self.cache.touch_details(place_id, self.details_ttl, etag)
+            return cached[0]
+        if not result:
+            # Place closed or merged; keep what we had rather than wiping the clinic
+            return cached[0] if cached else None
+        if not self.cache.put_details(place_id, result, etag, self.details_ttl):
+            self.stats["not_modified"] += 1
+        return result
+
+    async def enrich(self, clinic):
+        """Return the clinic's row with Places data merged in (a new dict), or the row unchanged."""
+        place_id = await self.resolve_place_id(clinic)
+        if not place_id:
+            return clinic
+        details = await self.place_details(place_id)
+        return merge_details(clinic, place_id, details) if details else clinic
+
+
+def merge_details(clinic, place_id, details):
+    """Apply a Details result with the Go enrichment's rules (handlers/clinics.go)."""
+    row = dict(clinic, google_place_id=place_id)
+    location = (details.get("geometry") or {}).get("location") or {}
+    if (not row["latitude"] or not row["longitude"]) and "lat" in location and "lng" in location:
+        row["latitude"] = f"{location['lat']:f}"
+        row["longitude"] = f"{location['lng']:f}"
+    if details.get("rating"):
+        row["rating"] = f"{details['rating']:.1f}"
+    if details.get("international_phone_number"):
+        row["phone_regular"] = details["international_phone_number"]
+    if details.get("website"):
+        row["website_url"] = details["website"]
+    weekday_text = (details.get("opening_hours") or {}).get("weekday_text") or []
+    if weekday_text:
+        if not row["opening_hours"]:
+            row["opening_hours"] = "; ".join(weekday_text)
+        if any("open 24 hours" in day.lower() or "24-hour" in day.lower() for day in weekday_text):
+            row["emergency_24h"] = "TRUE"
+    photos = details.get("photos") or []
+    if photos and photos[0].get("photo_reference"):
+        row["photo_reference"] = photos[0]["photo_reference"]
+    return row
+
+
+def is_enriched(clinic):
+    """The Go service's skip test."""
+    return all(clinic[field] for field in ("google_place_id", "latitude", "longitude", "photo_reference"))
+
+
+async def enrich_all(clinics, enricher, workers, missing_only):
+    """Enrich every clinic with `workers` concurrent tasks. Returns the rows in order."""
+    results = list(clinics)
+    queue = asyncio.Queue()
+    for index, clinic in enumerate(clinics):
+        if not (missing_only and is_enriched(clinic)):
+            queue.put_nowait(index)
+
+    async def worker():
+        while not queue.empty():
+            index = queue.get_nowait()
+            results[index] = await enricher.enrich(clinics[index])
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    return results
+
+
+def load_rows(csv_path):
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        rows = [{field: row.get(field) or "" for field in CLINIC_FIELDS} for row in reader]
+    return rows
+
+
+def write_rows(csv_path, rows):
+    # Same header and "\n" line endings as the Go service's saveClinics
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CLINIC_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    write_atomic(csv_path, buffer.getvalue().encode("utf-8"))
+
+
+def run_enrichment(args):
+    clinics = load_rows(args.csv)
+    stats = dict.fromkeys(("api_calls", "retries", "lookup_hits", "details_hits", "not_modified",
+                           "stale", "cache_misses", "errors"), 0)
+    client = None
+    if not args.offline:
+        api_key = args.api_key or load_maps_api_key()
+        if not api_key:
+            print("MAPS_API_KEY is not set (use --api-key, or --offline to use the cache only).")
+            sys.exit(1)
+        client = PlacesClient(args.places_url, api_key, RateLimiter(args.rps), stats, args.timeout, args.retries)
+
+    cache = PlacesCache(args.cache)
+    start = time.perf_counter()
+    try:
+        async def run():
+            # One thread per worker for the blocking urllib calls
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(1, args.workers)))
+            enricher = Enricher(cache, client, stats, args)
+            return await enrich_all(clinics, enricher, args.workers, args.missing_only)
+
+        enriched = asyncio.run(run())
+    finally:
+        cache.close()
+
+    changed = [new for old, new in zip(clinics, enriched) if old != new]
+    for row in changed:
+        print(f"Enriched: {row['name']} (Rating: {row['rating'] or '-'})")
+    summary = ", ".join(f"{value} {name.replace('_', ' ')}" for name, value in stats.items())
+    print(f"{len(clinics)} clinics, {len(changed)} changed in {time.perf_counter() - start:.2f}s ({summary}).")
+    if changed and not args.dry_run:
+        write_rows(args.csv, enriched)
+        print(f"Saved updated clinics data to {args.csv}")
+    return stats
+
+
+# --- Fake Places server ---
+
+class FakePlaces:
+    """FindPlace/Details answers built from a clinics CSV."""
+
+    def __init__(self, csv_path):
+        self.places = {}
+        self.by_key = {}
+        self.by_name = []
+        for row in load_rows(csv_path):
+            place_id = row["google_place_id"] or f"fake-{row['clinic_id']}"
+            self.places[place_id] = self.details_for(place_id, row)
+            self.by_key[lookup_key(row["name"], row["address"])] = place_id
+            self.by_name.append((lookup_key(row["name"], ""), place_id))
+        # Longest name first, so "Pets Central North Point" wins over "Pets Central"
+        self.by_name.sort(key=lambda item: -len(item[0]))
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    @staticmethod
+    def details_for(place_id, row):
+        result = {"place_id": place_id}
+        if row["latitude"] and row["longitude"]:
+            result["geometry"] = {"location": {"lat": float(row["latitude"]), "lng": float(row["longitude"])}}
+        if row["rating"]:
+            result["rating"] = float(row["rating"])
+        if row["phone_regular"]:
+            result["international_phone_number"] = row["phone_regular"]
+        if row["website_url"]:
+            result["website"] = row["website_url"]
+        if row["opening_hours"]:
+            result["opening_hours"] = {"weekday_text": [part.strip() for part in row["opening_hours"].split(";")]}
+        if row["photo_reference"]:
+            result["photos"] = [{"photo_reference": row["photo_reference"]}]
+        return result
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def find(self, text):
+        key = lookup_key(text, "")
+        if key in self.by_key:
+            return self.by_key[key]
+        return next((place_id for name_key, place_id in self.by_name if name_key and name_key in key), None)
+
+
+class FakePlacesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "fake-places"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def send_json(self, status, payload, etag=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fake = self.server.fake
+        parts = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        if parts.path == "/stats":
+            with fake.lock:
+                return self.send_json(200, dict(fake.counts))
+        if not query.get("key"):
+            fake.count("denied")
+            return self.send_json(200, {"status": "REQUEST_DENIED", "error_message": "The provided API key is invalid."})
+
+        if parts.path.endswith("/findplacefromtext/json"):
+            fake.count("findplace")
+            place_id = fake.find(query.get("input", ""))
+            if place_id is None:
+                return self.send_json(200, {"candidates": [], "status": "ZERO_RESULTS"})
+            return self.send_json(200, {"candidates": [{"place_id": place_id}], "status": "OK"})
+
+        if parts.path.endswith("/details/json"):
+            result = fake.places.get(query.get("place_id", ""))
+            if result is None:
+                fake.count("details")
+                return self.send_json(200, {"status": "NOT_FOUND"})
+            etag = '"' + content_hash(result)[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                fake.count("details_304")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            fake.count("details")
+            return self.send_json(200, {"result": result, "status": "OK"}, etag)
+
+        self.send_json(404, {"status": "INVALID_REQUEST"})
+
+
+def run_fake_server(args):
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakePlacesHandler)
+    server.fake = FakePlaces(args.csv)
+    server.verbose = args.verbose
+    print(f"Fake Places API for {len(server.fake.places)} clinics on "
+          f"http://127.0.0.1:{args.port}/maps/api/place (GET /stats for request counts)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrich clinics.csv from Google Places through an on-disk cache.")
+    parser.add_argument("--csv", default=CLINICS_CSV, help=f"clinics CSV (default: {CLINICS_CSV})")
+    sub = parser.add_subparsers(dest="command")
+    fake = sub.add_parser("fake-server", help="serve FindPlace/Details answers built from the CSV")
+    fake.add_argument("--port", type=int, default=FAKE_SERVER_PORT, help=f"port (default: {FAKE_SERVER_PORT})")
+    fake.add_argument("--verbose", action="store_true", help="log every request")
+
+    parser.add_argument("--cache", default=CACHE_DB_PATH, help=f"cache database (default: {CACHE_DB_PATH})")
+    parser.add_argument("--places-url", default=PLACES_URL, help=f"Places API base URL (default: {PLACES_URL})")
+    parser.add_argument("--api-key", help="Places API key (default: MAPS_API_KEY from the environment or .env)")
+    parser.add_argument("--workers", type=int, default=5, help="concurrent requests (default: 5)")
+    parser.add_argument("--rps", type=float, default=10.0, help="request rate limit, 0 for none (default: 10)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds (default: 10)")
+    parser.add_argument("--retries", type=int, default=3, help="retries on 429/5xx/OVER_QUERY_LIMIT (default: 3)")
+    parser.add_argument("--details-ttl-days", type=float, default=DETAILS_TTL_DAYS,
+                        help=f"days before details are rechecked (default: {DETAILS_TTL_DAYS})")
+    parser.add_argument("--lookup-ttl-days", type=float, default=LOOKUP_TTL_DAYS,
+                        help=f"days before a name/address match is searched again (default: {LOOKUP_TTL_DAYS})")
+    parser.add_argument("--negative-ttl-days", type=float, default=NEGATIVE_TTL_DAYS,
+                        help=f"days before an unmatched clinic is searched again (default: {NEGATIVE_TTL_DAYS})")
+    parser.add_argument("--offline", action="store_true", help="use the cache only, expired or not; no requests")
+    parser.add_argument("--force-refresh", action="store_true", help="treat every cache entry as expired")
+    parser.add_argument("--missing-only", action="store_true",
+                        help="skip clinics that already have a place ID, coordinates and photo, like the Go service")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing the CSV")
+    args = parser.parse_args(argv)
+
+    if args.command == "fake-server":
+        run_fake_server(args)
+    else:
+        run_enrichment(args)
+
+
+if __name__ == "__main__":
+    main()
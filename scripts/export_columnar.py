@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Export the insurance and clinic datasets to Parquet / Arrow IPC
+
+Writes each table of the normalised pet_insurance.db schema (product,
+coverage, coverage_limit, sub_coverage, coinsurance_info,
+insurance_provider) and data/clinics.csv as columnar files, so
+downstream jobs can memory-map them and read only the columns they need
+instead of walking SQLite cursors.
+
+- Column types follow the declared SQLite types; INTEGER/REAL columns
+  that hold non-numeric text fall back to strings.
+- Text columns with repeated values (distinct/total at most
+  --dictionary-ratio) are dictionary-encoded in both formats.
+- Arrow IPC files are written uncompressed so they can be memory-mapped;
+  Parquet uses zstd.
+- Every file is written to a temp name and renamed into place, and a
+  manifest.json lists row counts and schemas.
+
+Requires pyarrow (pip install pyarrow).
+
+Usage:
+    python3 scripts/export_columnar.py [--db PATH] [--out-dir DIR] [--format parquet|arrow|both]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+CLINICS_CSV = os.path.join(REPO_ROOT, "data", "clinics.csv")
+OUT_DIR = os.path.join(REPO_ROOT, "data", "columnar")
+
+TABLES = ["insurance_provider", "product", "coverage", "coverage_limit", "sub_coverage", "coinsurance_info"]
+
+# Text columns at or below this distinct/total ratio are dictionary-encoded
+DICTIONARY_RATIO = 0.5
+FETCH_SIZE = 10000
+ROW_GROUP_SIZE = 64 * 1024
+
+CLINIC_TYPES = {
+    "clinic_id": "int", "latitude": "float", "longitude": "float", "rating": "float", "emergency_24h": "bool",
+}
+
+
+def sqlite_kind(declared_type):
+    """Map a declared SQLite column type to 'int', 'float' or 'str' using SQLite's affinity rules."""
+    declared = (declared_type or "").upper()
+    if "INT" in declared:
+        return "int"
+    if any(name in declared for name in ("CHAR", "CLOB", "TEXT")) or not declared:
+        return "str"
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB", "NUMERIC", "DECIMAL")):
+        return "float"
+    return "str"
+
+
+def to_arrow_array(values, kind, dictionary_ratio):
+    """Build a typed Arrow array, falling back to strings when the values don't fit `kind`."""
+    arrow_type = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_()}.get(kind)
+    if arrow_type is not None:
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            pass
+    array = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+    non_null = len(array) - array.null_count
+    if non_null and len(array.unique()) / non_null <= dictionary_ratio:
+        return array.dictionary_encode()
+    return array
+
+
+def read_table(conn, table, dictionary_ratio):
+    """Read one SQLite table into a pyarrow.Table."""
+    columns = [(row[1], sqlite_kind(row[2])) for row in conn.execute(f"PRAGMA table_info({table})")]
+    cursor = conn.execute(f"SELECT {', '.join(name for name, _ in columns)} FROM {table}")
+    cursor.arraysize = FETCH_SIZE
+    rows = []
+    while True:
+        batch = cursor.fetchmany()
+        if not batch:
+            break
+        rows.extend(batch)
+    values = list(zip(*rows)) if rows else [() for _ in columns]
+    return pa.table({name: to_arrow_array(list(column), kind, dictionary_ratio)
+                     for (name, kind), column in zip(columns, values)})
+
+
+def parse_clinic_value(value, kind):
+    value = value.strip()
+    if kind == "bool":
+        return {"TRUE": True, "FALSE": False}.get(value.upper())
+    if not value:
+        return None
+    try:
+        return int(value) if kind == "int" else float(value)
+    except ValueError:
+        return None
+
+
+def read_clinics(csv_path, dictionary_ratio):
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [record + [""] * (len(header) - len(record)) for record in reader]
+    columns = {}
+    for i, name in enumerate(header):
+        kind = CLINIC_TYPES.get(name, "str")
+        values = [row[i] if kind == "str" else parse_clinic_value(row[i], kind) for row in rows]
+        columns[name] = to_arrow_array(values, kind, dictionary_ratio)
+    return pa.table(columns)
+
+
+def replace_atomically(path, write):
+    """Call `write(tmp_path)` and rename the result over `path`."""
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_parquet(table, path):
+    replace_atomically(path, lambda tmp: pq.write_table(
+        table, tmp, compression="zstd", use_dictionary=True, row_group_size=ROW_GROUP_SIZE))
+
+
+def write_arrow(table, path):
+    def write(tmp):
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=ROW_GROUP_SIZE)
+    replace_atomically(path, write)
+
+
+def export_dataset(name, table, out_dir, formats):
+    """Write `table` in each of `formats`. Returns its manifest entry."""
+    files = {}
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        (write_parquet if fmt == "parquet" else write_arrow)(table, path)
+        files[fmt] = {"file": os.path.basename(path), "bytes": os.path.getsize(path)}
+    return {
+        "rows": table.num_rows,
+        "columns": {field.name: str(field.type) for field in table.schema},
+        "files": files,
+    }
+
+
+def export_columnar(db_path=DB_PATH, clinics_csv=CLINICS_CSV, out_dir=OUT_DIR, formats=("parquet", "arrow"),
+                    tables=TABLES, dictionary_ratio=DICTIONARY_RATIO):
+    os.makedirs(out_dir, exist_ok=True)
+    datasets = {}
+    start = time.perf_counter()
+
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in tables:
+                if table not in existing:
+                    print(f"  - {table}: not in {db_path}, skipped")
+                    continue
+                datasets[table] = export_dataset(table, read_table(conn, table, dictionary_ratio), out_dir, formats)
+        finally:
+            conn.close()
+    else:
+        print(f"Skipping insurance tables: {db_path} not found.")
+
+    if os.path.exists(clinics_csv):
+        datasets["clinics"] = export_dataset("clinics", read_clinics(clinics_csv, dictionary_ratio), out_dir, formats)
+    else:
+        print(f"Skipping clinics: {clinics_csv} not found.")
+
+    manifest = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pyarrow": pa.__version__,
+        "datasets": datasets,
+    }
+    replace_atomically(os.path.join(out_dir, "manifest.json"), lambda tmp: _write_json(tmp, manifest))
+
+    for name, entry in datasets.items():
+        sizes = ", ".join(f"{fmt} {info['bytes']:,}B" for fmt, info in entry["files"].items())
+        encoded = sum(1 for column_type in entry["columns"].values() if column_type.startswith("dictionary"))
+        print(f"  - {name}: {entry['rows']} rows, {len(entry['columns'])} columns "
+              f"({encoded} dictionary-encoded); {sizes}")
+    print(f"Exported {len(datasets)} datasets to {out_dir} in {time.perf_counter() - start:.2f}s.")
+    return manifest
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export insurance tables and clinics to Parquet / Arrow IPC.")
+    parser.add_argument("--db", default=DB_PATH, help=f"insurance database (default: {DB_PATH})")
+    parser.add_argument("--clinics", default=CLINICS_CSV, help=f"clinics CSV (default: {CLINICS_CSV})")
+    parser.add_argument("--out-dir", default=OUT_DIR, help=f"output directory (default: {OUT_DIR})")
+    parser.add_argument("--format", choices=("parquet", "arrow", "both"), default="both",
+                        help="output format (default: both)")
+    parser.add_argument("--tables", nargs="+", default=TABLES, help="database tables to export")
+    parser.add_argument("--dictionary-ratio", type=float, default=DICTIONARY_RATIO,
+                        help=f"dictionary-encode text columns at or below this distinct ratio "
+                             f"(default: {DICTIONARY_RATIO})")
+    args = parser.parse_args(argv)
+
+    if pa is None:
+        print("Error: pyarrow is required (pip install pyarrow).")
+        sys.exit(1)
+    formats = ("parquet", "arrow") if args.format == "both" else (args.format,)
+    export_columnar(args.db, args.clinics, args.out_dir, formats, args.tables, args.dictionary_ratio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Export static endpoint snapshots
+
+Writes the responses of the endpoints whose data only changes when the
+offline scripts run (/vaccines, /insurance-companies, /coverage-list)
+as pre-serialized JSON files, plus gzip and brotli
+variants, and a manifest with a content-hash ETag per endpoint. The Go
+server (handlers/snapshots.go) serves these bytes straight from disk and
+answers If-None-Match with 304.
+
+The JSON is encoded the way Go's json.Encoder does it (field order, HTML
+escaping, trailing newline), so clients see identical bodies either way.
+
+/clinics is not exported: the Go clinics service enriches the CSV rows
+from Google Places at startup and builds photo URLs with MAPS_API_KEY,
+so a file written here would be stale and would persist the key.
+
+Files are content-addressed (`<endpoint>.<etag>.json`); the manifest is
+replaced atomically and carries a version that increases whenever any
+endpoint's content changes. Files referenced by neither the new nor the
+previous manifest are removed; files of endpoints that are no longer
+exported are removed right away.
+
+Usage:
+    python3 scripts/export_static_snapshots.py [--out-dir DIR] [--db PATH]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+
+try:
+    import brotli
+except ImportError:  # optional: only the .br variants are skipped
+    brotli = None
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+VACCINES_JSON = os.path.join(DATA_DIR, "vaccines.json")
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+MANIFEST_NAME = "manifest.json"
+
+
+def go_json(value):
+    """Encode like Go's json.NewEncoder(w).Encode(value)."""
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    for char, escaped in (("<", "\\u003c"), (">", "\\u003e"), ("&", "\\u0026"),
+                          ("\u2028", "\\u2028"), ("\u2029", "\\u2029")):
+        text = text.replace(char, escaped)
+    return (text + "\n").encode("utf-8")
+
+
+def load_maps_api_key():
+    """MAPS_API_KEY from the environment or the repo's .env, as the Go config does."""
+    key = os.environ.get("MAPS_API_KEY", "")
+    env_path = os.path.join(REPO_ROOT, ".env")
+    if not key and os.path.exists(env_path):
+        with open(env_path, encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.strip().partition("=")
+                if name.strip() == "MAPS_API_KEY":
+                    key = value.strip().strip("'\"")
+    return key
+
+
+def export_vaccines():
+    # The Go handler streams the file unchanged
+    with open(VACCINES_JSON, "rb") as f:
+        return f.read()
+
+
+def export_insurance_companies(conn):
+    rows = conn.execute(
+        "SELECT company_id, company_name, company_name_zh, company_logo FROM insurance_provider")
+    companies = [
+        {"company_id": company_id, "company_name": name, "company_name_zh": name_zh, "company_logo": logo}
+        for company_id, name, name_zh, logo in rows
+        if name is not None  # the Go handler drops rows whose NOT NULL scan fails
+    ]
+    return go_json(companies or None)
+
+
+def export_coverage_list(conn):
+    rows = conn.execute("SELECT coverage_id, coverage_type, coverage_type_zh FROM coverage_list")
+    items = [
+        {"coverage_id": coverage_id, "coverage_type": coverage_type, "coverage_type_zh": coverage_type_zh}
+        for coverage_id, coverage_type, coverage_type_zh in rows
+        if coverage_type is not None
+    ]
+    return go_json(items or None)
+
+
+def collect_payloads(db_path):
+    """Return {endpoint: body bytes} for every static endpoint."""
+    payloads = {
+        "vaccines": export_vaccines(),
+    }
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            payloads["insurance-companies"] = export_insurance_companies(conn)
+            payloads["coverage-list"] = export_coverage_list(conn)
+        finally:
+            conn.close()
+    else:
+        print(f"Skipping insurance endpoints: {db_path} not found.")
+    return payloads
+
+
+def write_atomic(path, data):
+    """Write bytes to `path` via a temp file and os.replace."""
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_variants(out_dir, endpoint, body):
+    """Write the identity/gzip/brotli files for one body. Returns its manifest entry."""
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    base = f"{endpoint}.{digest}.json"
+    entry = {
+        "etag": f'"{digest}"',
+        "content_type": "application/json",
+        "files": {"identity": base},
+        "bytes": {"identity": len(body)},
+    }
+
+    variants = [("identity", base, lambda: body),
+                ("gzip", base + ".gz", lambda: gzip.compress(body, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(("br", base + ".br", lambda: brotli.compress(body, quality=11)))
+
+    for encoding, name, encode in variants:
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            size = os.path.getsize(path)  # content-addressed: already written by an earlier run
+        else:
+            data = encode()
+            write_atomic(path, data)
+            size = len(data)
+        entry["files"][encoding] = name
+        entry["bytes"][encoding] = size
+    return entry
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prune(out_dir, manifest, previous=None):
+    """Remove snapshot files referenced by neither `manifest` nor `previous`.
+
+    `previous` only protects files of endpoints `manifest` still has, for
+    readers that loaded it a moment ago; dropped endpoints go right away.
+    """
+    keep = {MANIFEST_NAME}
+    for entry in manifest["endpoints"].values():
+        keep.update(entry["files"].values())
+    if previous:
+        for endpoint, entry in previous["endpoints"].items():
+            if endpoint in manifest["endpoints"]:
+                keep.update(entry["files"].values())
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name not in keep and not name.startswith("."):
+            os.remove(os.path.join(out_dir, name))
+            removed += 1
+    return removed
+
+
+def export_snapshots(out_dir=SNAPSHOT_DIR, db_path=DB_PATH):
+    """Export every static endpoint and publish a new manifest if anything changed."""
+    os.makedirs(out_dir, exist_ok=True)
+    previous = load_manifest(out_dir)
+
+    endpoints = {endpoint: write_variants(out_dir, endpoint, body)
+                 for endpoint, body in collect_payloads(db_path).items()}
+
+    if previous and previous["endpoints"] == endpoints:
+        print(f"Snapshots unchanged (version {previous['version']}).")
+        return previous
+
+    manifest = {
+        "version": (previous["version"] + 1) if previous else 1,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "endpoints": endpoints,
+    }
+    write_atomic(os.path.join(out_dir, MANIFEST_NAME),
+                 json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    removed = prune(out_dir, manifest, previous)
+
+    print(f"Snapshots version {manifest['version']} written to {out_dir}:")
+    for endpoint, entry in endpoints.items():
+        sizes = ", ".join(f"{enc} {size:,}B" for enc, size in entry["bytes"].items())
+        print(f"  - /{endpoint} {entry['etag']}: {sizes}")
+    if brotli is None:
+        print("  (brotli module not installed; .br variants skipped)")
+    if removed:
+        print(f"Removed {removed} stale snapshot files.")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export pre-serialized snapshots of static endpoints.")
+    parser.add_argument("--out-dir", default=SNAPSHOT_DIR, help=f"output directory (default: {SNAPSHOT_DIR})")
+    parser.add_argument("--db", default=DB_PATH, help=f"insurance database (default: {DB_PATH})")
+    args = parser.parse_args(argv)
+    export_snapshots(args.out_dir, args.db)
+
+
+if __name__ == "__main__":
+    main()
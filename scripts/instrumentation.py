@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Stage timing, SQL tracing and profiling for the data scripts
+
+Shared by build_insurance_db.py, migrate_pet_insurance_db.py (and the
+refactor/fix wrappers around it), update_tags.py, comparison_tables.py
+and search_index.py. Each script wraps its main() in `run()` and marks
+its stages with `@staged` or `with stage(name)`; stages nest, so a build
+reports e.g. `full_build/create_indexes`.
+
+Off by default. Turned on per run with flags (scripts with arguments) or
+environment variables (every script, including the fix_* wrappers):
+
+    --metrics PATH      PETWELL_METRICS=PATH      append JSON lines to PATH ('-' for stderr)
+    --trace-sql         PETWELL_TRACE_SQL=1       per-statement counts and durations per stage
+    --trace-memory      PETWELL_TRACE_MEMORY=1    per-stage Python heap peak (tracemalloc)
+    --profile PATH      PETWELL_PROFILE=PATH      cProfile (.prof) or pyinstrument (.html/.txt)
+
+Any of them also prints a per-stage summary to stderr at the end. With
+none set, `staged` functions run directly and `stage()` is a shared
+nullcontext.
+
+Every stage reports wall time, CPU time (including reaped worker
+processes, e.g. the --data-dir pool) and the process's peak RSS. SQL
+tracing uses set_trace_callback, with bound values replaced by `?` so
+executemany rows aggregate into one statement, plus a progress handler
+counting VM steps. A statement's duration runs until the next statement
+on the same connection (or the end of its stage), so it includes any
+Python work in between, such as building the next batch of rows.
+
+Records, one JSON object per line:
+    {"event": "stage", "run_id": ..., "script": ..., "stage": "full_build/create_indexes",
+     "wall_seconds": ..., "cpu_seconds": ..., "peak_rss_kb": ..., "rss_growth_kb": ...,
+     "heap_peak_kb": ..., "sql": {"statements": ..., "seconds": ..., "top": [...]}}
+    {"event": "run", "run_id": ..., "script": ..., "status": "ok" | "error" | "exit", ...}
+
+Usage:
+    PETWELL_METRICS=build.jsonl PETWELL_TRACE_SQL=1 python3 scripts/build_insurance_db.py
+    python3 scripts/build_insurance_db.py --metrics - --trace-sql --profile build.prof
+    python3 scripts/instrumentation.py build.jsonl      # summarise a metrics file
+"""
+
+import argparse
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# SQLite VM instructions between progress handler calls
+PROGRESS_OPS = 1000
+# Statements listed per stage record, by total duration
+TOP_STATEMENTS = 10
+MAX_SQL_LENGTH = 400
+
+SQL_LITERAL_RE = re.compile(r"'[^']*(?:''[^']*)*'|\b\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+SQL_WHITESPACE_RE = re.compile(r"\s+")
+SQL_VALUE_LIST_RE = re.compile(r"\(\?(?:, \?)+\)")
+
+_NULL_STAGE = contextlib.nullcontext()
+_recorder = None
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process and its children, in KiB (None where unavailable)."""
+    if resource is None:
+        return None
+    scale = 1024 if sys.platform == "darwin" else 1  # ru_maxrss is bytes on macOS
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    return max(own, children)
+
+
+def cpu_seconds():
+    """User + system CPU of this process and its reaped children."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalise(sql):
+    sql = SQL_WHITESPACE_RE.sub(" ", sql).strip()
+    sql = SQL_VALUE_LIST_RE.sub("(?, ...)", SQL_LITERAL_RE.sub("?", sql))
+    return sql if len(sql) <= MAX_SQL_LENGTH else sql[:MAX_SQL_LENGTH] + "..."
+
+
+def normalise_sql(sql):
+    """Collapse whitespace and replace literals with ? so repeated statements aggregate.
+
+    The callback sees SQL with bound values expanded, so every executemany row
+    is a new string; cutting INSERTs at VALUES lets the cached prefix do the work.
+    """
+    values = sql.find("VALUES")
+    if values != -1 and sql.startswith(("INSERT", "REPLACE"), len(sql) - len(sql.lstrip())):
+        return _normalise(sql[:values]) + " VALUES (?, ...)"
+    return _normalise(sql)
+
+
+class Stage:
+    """Measurements for one open stage."""
+
+    def __init__(self, path):
+        self.path = path
+        self.wall_start = time.perf_counter()
+        self.cpu_start = cpu_seconds()
+        self.rss_start = peak_rss_kb()
+        self.heap_peak = 0
+        self.sql = {}  # normalised SQL -> [count, seconds, vm_steps]
+
+    def add_sql(self, key, seconds=0.0, count=0, vm_steps=0):
+        entry = self.sql.get(key)
+        if entry is None:
+            entry = self.sql[key] = [0, 0.0, 0]
+        entry[0] += count
+        entry[1] += seconds
+        entry[2] += vm_steps
+
+
+class ConnectionTrace:
+    """The statement currently running on one traced connection."""
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.stage = None
+        self.key = None
+        self.start = 0.0
+
+    def close(self, now=None):
+        if self.key is not None:
+            self.stage.add_sql(self.key, (now or time.perf_counter()) - self.start)
+            self.key = None
+
+    def on_statement(self, sql):
+        now = time.perf_counter()
+        self.close(now)
+        stage = self.recorder.current_stage()
+        if stage is None:
+            return
+        self.stage, self.key, self.start = stage, normalise_sql(sql), now
+        stage.add_sql(self.key, count=1)
+
+    def on_progress(self):
+        if self.key is not None:
+            self.stage.add_sql(self.key, vm_steps=PROGRESS_OPS)
+        return 0
+
+
+class Recorder:
+    """Collects stage records for one script run and writes them out."""
+
+    def __init__(self, script, metrics=None, trace_sql=False, trace_memory=False, profile=None):
+        self.script = script
+        self.metrics = metrics
+        self.trace_sql = trace_sql
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{os.getpid()}"
+        self.stack = []
+        self.records = []
+        self.traces = []
+        self.profiler = None
+        self.root = None
+
+    def current_stage(self):
+        return self.stack[-1] if self.stack else None
+
+    # Stages
+
+    def enter(self, name):
+        # A statement still "running" when a stage opens ends there, not when the stage closes
+        self.close_statements()
+        parent = self.current_stage()
+        stage = Stage(f"{parent.path}/{name}" if parent and parent is not self.root else name)
+        if self.trace_memory:
+            # The child gets its own peak; the parent keeps the larger of both
+            if parent is not None:
+                parent.heap_peak = max(parent.heap_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.stack.append(stage)
+        return stage
+
+    def exit(self, stage):
+        now = time.perf_counter()
+        self.close_statements(now)
+        self.stack.pop()
+        parent = self.current_stage()
+        if self.trace_memory:
+            stage.heap_peak = max(stage.heap_peak, tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent.heap_peak = max(parent.heap_peak, stage.heap_peak)
+            tracemalloc.reset_peak()
+        if stage is not self.root:
+            self.emit(self.stage_record(stage, now))
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stage = self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit(stage)
+
+    def stage_record(self, stage, now):
+        peak = peak_rss_kb()
+        record = {
+            "event": "stage",
+            "run_id": self.run_id,
+            "script": self.script,
+            "stage": stage.path,
+            "wall_seconds": round(now - stage.wall_start, 6),
+            "cpu_seconds": round(cpu_seconds() - stage.cpu_start, 6),
+            "peak_rss_kb": peak,
+            "rss_growth_kb": None if peak is None else peak - stage.rss_start,
+        }
+        if self.trace_memory:
+            record["heap_peak_kb"] = stage.heap_peak // 1024
+        if self.trace_sql:
+            top = sorted(stage.sql.items(), key=lambda item: item[1][1], reverse=True)[:TOP_STATEMENTS]
+            record["sql"] = {
+                "statements": sum(entry[0] for entry in stage.sql.values()),
+                "seconds": round(sum(entry[1] for entry in stage.sql.values()), 6),
+                "top": [{"sql": sql, "count": count, "seconds": round(seconds, 6), "vm_steps": vm_steps}
+                        for sql, (count, seconds, vm_steps) in top],
+            }
+        return record
+
+    # Connections
+
+    def close_statements(self, now=None):
+        now = now or time.perf_counter()
+        for trace in self.traces:
+            trace.close(now)
+
+    def watch(self, conn):
+        trace = ConnectionTrace(self)
+        conn.set_trace_callback(trace.on_statement)
+        conn.set_progress_handler(trace.on_progress, PROGRESS_OPS)
+        self.traces.append(trace)
+
+    # Run lifecycle
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile:
+            self.profiler = self.start_profiler()
+        self.root = self.enter(self.script)
+
+    def start_profiler(self):
+        if self.profile.endswith((".html", ".txt")):
+            if pyinstrument is not None:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                return profiler
+            self.profile = os.path.splitext(self.profile)[0] + ".prof"
+            print(f"pyinstrument not installed; writing a cProfile dump to {self.profile} instead.",
+                  file=sys.stderr)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profiler(self):
+        if isinstance(self.profiler, cProfile.Profile):
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile)
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(15)
+            print(out.getvalue(), file=sys.stderr)
+        else:
+            self.profiler.stop()
+            with open(self.profile, "w", encoding="utf-8") as f:
+                f.write(self.profiler.output_html() if self.profile.endswith(".html")
+                        else self.profiler.output_text(unicode=True))
+        print(f"Profile written to {self.profile}", file=sys.stderr)
+
+    def finish(self, status, error=None):
+        while self.stack:
+            self.exit(self.stack[-1])
+        now = time.perf_counter()
+        record = self.stage_record(self.root, now)
+        record.update(event="run", status=status, error=error, stages=len(self.records))
+        del record["stage"]
+        if self.trace_sql:
+            # Statements run outside every stage are still worth seeing
+            record["sql"]["statements"] += sum(e["sql"]["statements"] for e in self.records)
+            record["sql"]["seconds"] = round(record["sql"]["seconds"]
+                                             + sum(e["sql"]["seconds"] for e in self.records), 6)
+        if self.profiler is not None:
+            self.stop_profiler()
+        self.emit(record)
+        if self.trace_memory:
+            tracemalloc.stop()
+        print_summary(self.records, file=sys.stderr)
+
+    def emit(self, record):
+        if record["event"] == "stage":
+            self.records.append(record)
+        if not self.metrics:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        if self.metrics == "-":
+            print(line, file=sys.stderr)
+        else:
+            with open(self.metrics, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def add_arguments(parser):
+    """Add --metrics, --trace-sql, --trace-memory and --profile to an argparse parser."""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--metrics", metavar="PATH", help="append per-stage JSON lines to PATH ('-' for stderr)")
+    group.add_argument("--trace-sql", action="store_true", help="record SQL statement counts and durations")
+    group.add_argument("--trace-memory", action="store_true", help="record per-stage Python heap peaks")
+    group.add_argument("--profile", metavar="PATH",
+                       help="write a cProfile (.prof) or pyinstrument (.html/.txt) profile to PATH")
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+@contextlib.contextmanager
+def run(script, args=None):
+    """Instrument the enclosed run of `script` if any option is set by `args` or the environment."""
+    global _recorder
+    options = {
+        "metrics": getattr(args, "metrics", None) or os.environ.get("PETWELL_METRICS"),
+        "trace_sql": getattr(args, "trace_sql", False) or _env_flag("PETWELL_TRACE_SQL"),
+        "trace_memory": getattr(args, "trace_memory", False) or _env_flag("PETWELL_TRACE_MEMORY"),
+        "profile": getattr(args, "profile", None) or os.environ.get("PETWELL_PROFILE"),
+    }
+    if _recorder is not None or not any(options.values()):
+        yield _recorder
+        return
+
+    _recorder = recorder = Recorder(script, **options)
+    recorder.start()
+    status, error = "ok", None
+    try:
+        yield recorder
+    except SystemExit as exc:
+        status, error = ("ok", None) if not exc.code else ("exit", str(exc.code))
+        raise
+    except BaseException as exc:
+        status, error = "error", f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _recorder = None
+        recorder.finish(status, error)
+
+
+def stage(name):
+    """Context manager timing the enclosed block as stage `name`."""
+    return _recorder.stage(name) if _recorder is not None else _NULL_STAGE
+
+
+def staged(func=None, *, name=None):
+    """Decorator running the function as a stage, named after it unless `name` is given."""
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with _recorder.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate(func) if func is not None else decorate
+
+
+def trace_connection(conn):
+    """Attach SQL tracing to `conn` when it is enabled. Returns `conn`."""
+    if _recorder is not None and _recorder.trace_sql:
+        _recorder.watch(conn)
+    return conn
+
+
+def print_summary(records, file=sys.stdout):
+    """Per-stage table of wall/CPU time and memory, then the slowest SQL across all stages."""
+    if not records:
+        return
+    width = max(len(r["stage"]) for r in records)
+    print(f"\n{'stage':<{width}}  {'wall s':>9}  {'cpu s':>9}  {'peak RSS MiB':>12}  {'SQL s':>9}", file=file)
+    for r in records:
+        rss = f"{r['peak_rss_kb'] / 1024:12,.1f}" if r.get("peak_rss_kb") is not None else f"{'-':>12}"
+        sql = f"{r['sql']['seconds']:9.3f}" if "sql" in r else f"{'-':>9}"
+        print(f"{r['stage']:<{width}}  {r['wall_seconds']:9.3f}  {r['cpu_seconds']:9.3f}  {rss}  {sql}", file=file)
+
+    statements = [(entry["seconds"], entry["count"], r["stage"], entry["sql"])
+                  for r in records if "sql" in r for entry in r["sql"]["top"]]
+    if statements:
+        print("\nSlowest SQL:", file=file)
+        for seconds, count, path, sql in sorted(statements, reverse=True)[:5]:
+            print(f"  {seconds:9.3f}s  x{count:<8} {path}: {sql[:120]}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a JSON-lines metrics file, one table per run.")
+    parser.add_argument("metrics", help="file written with --metrics / PETWELL_METRICS")
+    parser.add_argument("--last", type=int, default=1, help="number of most recent runs to show (default: 1)")
+    args = parser.parse_args(argv)
+
+    runs = {}
+    with open(args.metrics, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            entry = runs.setdefault(record["run_id"], {"stages": [], "run": None})
+            if record["event"] == "stage":
+                entry["stages"].append(record)
+            else:
+                entry["run"] = record
+    for run_id in list(runs)[-args.last:]:
+        entry = runs[run_id]
+        info = entry["run"] or {}
+        print(f"\n== {info.get('script', '?')} {run_id}: {info.get('status', 'incomplete')}"
+              + (f", {info['wall_seconds']:.3f}s" if "wall_seconds" in info else ""))
+        print_summary(entry["stages"])
+
+
+if __name__ == "__main__":
+    main()
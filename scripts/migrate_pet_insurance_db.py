@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Migrate pet_insurance.db
+
+Declarative, versioned schema migrations for pet_insurance.db. Replaces the
+hand-written rename/create/copy/drop steps of the old refactor/fix scripts.
+
+- The applied version is stored in PRAGMA user_version.
+- Each migration runs in one transaction together with the version bump, so
+  a crash rolls back to the previous version and leaves no half-migrated
+  tables behind.
+- Tables are rebuilt the way SQLite recommends: create `<table>_new`, copy
+  with INSERT...SELECT, drop the old table, rename `<table>_new`. Renaming
+  the old table first would make SQLite rewrite other tables' FOREIGN KEY
+  clauses to point at `<table>_old`.
+- Before pending migrations run, a snapshot is taken with SQLite's online
+  backup API, copied in page steps instead of a full file copy.
+- Rebuilds copy every column the old and new table share. Columns the new
+  definition does not know (e.g. `tag` added by update_tags.py) are carried
+  over unless the step drops them explicitly.
+- A DB migrated by the old scripts (user_version 0) has its version
+  detected and recorded without touching data: a version matches when each
+  of its tables has at least its columns and exactly its foreign keys.
+  Only the pre-migration shape is treated as version 0; any other shape is
+  refused rather than migrated from scratch.
+
+Usage:
+    python3 scripts/migrate_pet_insurance_db.py [--target N] [--no-backup] [--status]
+                                                [--metrics PATH] [--trace-sql] [--profile PATH]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+
+import instrumentation
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+
+# Pages copied per backup step; the source is unlocked between steps
+BACKUP_PAGES_PER_STEP = 4096
+
+
+@dataclass(frozen=True)
+class RebuildTable:
+    """Recreate `table` with `create_sql` and copy its data across from the old table.
+
+    `create_sql` uses `{table}` as the table name placeholder. `columns` are
+    the columns the old table must have; `drops` are old columns that are
+    deliberately not carried over.
+    """
+    table: str
+    create_sql: str
+    columns: tuple
+    drops: tuple = ()
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    steps: tuple
+
+
+MIGRATIONS = (
+    # Formerly refactor_pet_insurance_db.py: add the _zh columns
+    Migration(1, "bilingual_columns", (
+        RebuildTable("insurance_provider", """
+            CREATE TABLE {table} (
+                company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                company_name TEXT NOT NULL,
+                company_name_zh TEXT,
+                company_logo TEXT
+            )
+        """, ("company_id", "company_name", "company_logo")),
+        RebuildTable("product", """
+            CREATE TABLE {table} (
+                insurance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider_id INTEGER,
+                insurance_name TEXT,
+                insurance_name_zh TEXT,
+                min_age TEXT,
+                min_age_zh TEXT,
+                max_age TEXT,
+                max_age_zh TEXT,
+                suitable_pet_type TEXT,
+                suitable_pet_type_zh TEXT,
+                cat_breed_type TEXT,
+                cat_breed_type_zh TEXT,
+                dog_breed_type TEXT,
+                dog_breed_type_zh TEXT,
+                breed_type_remark TEXT,
+                breed_type_remark_zh TEXT,
+                payment_mode TEXT,
+                payment_mode_zh TEXT,
+                waiting_period TEXT,
+                waiting_period_zh TEXT,
+                information_link TEXT,
+                information_link_zh TEXT,
+                update_time TEXT,
+                FOREIGN KEY(provider_id) REFERENCES insurance_provider(company_id)
+            )
+        """, ("insurance_id", "provider_id", "insurance_name", "min_age", "max_age",
+              "suitable_pet_type", "cat_breed_type", "dog_breed_type", "breed_type_remark",
+              "payment_mode", "waiting_period", "information_link", "update_time")),
+        RebuildTable("coverage", """
+            CREATE TABLE {table} (
+                coverage_id INTEGER PRIMARY KEY,
+                product_id INTEGER,
+                coverage_type TEXT,
+                coverage_type_zh TEXT,
+                coverage_limit TEXT,
+                coverage_limit_zh TEXT,
+                coverage_remark TEXT,
+                coverage_remark_zh TEXT,
+                FOREIGN KEY(product_id) REFERENCES product(insurance_id)
+            )
+        """, ("coverage_id", "product_id", "coverage_type", "coverage_limit", "coverage_remark")),
+        RebuildTable("sub_coverage", """
+            CREATE TABLE {table} (
+                sub_coverage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                parent_coverage_id INTEGER NOT NULL,
+                sub_coverage_remark TEXT,
+                sub_coverage_remark_zh TEXT,
+                Field4 INTEGER,
+                FOREIGN KEY(parent_coverage_id) REFERENCES coverage(coverage_id)
+            )
+        """, ("sub_coverage_id", "parent_coverage_id", "sub_coverage_remark", "Field4")),
+        RebuildTable("coinsurance_info", """
+            CREATE TABLE {table} (
+                provider_id INTEGER,
+                min_age TEXT,
+                min_age_zh TEXT,
+                max_age TEXT,
+                max_age_zh TEXT,
+                vet_type TEXT,
+                vet_type_zh TEXT,
+                coinsurance_percentage NUMERIC,
+                FOREIGN KEY(provider_id) REFERENCES insurance_provider(company_id)
+            )
+        """, ("provider_id", "min_age", "max_age", "coinsurance_percentage", "vet_type")),
+    )),
+
+    # Formerly fix_coverage_limit_fk.py
+    Migration(2, "coverage_limit_fk", (
+        RebuildTable("coverage_limit", """
+            CREATE TABLE {table} (
+                coverage_id INTEGER,
+                product_id INTEGER,
+                coverage_limit INTEGER,
+                PRIMARY KEY(coverage_id, product_id),
+                FOREIGN KEY(coverage_id) REFERENCES coverage_list(coverage_id),
+                FOREIGN KEY(product_id) REFERENCES product(insurance_id)
+            )
+        """, ("coverage_id", "product_id", "coverage_limit")),
+    )),
+
+    # Formerly fix_sub_coverage_fk.py: point at coverage_list and drop Field4
+    Migration(3, "sub_coverage_fk", (
+        RebuildTable("sub_coverage", """
+            CREATE TABLE {table} (
+                sub_coverage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                parent_coverage_id INTEGER,
+                sub_coverage_remark TEXT,
+                sub_coverage_remark_zh TEXT,
+                FOREIGN KEY(parent_coverage_id) REFERENCES coverage_list(coverage_id)
+            )
+        """, ("sub_coverage_id", "parent_coverage_id", "sub_coverage_remark", "sub_coverage_remark_zh"),
+            drops=("Field4",)),
+    )),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_shape(conn, table):
+    """Column names and foreign keys (column, referenced table, referenced column) of `table`."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    foreign_keys = sorted((row[3], row[2], row[4]) for row in conn.execute(f"PRAGMA foreign_key_list({table})"))
+    return columns, foreign_keys
+
+
+def target_shape(step):
+    """The shape `step.create_sql` would produce, worked out on a scratch in-memory DB."""
+    scratch = sqlite3.connect(":memory:")
+    try:
+        scratch.execute(step.create_sql.format(table=step.table))
+        return table_shape(scratch, step.table)
+    finally:
+        scratch.close()
+
+
+def schema_at(version):
+    """The latest RebuildTable step for each table touched by migrations up to `version`."""
+    steps = {}
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            for step in migration.steps:
+                steps[step.table] = step
+    return steps
+
+
+def shape_matches(conn, step):
+    """Whether `step.table` has at least the target columns, none it drops, and the target foreign keys."""
+    columns, foreign_keys = table_shape(conn, step.table)
+    target_columns, target_foreign_keys = target_shape(step)
+    return (set(target_columns) <= set(columns) and not set(step.drops) & set(columns)
+            and foreign_keys == target_foreign_keys)
+
+
+def missing_columns(conn, step):
+    """Columns `step` copies from that the existing table lacks."""
+    columns = set(table_shape(conn, step.table)[0])
+    return [column for column in step.columns if column not in columns]
+
+
+def is_source_shape(conn, step):
+    """Whether `step.table` looks like the input of `step`: its columns present, the ones it adds absent."""
+    columns = set(table_shape(conn, step.table)[0])
+    added = set(target_shape(step)[0]) - set(step.columns)
+    return not missing_columns(conn, step) and not columns & added
+
+
+def detect_version(conn):
+    """Highest version whose schema the DB already matches, for DBs migrated by the old scripts.
+
+    Returns 0 for the pre-migration shape and None for a shape no version describes.
+    """
+    for migration in reversed(MIGRATIONS):
+        steps = schema_at(migration.version).values()
+        if all(shape_matches(conn, step) for step in steps):
+            return migration.version
+    if all(is_source_shape(conn, step) for step in MIGRATIONS[0].steps):
+        return 0
+    return None
+
+
+def rebuild_table(conn, step):
+    """Create `<table>_new`, copy the data across, drop the old table and rename the new one."""
+    new_table = f"{step.table}_new"
+    conn.execute(f"DROP TABLE IF EXISTS {new_table}")
+    conn.execute(step.create_sql.format(table=new_table))
+
+    new_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({new_table})")}
+    copied = []
+    for _, name, declared_type, _, default, _ in conn.execute(f"PRAGMA table_info({step.table})").fetchall():
+        if name in step.drops:
+            continue
+        if name not in new_columns:
+            # Keep columns added outside the migrations instead of silently dropping their data
+            conn.execute(f'ALTER TABLE {new_table} ADD COLUMN "{name}" {declared_type}'
+                         + (f" DEFAULT {default}" if default is not None else ""))
+        copied.append(f'"{name}"')
+    columns = ", ".join(copied)
+    conn.execute(f"INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {step.table}")
+    conn.execute(f"DROP TABLE {step.table}")
+    conn.execute(f"ALTER TABLE {new_table} RENAME TO {step.table}")
+
+
+def apply_migration(conn, migration):
+    """Run one migration and its version bump in a single transaction."""
+    start = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for step in migration.steps:
+            missing = missing_columns(conn, step)
+            if missing:
+                raise sqlite3.OperationalError(
+                    f"migration {migration.version:03d}: {step.table} lacks {', '.join(missing)}")
+            print(f"  {migration.version:03d} {migration.name}: rebuilding {step.table}...")
+            with instrumentation.stage(f"{migration.version:03d}_{migration.name}/{step.table}"):
+                rebuild_table(conn, step)
+
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            print(f"  WARNING: {len(violations)} foreign key violations after migration {migration.version}")
+
+        conn.execute(f"PRAGMA user_version = {migration.version}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    print(f"  {migration.version:03d} {migration.name}: done in {time.perf_counter() - start:.2f}s")
+
+
+def backup_path_for(db_path):
+    """pet_insurance.db -> pet_insurance_backup.db"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_backup{ext}"
+
+
+@instrumentation.staged
+def backup_db(conn, backup_path, pages=BACKUP_PAGES_PER_STEP):
+    """Snapshot the live DB with the online backup API, `pages` pages per step."""
+    def progress(status, remaining, total):
+        if total:
+            print(f"\r  backup: {total - remaining}/{total} pages", end="", flush=True)
+
+    start = time.perf_counter()
+    target = sqlite3.connect(backup_path)
+    try:
+        conn.backup(target, pages=pages, progress=progress)
+    finally:
+        target.close()
+    print(f"\nBackup created at {backup_path} ({time.perf_counter() - start:.2f}s)")
+
+
+def pending_migrations(conn, target=LATEST_VERSION):
+    current = get_version(conn)
+    return [m for m in MIGRATIONS if current < m.version <= target]
+
+
+@instrumentation.staged
+def migrate(db_path=DB_PATH, target=LATEST_VERSION, backup=True):
+    """Apply every pending migration up to `target`. Returns the resulting version."""
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        sys.exit(1)
+
+    # Autocommit mode: transactions are managed explicitly per migration
+    conn = instrumentation.trace_connection(sqlite3.connect(db_path, isolation_level=None))
+    try:
+        # Must be set outside a transaction; the rebuilds drop referenced tables
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("PRAGMA cache_size = -65536")
+
+        if get_version(conn) == 0:
+            detected = detect_version(conn)
+            if detected is None:
+                print("Unrecognised schema: it matches no migration version and is not the "
+                      "pre-migration shape. Refusing to migrate; set PRAGMA user_version by hand.")
+                sys.exit(1)
+            if detected:
+                conn.execute(f"PRAGMA user_version = {detected}")
+                print(f"Schema already matches version {detected}; recorded it in user_version.")
+
+        pending = pending_migrations(conn, target)
+        if not pending:
+            print(f"Database is up to date (version {get_version(conn)}).")
+            return get_version(conn)
+
+        if backup:
+            backup_db(conn, backup_path_for(db_path))
+
+        print(f"Migrating {db_path} from version {get_version(conn)} to {pending[-1].version}...")
+        for migration in pending:
+            apply_migration(conn, migration)
+
+        version = get_version(conn)
+        print(f"Database migrated to version {version}.")
+        return version
+    finally:
+        conn.close()
+
+
+def print_status(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    try:
+        current = get_version(conn)
+    finally:
+        conn.close()
+    for m in MIGRATIONS:
+        state = "applied" if m.version <= current else "pending"
+        print(f"{m.version:03d} {m.name}: {state}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations to pet_insurance.db.")
+    parser.add_argument("--db", default=DB_PATH, help=f"database path (default: {DB_PATH})")
+    parser.add_argument("--target", type=int, default=LATEST_VERSION,
+                        help=f"migrate up to this version (default: {LATEST_VERSION})")
+    parser.add_argument("--no-backup", action="store_true", help="skip the pre-migration snapshot")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.status:
+        print_status(args.db)
+        return
+    with instrumentation.run("migrate_pet_insurance_db", args):
+        migrate(args.db, args.target, backup=not args.no_backup)
+
+
+if __name__ == "__main__":
+    main()
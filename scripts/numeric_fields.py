@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Numeric parsing of free-text insurance fields
+
+Turns the amounts, percentages and age bounds that the CSVs and
+pet_insurance.db store as text ("50,000", "HK$8k", "Unlimited", "80%",
+"13 weeks", "11歲") into numbers that can be stored in typed columns and
+indexed. Used by build_insurance_db.py and comparison_tables.py, which
+register the parsers as SQLite functions and fill the typed columns with
+one UPDATE / INSERT...SELECT per table.
+
+Sentinels:
+- UNLIMITED_AMOUNT for "Unlimited", "As charged", ... so that
+  `amount >= X` range queries include unlimited cover
+- UNLIMITED_AGE for an upper age bound of "No limit" / "Lifetime"
+- NULL for empty, "N/A", "Not covered" and anything unparseable
+
+Each parser is memoised, since the same strings repeat across thousands
+of rows.
+
+Usage (prints the parsed value of each argument):
+    python3 scripts/numeric_fields.py amount "50,000" Unlimited
+    python3 scripts/numeric_fields.py age "13 weeks" "11 years"
+"""
+
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+
+# Larger than any real limit, and exact both as an SQLite REAL and in JSON
+UNLIMITED_AMOUNT = 2 ** 53 - 1
+UNLIMITED_AGE = 999.0
+
+UNLIMITED_WORDS = ("unlimited", "no limit", "no cap", "no maximum", "as charged", "full cost",
+                   "full reimbursement", "不設上限", "無上限", "没有上限", "沒有上限", "全數")
+# "Lifetime" means no upper bound for an age, but "HK$50,000 per lifetime" is a capped amount
+UNLIMITED_AGE_WORDS = UNLIMITED_WORDS + ("lifetime", "終身")
+
+# The number never gives digits back ("5000HKD" is 5000, not 500); a Latin
+# multiplier must end its word, so "5 months" and "8khd" are not scaled
+AMOUNT_RE = re.compile(r"(\d[\d,]*(?:\.\d+)?)(?![\d,]|\.\d)(?:\s*((?:k|m|thousand|million)\b|千|萬|万))?")
+PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+AGE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(weeks?|wks?|months?|mths?|mos?|years?|yrs?|y|週|周|星期|個月|个月|月|歲|岁|年)?")
+
+AMOUNT_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "千": 1_000, "m": 1_000_000, "million": 1_000_000,
+                      "萬": 10_000, "万": 10_000}
+AGE_UNITS_IN_YEARS = {"week": 7 / 365.25, "wk": 7 / 365.25, "週": 7 / 365.25, "周": 7 / 365.25, "星期": 7 / 365.25,
+                      "month": 1 / 12, "mth": 1 / 12, "mo": 1 / 12, "個月": 1 / 12, "个月": 1 / 12, "月": 1 / 12}
+
+
+def _normalise(text):
+    return unicodedata.normalize("NFKC", str(text)).strip().lower()
+
+
+def _is_unlimited(text, words=UNLIMITED_WORDS):
+    return any(word in text for word in words)
+
+
+@lru_cache(maxsize=65536)
+def parse_amount(value):
+    """HKD amount as an int, UNLIMITED_AMOUNT, or None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value))
+    text = _normalise(value)
+    if not text:
+        return None
+    if _is_unlimited(text):
+        return UNLIMITED_AMOUNT
+    match = AMOUNT_RE.search(text)
+    if match is None:
+        return None
+    number = float(match.group(1).replace(",", ""))
+    return int(round(number * AMOUNT_MULTIPLIERS.get(match.group(2), 1)))
+
+
+@lru_cache(maxsize=65536)
+def parse_percentage(value):
+    """Percentage in 0-100 as a float, or None. The first figure wins in "90% | 70%"."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # 0.8 in a NUMERIC column is a fraction; 80 is already a percentage
+        return float(value) * 100 if 0 < value < 1 else float(value)
+    text = _normalise(value)
+    match = PERCENT_RE.search(text) or NUMBER_RE.search(text)
+    if match is None:
+        return None
+    number = float(match.group(1) if match.re is PERCENT_RE else match.group(0))
+    return number * 100 if match.re is NUMBER_RE and 0 < number < 1 else number
+
+
+@lru_cache(maxsize=65536)
+def parse_age_years(value):
+    """Age in years as a float ("13 weeks" -> 0.2491), UNLIMITED_AGE, or None. Bare numbers are years."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = _normalise(value)
+    if not text:
+        return None
+    if _is_unlimited(text, UNLIMITED_AGE_WORDS):
+        return UNLIMITED_AGE
+    match = AGE_RE.search(text)
+    if match is None:
+        return None
+    unit = (match.group(2) or "year").rstrip("s")
+    return round(float(match.group(1)) * AGE_UNITS_IN_YEARS.get(unit, 1.0), 4)
+
+
+SQL_FUNCTIONS = {
+    "parse_amount": parse_amount,
+    "parse_percentage": parse_percentage,
+    "parse_age_years": parse_age_years,
+}
+
+
+def register_functions(conn):
+    """Make the parsers available to SQL on `conn` as parse_amount(x), parse_percentage(x), parse_age_years(x)."""
+    for name, func in SQL_FUNCTIONS.items():
+        conn.create_function(name, 1, func, deterministic=True)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parsers = {"amount": parse_amount, "percentage": parse_percentage, "age": parse_age_years}
+    if not argv or argv[0] not in parsers:
+        print(f"Usage: numeric_fields.py {{{'|'.join(parsers)}}} VALUE...")
+        sys.exit(1)
+    for value in argv[1:]:
+        print(f"{value!r}: {parsers[argv[0]](value)!r}")
+
+
+if __name__ == "__main__":
+    main()
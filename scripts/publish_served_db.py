@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Publish pet_insurance.db as a read-optimized serving artifact
+
+The Go handlers (internal/handlers/insurance.go) open
+database/pet_insurance.db on every request and only read it. The working
+pet_insurance.db the scripts maintain is tuned for being rewritten:
+default page size, free pages left by the rebuild migrations and no
+planner statistics. This writes a separate copy for serving, with the
+same schema:
+
+- Page size: the smallest of 4-64 KiB at which the 95th-percentile row of
+  every served table fits on a page without overflow pages, even as an
+  index record (about a quarter page).
+- ANALYZE and PRAGMA optimize, then VACUUM INTO a fresh file: no free
+  pages, stat tables included, rollback journal mode. `plans` prints
+  EXPLAIN QUERY PLAN for each handler query in HANDLER_QUERIES.
+- The file is made read-only (0444) and swapped in atomically. A
+  read-only file tells readers it never changes in place, so they can
+  open it with `file:...?immutable=1` (no locking, no change checks) and
+  mmap it (PRAGMA mmap_size); OpenInsuranceDB does the former. A new
+  publish replaces the file, so new opens see the new data.
+
+`bench` replays the handler queries against the working DB and the
+artifact, opening a connection per query like the handlers do, checks
+both return the same rows and reports the timings. Results of queries
+without ORDER BY are compared as multisets, as SQLite does not promise
+their order.
+
+Rewriting the schema for serving (WITHOUT ROWID tables, an index on
+product_coverage_comparison.coverage_id) was measured with this replay
+on 2000 synthetic products and gained nothing beyond noise (0.98-1.09x
+against the same artifact without it), so the artifact keeps the
+source schema.
+
+Run after build_insurance_db.py / migrate_pet_insurance_db.py:
+    python3 scripts/publish_served_db.py publish [--db PATH] [--out PATH] [--page-size auto|N]
+    python3 scripts/publish_served_db.py plans [--db PATH]
+    python3 scripts/publish_served_db.py bench [--old PATH] [--new PATH] [--rounds 30] [--output bench.json]
+    python3 scripts/publish_served_db.py bench --synthetic 200 (generate a served-shaped DB with 200 products)
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import build_insurance_db as build
+import comparison_tables
+import instrumentation
+import migrate_pet_insurance_db as migrations
+import search_index
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+# Where the Go server opens it (insuranceDBPath)
+SERVED_PATH = os.path.join(REPO_ROOT, "database", "pet_insurance.db")
+
+PAGE_SIZES = (4096, 8192, 16384, 32768, 65536)
+ROW_PERCENTILE = 0.95
+READER_MMAP_SIZE = 256 * 1024 * 1024
+BENCH_ROUNDS = 30
+
+CREATE_TABLE_RE = re.compile(r"^\s*CREATE\s+TABLE\s+(?:\"[^\"]+\"|\[[^\]]+\]|`[^`]+`|\w+)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class HandlerQuery:
+    """A query from internal/handlers/insurance.go.
+
+    `params` is a SELECT returning one row of sample parameters from the
+    data, or None for queries without parameters.
+    """
+    name: str
+    sql: str
+    params: str = None
+
+
+COMPARISON_SQL = """
+    SELECT pet_type, provider_id, product_id, coverage_id, company_name, company_name_zh,
+        insurance_name, insurance_name_zh, coverage_type, coverage_type_zh, coverage_limit, limit_remark, limit_remark_zh,
+        sub_limits, coinsurance, coinsurance_zh, coinsurance_bands, tag, tag_zh
+    FROM product_coverage_comparison WHERE 1 = 1{filters}
+    ORDER BY pet_type, provider_id, product_id, coverage_id
+"""
+AGE_FILTER = " AND (min_age_years IS NULL OR min_age_years <= ?) AND (max_age_years IS NULL OR max_age_years >= ?)"
+SAMPLE_ROW = "SELECT {columns} FROM product_coverage_comparison ORDER BY coverage_id, product_id LIMIT 1"
+
+HANDLER_QUERIES = (
+    HandlerQuery("insurance-companies",
+                 "SELECT company_id, company_name, company_name_zh, company_logo FROM insurance_provider"),
+    HandlerQuery("insurance-products", """
+        SELECT insurance_id, provider_id, insurance_name, insurance_name_zh, remark, remark_zh,
+        min_age, min_age_zh, max_age, max_age_zh, coinsurance, coinsurance_zh, suitable_pet_type, suitable_pet_type_zh,
+        cat_breed_type, cat_breed_type_zh, dog_breed_type, dog_breed_type_zh, breed_type_remark, breed_type_remark_zh,
+        payment_mode, payment_mode_zh, waiting_period, waiting_period_zh, information_link, information_link_zh, update_time,
+        tag, tag_zh
+        FROM product
+    """),
+    HandlerQuery("coverage-list", "SELECT coverage_id, coverage_type, coverage_type_zh FROM coverage_list"),
+    HandlerQuery("coverage-limits",
+                 "SELECT coverage_id, product_id, coverage_limit, remark, remark_zh FROM coverage_limit"),
+    HandlerQuery("sub-coverage-limits", """
+        SELECT sub_coverage_id, parent_coverage_id, product_id, sub_coverage_name, sub_coverage_name_zh,
+        sub_limit, sub_coverage_remark, sub_coverage_remark_zh FROM sub_coverage_limit
+    """),
+    HandlerQuery("comparison", COMPARISON_SQL.format(filters="")),
+    HandlerQuery("comparison?pet_type", COMPARISON_SQL.format(filters=" AND pet_type = ?"), "SELECT 'dog'"),
+    HandlerQuery("comparison?provider_id", COMPARISON_SQL.format(filters=" AND provider_id = ?"),
+                 SAMPLE_ROW.format(columns="provider_id")),
+    HandlerQuery("comparison?pet_type&provider_id",
+                 COMPARISON_SQL.format(filters=" AND pet_type = ? AND provider_id = ?"),
+                 SAMPLE_ROW.format(columns="pet_type, provider_id")),
+    HandlerQuery("comparison?coverage_id", COMPARISON_SQL.format(filters=" AND coverage_id = ?"),
+                 SAMPLE_ROW.format(columns="coverage_id")),
+    HandlerQuery("comparison?pet_type&coverage_id&min_limit",
+                 COMPARISON_SQL.format(filters=" AND pet_type = ? AND coverage_id = ? AND coverage_limit_value >= ?"),
+                 SAMPLE_ROW.format(columns="pet_type, coverage_id, COALESCE(coverage_limit_value, 0)")),
+    HandlerQuery("comparison?pet_type&age", COMPARISON_SQL.format(filters=" AND pet_type = ?" + AGE_FILTER),
+                 "SELECT 'cat', 9, 9"),
+)
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def connect_readonly(path, immutable=False):
+    """Open `path` read-only; with `immutable`, skip locking and change detection too."""
+    uri = f"file:{os.path.abspath(path)}?mode=ro" + ("&immutable=1" if immutable else "")
+    return sqlite3.connect(uri, uri=True)
+
+
+def user_tables(conn):
+    """(name, sql) of ordinary tables, leaving out SQLite's own and virtual tables' shadow tables."""
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                        " ORDER BY name").fetchall()
+    virtual = [name for name, sql in rows if sql.upper().startswith("CREATE VIRTUAL")]
+    return [(name, sql) for name, sql in rows
+            if name not in virtual and not any(name.startswith(f"{v}_") for v in virtual)]
+
+
+def table_columns(conn, table):
+    """(name, declared type, primary key position) per column."""
+    return [(row[1], row[2], row[5]) for row in conn.execute(f"PRAGMA table_info({quote(table)})")]
+
+
+def row_size_percentile(conn, table, percentile=ROW_PERCENTILE):
+    """Approximate record size in bytes of the row at `percentile`, 0 for an empty table."""
+    count = conn.execute(f"SELECT COUNT(*) FROM {quote(table)}").fetchone()[0]
+    if not count:
+        return 0
+    size = " + ".join(f"COALESCE(LENGTH(CAST({quote(name)} AS BLOB)), 0) + 1"
+                      for name, _, _ in table_columns(conn, table))
+    offset = min(count - 1, int(count * percentile))
+    return conn.execute(f"SELECT {size} AS size FROM {quote(table)} ORDER BY size LIMIT 1 OFFSET ?",
+                        (offset,)).fetchone()[0]
+
+
+def max_local_payload(page_size):
+    """Largest index record stored without overflow pages (SQLite file format, "X")."""
+    return (page_size - 12) * 64 // 255 - 23
+
+
+def handler_tables(conn):
+    """Tables the handler queries read."""
+    names = {name for name, _ in user_tables(conn)}
+    used = set()
+    for query in HANDLER_QUERIES:
+        used.update(re.findall(r"\bFROM\s+(\w+)", query.sql, re.IGNORECASE))
+    return sorted(names & used)
+
+
+def choose_page_size(conn):
+    """Smallest PAGE_SIZES entry that stores the 95th-percentile row of every served table locally."""
+    need = max((row_size_percentile(conn, table) for table in handler_tables(conn)), default=0)
+    for page_size in PAGE_SIZES:
+        if need <= max_local_payload(page_size):
+            return page_size, need
+    return PAGE_SIZES[-1], need
+
+
+def record_publish_info(conn, source, page_size):
+    conn.execute("DROP TABLE IF EXISTS publish_info")
+    conn.execute("CREATE TABLE publish_info (key TEXT PRIMARY KEY, value) WITHOUT ROWID")
+    conn.executemany("INSERT INTO publish_info VALUES (?, ?)", [
+        ("source", os.path.abspath(source)),
+        ("published_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        ("page_size", page_size),
+        ("schema_version", conn.execute("PRAGMA user_version").fetchone()[0]),
+        ("reader_uri", "file:pet_insurance.db?mode=ro&immutable=1"),
+    ])
+
+
+@instrumentation.staged
+def prepare_staging(source_path, staging_path, page_size):
+    """Copy the source into `staging_path` at `page_size`, record the publish and gather statistics."""
+    source = connect_readonly(source_path)
+    try:
+        source.execute(f"PRAGMA page_size = {page_size}")
+        source.execute("VACUUM INTO ?", (staging_path,))
+    finally:
+        source.close()
+
+    conn = instrumentation.trace_connection(sqlite3.connect(staging_path, isolation_level=None))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record_publish_info(conn, source_path, page_size)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        build.check_integrity(conn)
+    finally:
+        conn.close()
+
+
+@instrumentation.staged
+def publish(source_path=DB_PATH, out_path=SERVED_PATH, page_size=None):
+    """Write the serving artifact for `source_path` to `out_path`. Returns the page size used."""
+    if not os.path.exists(source_path):
+        print(f"Database not found: {source_path}")
+        sys.exit(1)
+    start = time.perf_counter()
+    if page_size is None:
+        source = connect_readonly(source_path)
+        try:
+            page_size, row_size = choose_page_size(source)
+        finally:
+            source.close()
+        print(f"Page size {page_size} (95th-percentile served row: {row_size} bytes)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    staging_path = build.create_shadow_file(out_path)
+    shadow_path = build.create_shadow_file(out_path)
+    published = False
+    try:
+        prepare_staging(source_path, staging_path, page_size)
+        # VACUUM INTO needs an empty or missing target
+        os.remove(shadow_path)
+        staging = sqlite3.connect(staging_path)
+        try:
+            staging.execute("VACUUM INTO ?", (shadow_path,))
+        finally:
+            staging.close()
+        build.publish_db(shadow_path, out_path)
+        published = True
+        os.chmod(out_path, 0o444)
+    finally:
+        for path in (staging_path, shadow_path) if not published else (staging_path,):
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"Published {out_path}: {os.path.getsize(source_path):,} -> {os.path.getsize(out_path):,} bytes "
+          f"in {time.perf_counter() - start:.2f}s")
+    return page_size
+
+
+# --- Query plans and replay ---
+
+def query_params(conn, query):
+    if query.params is None:
+        return ()
+    row = conn.execute(query.params).fetchone()
+    return tuple(row) if row else None
+
+
+def available_queries(conn):
+    """HANDLER_QUERIES that the DB has tables for, with their sample parameters."""
+    tables = {name for name, _ in user_tables(conn)}
+    result = []
+    for query in HANDLER_QUERIES:
+        if set(re.findall(r"\bFROM\s+(\w+)", query.sql, re.IGNORECASE)) <= tables:
+            params = query_params(conn, query)
+            if params is not None:
+                result.append((query, params))
+    return result
+
+
+def query_plan(conn, sql, params):
+    return "; ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+
+def print_plans(db_path):
+    conn = connect_readonly(db_path)
+    try:
+        for query, params in available_queries(conn):
+            print(f"{query.name}: {query_plan(conn, query.sql, params)}")
+    finally:
+        conn.close()
+
+
+def run_query(path, immutable, sql, params):
+    """Open, query and close, like one handler request."""
+    conn = connect_readonly(path, immutable)
+    try:
+        if immutable:
+            conn.execute(f"PRAGMA mmap_size = {READER_MMAP_SIZE}")
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def time_query(path, immutable, sql, params, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run_query(path, immutable, sql, params)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {"median_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3)}
+
+
+def file_stats(path):
+    conn = connect_readonly(path)
+    try:
+        return {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_size", "page_count", "freelist_count")} | {"bytes": os.path.getsize(path)}
+    finally:
+        conn.close()
+
+
+def same_rows(old_rows, new_rows, ordered):
+    if ordered:
+        return old_rows == new_rows
+    key = lambda row: tuple((value is None, str(type(value)), value) for value in row)
+    return sorted(old_rows, key=key) == sorted(new_rows, key=key)
+
+
+def replay(old_path, new_path, rounds=BENCH_ROUNDS):
+    """Time every handler query on both DBs. Returns (results, mismatched query names)."""
+    conn = connect_readonly(old_path)
+    try:
+        queries = available_queries(conn)
+    finally:
+        conn.close()
+    new_conn = connect_readonly(new_path, immutable=True)
+    results, mismatches = [], []
+    try:
+        for query, params in queries:
+            ordered = "ORDER BY" in query.sql.upper()
+            old_rows = run_query(old_path, False, query.sql, params)
+            new_rows = run_query(new_path, True, query.sql, params)
+            if not same_rows(old_rows, new_rows, ordered):
+                mismatches.append(query.name)
+            old = time_query(old_path, False, query.sql, params, rounds)
+            new = time_query(new_path, True, query.sql, params, rounds)
+            results.append({
+                "query": query.name,
+                "rows": len(new_rows),
+                "old": old,
+                "new": new,
+                "speedup": round(old["median_ms"] / new["median_ms"], 2) if new["median_ms"] else None,
+                "plan": query_plan(new_conn, query.sql, params),
+            })
+            print(f"  {query.name:<42} {len(new_rows):>7} rows  {old['median_ms']:8.3f} -> "
+                  f"{new['median_ms']:8.3f} ms  x{results[-1]['speedup']}", file=sys.stderr)
+    finally:
+        new_conn.close()
+    return results, mismatches
+
+
+# --- Synthetic served DB ---
+
+def generate_served_db(path, products, seed):
+    """Create a pet_insurance.db in the shape the handlers read, as the scripts leave it.
+
+    AUTOINCREMENT keys, rowid tables with composite primary keys, the
+    comparison table and search index, then a rebuilt `product` (free pages).
+    """
+    rng = random.Random(seed)
+    from bench_insurance_pipeline import COMPANIES, PLANS
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.executescript("""
+        CREATE TABLE insurance_provider (company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT NOT NULL, company_name_zh TEXT, company_logo TEXT);
+        CREATE TABLE product (insurance_id INTEGER PRIMARY KEY AUTOINCREMENT, provider_id INTEGER,
+            insurance_name TEXT, insurance_name_zh TEXT, remark TEXT, remark_zh TEXT,
+            min_age TEXT, min_age_zh TEXT, max_age TEXT, max_age_zh TEXT, coinsurance TEXT, coinsurance_zh TEXT,
+            suitable_pet_type TEXT, suitable_pet_type_zh TEXT, cat_breed_type TEXT, cat_breed_type_zh TEXT,
+            dog_breed_type TEXT, dog_breed_type_zh TEXT, breed_type_remark TEXT, breed_type_remark_zh TEXT,
+            payment_mode TEXT, payment_mode_zh TEXT, waiting_period TEXT, waiting_period_zh TEXT,
+            information_link TEXT, information_link_zh TEXT, update_time TEXT, tag TEXT, tag_zh TEXT,
+            FOREIGN KEY(provider_id) REFERENCES insurance_provider(company_id));
+        CREATE TABLE coverage_list (coverage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            coverage_type TEXT, coverage_type_zh TEXT);
+        CREATE TABLE coverage_limit (coverage_id INTEGER, product_id INTEGER, coverage_limit INTEGER,
+            remark TEXT, remark_zh TEXT, PRIMARY KEY(coverage_id, product_id),
+            FOREIGN KEY(coverage_id) REFERENCES coverage_list(coverage_id),
+            FOREIGN KEY(product_id) REFERENCES product(insurance_id));
+        CREATE TABLE sub_coverage_limit (sub_coverage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            parent_coverage_id INTEGER, product_id INTEGER, sub_coverage_name TEXT, sub_coverage_name_zh TEXT,
+            sub_limit TEXT, sub_coverage_remark TEXT, sub_coverage_remark_zh TEXT,
+            FOREIGN KEY(parent_coverage_id) REFERENCES coverage_list(coverage_id));
+        CREATE TABLE coinsurance_info (provider_id INTEGER, min_age TEXT, min_age_zh TEXT, max_age TEXT,
+            max_age_zh TEXT, vet_type TEXT, vet_type_zh TEXT, coinsurance_percentage NUMERIC,
+            FOREIGN KEY(provider_id) REFERENCES insurance_provider(company_id));
+    """)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO insurance_provider (company_name, company_name_zh, company_logo) VALUES (?, ?, ?)",
+                     [(c, f"{c}保險", f"https://example.com/{i}.png") for i, c in enumerate(COMPANIES)])
+    conn.executemany("INSERT INTO coverage_list (coverage_type, coverage_type_zh) VALUES (?, ?)",
+                     [(s, f"{s}（中文）") for s in build.SERVICE_SUBCATEGORIES])
+    coverage_count = len(build.SERVICE_SUBCATEGORIES)
+    for product_id in range(1, products + 1):
+        plan = rng.choice(PLANS)
+        conn.execute("""
+            INSERT INTO product VALUES (NULL, ?, ?, ?, ?, ?, '8 weeks', '8星期', '9 years', '9歲', ?, ?, ?, ?,
+                'All', '所有', 'All', '所有', '', '', 'Monthly / Annual', '月繳／年繳', '30 days', '30日',
+                'https://example.com/plan', 'https://example.com/zh/plan', '2025-01-01', '#Popular', '#熱門')
+        """, (rng.randrange(1, len(COMPANIES) + 1), plan, f"{plan}（中文）", "Covers accidents and illness. " * 3,
+              "涵蓋意外及疾病。" * 3, f"{rng.choice([70, 80, 90])}%", f"{rng.choice([70, 80, 90])}%",
+              rng.choice(["cat, dog", "dog", "cat"]), rng.choice(["貓、狗", "狗", "貓"])))
+        for coverage_id in rng.sample(range(1, coverage_count + 1), min(coverage_count, 20)):
+            conn.execute("INSERT INTO coverage_limit VALUES (?, ?, ?, ?, ?)",
+                         (coverage_id, product_id, rng.randrange(1, 200) * 500, "Per policy year", "每保單年度"))
+            for sub in range(rng.randrange(0, 3)):
+                conn.execute("""
+                    INSERT INTO sub_coverage_limit (parent_coverage_id, product_id, sub_coverage_name,
+                        sub_coverage_name_zh, sub_limit, sub_coverage_remark, sub_coverage_remark_zh)
+                    VALUES (?, ?, ?, ?, ?, 'Per condition', '每種病症')
+                """, (coverage_id, product_id, f"Sub-limit {sub + 1}", f"分項 {sub + 1}",
+                      str(rng.randrange(1, 50) * 500)))
+    conn.executemany("INSERT INTO coinsurance_info VALUES (?, '0', '0歲', '8', '8歲', 'network', '網絡', ?)",
+                     [(p, rng.choice([70, 80, 90])) for p in range(1, len(COMPANIES) + 1)])
+    conn.execute("COMMIT")
+    conn.isolation_level = ""
+    comparison_tables.build_comparison_tables(conn)
+    search_index.build_search_index(conn)
+
+    # What the rename/copy migrations leave behind: a rebuilt table and the old one's pages on the freelist
+    conn.isolation_level = None
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("BEGIN")
+    columns = tuple(name for name, _, _ in table_columns(conn, "product"))
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'product'").fetchone()[0]
+    migrations.rebuild_table(conn, migrations.RebuildTable(
+        "product", CREATE_TABLE_RE.sub("CREATE TABLE {table}", sql, count=1), columns))
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def run_bench(args):
+    work_dir = None
+    old_path, new_path = args.old, args.new
+    try:
+        if args.synthetic:
+            work_dir = tempfile.mkdtemp(prefix="petwell-publish-")
+            old_path = os.path.join(work_dir, "pet_insurance.db")
+            new_path = os.path.join(work_dir, "database", "pet_insurance.db")
+            generate_served_db(old_path, args.synthetic, args.seed)
+            publish(old_path, new_path, args.page_size)
+        for label, path in (("old", old_path), ("new", new_path)):
+            if not os.path.exists(path):
+                print(f"Database not found: {path}")
+                sys.exit(1)
+        old_stats, new_stats = file_stats(old_path), file_stats(new_path)
+        for label, stats in (("old", old_stats), ("new", new_stats)):
+            print(f"{label}: {stats['bytes']:,} bytes, {stats['page_count']} pages of {stats['page_size']}, "
+                  f"{stats['freelist_count']} free", file=sys.stderr)
+        print(f"Replaying handler queries, {args.rounds} rounds each (median ms, old -> new)", file=sys.stderr)
+        results, mismatches = replay(old_path, new_path, args.rounds)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        report = {
+            "benchmark": "publish_served_db",
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "sqlite": sqlite3.sqlite_version,
+            "params": {"rounds": args.rounds, "synthetic_products": args.synthetic},
+            "old": old_stats,
+            "new": new_stats,
+            "queries": results,
+            "mismatches": mismatches,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    if mismatches:
+        print(f"Result mismatch: {', '.join(mismatches)}", file=sys.stderr)
+        sys.exit(1)
+
+
+def page_size_arg(value):
+    if value == "auto":
+        return None
+    size = int(value)
+    if size not in PAGE_SIZES and size not in (512, 1024, 2048):
+        raise argparse.ArgumentTypeError("page size must be a power of two from 512 to 65536")
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish pet_insurance.db as a read-optimized serving artifact.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    publish_cmd = sub.add_parser("publish", help="write the serving artifact")
+    publish_cmd.add_argument("--db", default=DB_PATH, help=f"source DB (default: {DB_PATH})")
+    publish_cmd.add_argument("--out", default=SERVED_PATH, help=f"artifact path (default: {SERVED_PATH})")
+    instrumentation.add_arguments(publish_cmd)
+
+    plans = sub.add_parser("plans", help="print the query plan of every handler query")
+    plans.add_argument("--db", default=SERVED_PATH, help=f"database (default: {SERVED_PATH})")
+
+    bench = sub.add_parser("bench", help="replay the handler queries against the source and the artifact")
+    bench.add_argument("--old", default=DB_PATH, help=f"source DB (default: {DB_PATH})")
+    bench.add_argument("--new", default=SERVED_PATH, help=f"artifact (default: {SERVED_PATH})")
+    bench.add_argument("--synthetic", type=int, metavar="PRODUCTS",
+                       help="generate a served-shaped DB with this many products and publish it first")
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--rounds", type=int, default=BENCH_ROUNDS,
+                       help=f"timed runs per query (default: {BENCH_ROUNDS})")
+    bench.add_argument("--output", help="JSON results file")
+    for command in (publish_cmd, bench):
+        command.add_argument("--page-size", type=page_size_arg, default=None,
+                             help="page size in bytes, or auto (default: auto)")
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        with instrumentation.run("publish_served_db", args):
+            publish(args.db, args.out, args.page_size)
+    elif args.command == "plans":
+        print_plans(args.db)
+    else:
+        run_bench(args)
+
+
+if __name__ == "__main__":
+    main()
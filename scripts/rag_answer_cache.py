@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Answer cache in front of the RAG service
+
+An HTTP proxy for the RAG service's POST /ask. Point the backend at it
+(RAG_SERVICE_URL=http://localhost:8002) and it forwards to the real
+service (--upstream), answering repeated questions from memory:
+
+- Keys are the normalised query text (Unicode NFKC, case-folded,
+  punctuation dropped, whitespace collapsed) plus `provider`, so
+  "Do you cover dental?" and "do you cover dental" share an answer.
+- With --similarity, a miss falls back to the most similar cached query
+  for the same provider and history (cosine over hashed character
+  trigrams) if it scores at least the threshold. Trigrams are indexed,
+  so only cached queries sharing one with the new query are scored, and
+  the scoring runs outside the cache lock.
+- Entries are evicted least-recently-used beyond --max-entries and
+  expire after --ttl seconds.
+- The whole cache is dropped when the data version changes: the size,
+  mtime and inode of the databases build_insurance_db.py writes
+  (--watch), checked at most once a second.
+- Concurrent misses for the same key wait for one upstream call.
+
+By default the key includes the last exchange of chat_history (the last
+user turn and the answer after it), so a follow-up such as "what about
+cats?" is never answered with another conversation's context, while a
+question opening a conversation is shared by every session. The backend
+sends the last 10 turns with every question, so keying on all of them
+would almost never hit; --key-history full does it anyway, and
+--key-history none ignores the history. Cached answers are returned
+with the caller's session_id and provider.
+GET /cache/stats shows hit/miss counters, POST /cache/clear empties it;
+everything else is passed through.
+
+Usage:
+    python3 scripts/rag_answer_cache.py [--port 8002] [--upstream http://localhost:8001]
+        [--max-entries 5000] [--ttl 3600] [--similarity 0.92] [--key-history last|full|none]
+        [--watch PATH ...]
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WATCH_PATHS = [os.path.join(REPO_ROOT, "insurance.db"), os.path.join(REPO_ROOT, "pet_insurance.db")]
+
+DEFAULT_PORT = 8002
+UPSTREAM_URL = "http://localhost:8001"
+
+# How often the watched databases are stat()ed for a new data version
+VERSION_CHECK_SECONDS = 1.0
+
+TRIGRAM_DIMENSIONS = 1 << 16
+
+HISTORY_KEYS = ("last", "full", "none")
+
+
+def normalize_query(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(char)[0] in "PS" else char for char in text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def trigram_vector(text):
+    """Sparse, L2-normalised hashed character-trigram counts of a normalised query."""
+    padded = f"  {text} "
+    counts = {}
+    for i in range(len(padded) - 2):
+        bucket = int.from_bytes(hashlib.blake2b(padded[i:i + 3].encode(), digest_size=4).digest(),
+                                "little") % TRIGRAM_DIMENSIONS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {bucket: count / norm for bucket, count in counts.items()}
+
+
+def rank_similar(postings, threshold):
+    """Keys scoring at least `threshold`, best first, from [(query weight, {key: weight})].
+
+    The vectors are L2-normalised, so summing weight products over the
+    shared trigrams is their cosine; keys sharing none are never seen.
+    """
+    scores = {}
+    for value, keys in postings:
+        for key, weight in keys.items():
+            scores[key] = scores.get(key, 0.0) + value * weight
+    return sorted((key for key, score in scores.items() if score >= threshold), key=scores.get, reverse=True)
+
+
+def history_key(history, mode="last"):
+    """The part of chat_history that goes into the cache key (normalised), per --key-history."""
+    if mode == "none" or not history:
+        return "[]"
+    if mode == "last":
+        start = max((i for i, turn in enumerate(history) if turn.get("role") == "user"), default=0)
+        history = history[start:]
+    return json.dumps([[turn.get("role") or "", normalize_query(turn.get("content") or "")] for turn in history],
+                      ensure_ascii=False)
+
+
+def data_version(paths):
+    """Identity of the watched files; changes whenever one is rebuilt or written."""
+    version = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            version.append((path, st.st_ino, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            version.append((path, None))
+    return tuple(version)
+
+
+class AnswerCache:
+    """LRU + TTL cache of /ask responses keyed by (provider, normalised query, history key)."""
+
+    def __init__(self, max_entries, ttl, similarity=0.0, watch_paths=()):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.watch_paths = list(watch_paths)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, response dict, vector)
+        self.index = {}  # (provider, history key) -> {trigram bucket: {key: weight}}
+        self.inflight = {}  # key -> threading.Event
+        self.version = data_version(self.watch_paths)
+        self.version_checked = time.monotonic()
+        self.counters = dict.fromkeys(
+            ("hits", "semantic_hits", "misses", "coalesced", "stores", "evictions",
+             "expirations", "invalidations", "upstream_errors"), 0)
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self.version_checked < VERSION_CHECK_SECONDS:
+            return
+        self.version_checked = now
+        version = data_version(self.watch_paths)
+        if version != self.version:
+            self.version = version
+            self.entries.clear()
+            self.index.clear()
+            self.counters["invalidations"] += 1
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.counters["expirations"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def _postings(self, key, vector):
+        """Copies of the index postings of the query's trigrams, for scoring outside the lock."""
+        postings = self.index.get((key[0], key[2:]))
+        if not postings:
+            return []
+        return [(value, postings[bucket].copy()) for bucket, value in vector.items() if bucket in postings]
+
+    def get_or_fetch(self, key, fetch):
+        """Return (response dict, outcome); calls `fetch()` on a miss. `fetch` may raise."""
+        vector = trigram_vector(key[1]) if self.similarity > 0 else None  # hashing stays outside the lock
+        while True:
+            with self.lock:
+                self._check_version()
+                response = self._lookup(key)
+                if response is not None:
+                    self.counters["hits"] += 1
+                    return response, "hit"
+                postings = self._postings(key, vector) if vector is not None else []
+            if postings:
+                similar = rank_similar(postings, self.similarity)
+                with self.lock:
+                    # Entries may have expired or been evicted meanwhile; _lookup skips those
+                    response = next(filter(None, map(self._lookup, similar)), None)
+                    if response is not None:
+                        self.counters["semantic_hits"] += 1
+                        return response, "semantic_hit"
+            with self.lock:
+                response = self._lookup(key)  # stored while the lock was released
+                if response is not None:
+                    self.counters["hits"] += 1
+                    return response, "hit"
+                waiting = self.inflight.get(key)
+                if waiting is None:
+                    self.inflight[key] = threading.Event()
+                    self.counters["misses"] += 1
+                    version = self.version
+                    break
+                self.counters["coalesced"] += 1
+            waiting.wait()
+
+        try:
+            response = fetch()
+        except BaseException:
+            with self.lock:
+                self.counters["upstream_errors"] += 1
+                self.inflight.pop(key).set()
+            raise
+        with self.lock:
+            # Don't store an answer computed against data that has since been replaced
+            if response is not None and version == self.version:
+                self._store(key, response, vector)
+            self.inflight.pop(key).set()
+        return response, "miss"
+
+    def _store(self, key, response, vector=None):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl, response, vector)
+        if vector is not None:
+            postings = self.index.setdefault((key[0], key[2:]), {})
+            for bucket, weight in vector.items():
+                postings.setdefault(bucket, {})[key] = weight
+        self.counters["stores"] += 1
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.counters["evictions"] += 1
+
+    def _remove(self, key):
+        """Drop an entry and its trigram postings."""
+        _, _, vector = self.entries.pop(key)
+        if vector is None:
+            return
+        group = (key[0], key[2:])
+        postings = self.index[group]
+        for bucket in vector:
+            keys = postings[bucket]
+            del keys[key]
+            if not keys:
+                del postings[bucket]
+        if not postings:
+            del self.index[group]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.index.clear()
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["semantic_hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round((lookups - self.counters["misses"]) / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "similarity": self.similarity,
+                "data_version": hashlib.sha1(repr(self.version).encode()).hexdigest()[:12],
+            }
+
+
+class UpstreamError(Exception):
+    def __init__(self, status, body, content_type):
+        super().__init__(f"upstream returned {status}")
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+
+class Upstream:
+    """One keep-alive connection to the RAG service per proxy thread."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        """Return (status, body bytes, content type)."""
+        for attempt in range(2):
+            conn = getattr(self.local, "conn", None)
+            reused = conn is not None
+            if conn is None:
+                conn = self.local.conn = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                return resp.status, resp.read(), resp.getheader("Content-Type", "application/json")
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self.local.conn = None
+                if reused and attempt == 0:
+                    continue  # stale keep-alive connection
+                raise
+            except OSError:
+                conn.close()
+                self.local.conn = None
+                raise
+
+
+class CacheProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "rag-answer-cache"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def send_body(self, status, body, content_type="application/json", cache_status=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if cache_status:
+            self.send_header("X-Cache", cache_status)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload, cache_status=None):
+        self.send_body(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), cache_status=cache_status)
+
+    def forward(self, body=None):
+        headers = {"Content-Type": self.headers.get("Content-Type", "application/json")} if body is not None else {}
+        try:
+            status, data, content_type = self.server.upstream.request(self.command, self.path, body, headers)
+        except OSError as e:
+            return self.send_json(502, {"detail": f"RAG upstream unavailable: {e}"})
+        self.send_body(status, data, content_type)
+
+    def do_GET(self):
+        if self.path == "/cache/stats":
+            return self.send_json(200, self.server.cache.stats())
+        self.forward()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/cache/clear":
+            self.server.cache.clear()
+            return self.send_json(200, {"status": "cleared"})
+        if self.path != "/ask":
+            return self.forward(body)
+
+        try:
+            request = json.loads(body or b"{}")
+            query = normalize_query(request["query"])
+            history = history_key(request.get("chat_history"), self.server.key_history)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return self.forward(body)  # let the RAG service produce its validation error
+        if not query:
+            return self.forward(body)
+
+        provider = request.get("provider") or ""
+        key = (provider, query, history)
+
+        def fetch():
+            status, data, content_type = self.server.upstream.request(
+                "POST", "/ask", body, {"Content-Type": "application/json"})
+            if status != 200:
+                raise UpstreamError(status, data, content_type)
+            try:
+                response = json.loads(data)
+            except ValueError:
+                raise UpstreamError(502, b'{"detail": "RAG upstream returned invalid JSON"}', "application/json")
+            if not isinstance(response, dict) or "answer" not in response:
+                raise UpstreamError(status, data, content_type)  # pass through, don't cache
+            return response
+
+        try:
+            response, outcome = self.server.cache.get_or_fetch(key, fetch)
+        except UpstreamError as e:
+            return self.send_body(e.status, e.body, e.content_type, cache_status="MISS")
+        except OSError as e:
+            return self.send_json(502, {"detail": f"RAG upstream unavailable: {e}"}, cache_status="MISS")
+
+        response = dict(response)
+        # Answers are shared across sessions; echo this caller's identifiers
+        response.pop("session_id", None)
+        response.pop("active_provider", None)
+        if request.get("session_id"):
+            response["session_id"] = request["session_id"]
+        if provider:
+            response["active_provider"] = provider
+        self.send_json(200, response, cache_status=outcome.upper().replace("_", "-"))
+
+
+class CacheProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache, upstream, key_history="last", verbose=False):
+        super().__init__(address, CacheProxyHandler)
+        self.cache = cache
+        self.upstream = upstream
+        self.key_history = key_history
+        self.verbose = verbose
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cache RAG /ask answers in front of the RAG service.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help=f"RAG service URL (default: {UPSTREAM_URL})")
+    parser.add_argument("--timeout", type=float, default=60, help="upstream timeout in seconds (default: 60)")
+    parser.add_argument("--max-entries", type=int, default=5000, help="LRU capacity (default: 5000)")
+    parser.add_argument("--ttl", type=float, default=3600, help="entry lifetime in seconds (default: 3600)")
+    parser.add_argument("--similarity", type=float, default=0.0,
+                        help="serve the closest cached query scoring at least this (0-1; default: off)")
+    parser.add_argument("--key-history", nargs="?", choices=HISTORY_KEYS, default="last", const="full",
+                        help="chat_history in the cache key: the last exchange, all of it (the value when "
+                             "given without one) or none (default: last)")
+    parser.add_argument("--watch", nargs="*", default=WATCH_PATHS,
+                        help="files whose change invalidates the cache (default: insurance.db, pet_insurance.db)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = AnswerCache(args.max_entries, args.ttl, args.similarity, args.watch)
+    server = CacheProxyServer((args.host, args.port), cache, Upstream(args.upstream, args.timeout),
+                              args.key_history, args.verbose)
+    print(f"RAG answer cache on http://{args.host}:{args.port} -> {args.upstream} "
+          f"({args.max_entries} entries, ttl {args.ttl:g}s, similarity {args.similarity or 'off'}, "
+          f"history key {args.key_history})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {json.dumps(cache.stats())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted chat_history compaction for RAG /ask requests
+
+The backend sends the last 10 turns (session.LastNTurns) verbatim with
+every question, so long answers make each request, and the RAG service's
+prompt processing, grow without bound. This proxy sits in front of the
+RAG service (or the answer cache) and rewrites chat_history to fit
+--budget tokens:
+
+1. Sentences repeated across the history (disclaimers, boilerplate)
+   are kept only in the newest turn that has them, and provider context
+   that `provider` already carries is dropped: user turns that only
+   name the provider, and sentences that only restate it ("You are
+   asking about Blue Cross.").
+2. The newest turns are kept verbatim, newest first, while they fit.
+3. Older turns are folded into a rolling summary, cached per session_id,
+   so turns that have since left the backend's 10-turn window are still
+   represented. It is sent as the first turn and kept under
+   --summary-tokens by dropping its oldest lines. The summary is
+   extractive (each question and the first sentence of its answer); no
+   model is called.
+
+Tokens are counted with tiktoken when it is installed, otherwise
+estimated (one per CJK character, one per four characters of other
+text). Each compacted response carries X-History-Tokens and
+X-History-Bytes ("before->after") headers. GET /compactor/stats totals
+what was saved; everything other than POST /ask is passed through.
+
+Usage:
+    python3 scripts/rag_history_compactor.py [--port 8004] [--upstream http://localhost:8001]
+        [--budget 600] [--summary-tokens 200] [--sessions 10000] [--ttl 3600]
+    python3 scripts/rag_history_compactor.py compact REQUEST.json [--budget 600]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rag_answer_cache import Upstream
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # optional (and get_encoding may need network): fall back to an estimate
+    _ENCODING = None
+
+DEFAULT_PORT = 8004
+UPSTREAM_URL = "http://localhost:8001"
+
+HISTORY_BUDGET_TOKENS = 600
+SUMMARY_TOKENS = 200
+SUMMARY_PREFIX = "Earlier in this conversation:"
+SUMMARY_QUESTION_CHARS = 160
+
+# Provider IDs and the names users write them as; the same list as chat.DetectProvider
+PROVIDER_ALIASES = {
+    "bluecross": ("blue cross", "bluecross", "藍十字"),
+    "one_degree": ("one degree", "onedegree"),
+    "prudential": ("prudential", "pruchoice", "保誠"),
+    "bolttech": ("bolttech",),
+}
+# Words that add nothing to a sentence that names the provider
+PROVIDER_FILLER = {
+    "you", "are", "asking", "about", "for", "regarding", "re", "the", "provider", "selected", "insurance",
+    "plan", "plans", "policy", "policies", "is", "now", "switched", "switch", "to", "using", "with",
+    "ok", "okay", "sure", "please", "i", "want", "let", "s", "talk", "only", "use", "show", "me",
+}
+
+CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+SENTENCE_RE = re.compile(r"[^.!?。！？\n]+(?:[.!?。！？]+|\n+|$)")
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def normalise_sentence(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def split_sentences(text):
+    return [match.group(0) for match in SENTENCE_RE.finditer(text or "") if match.group(0).strip()]
+
+
+def is_provider_context(sentence, provider):
+    """True if `sentence` says nothing beyond naming `provider`."""
+    aliases = PROVIDER_ALIASES.get(provider, ()) + (provider.replace("_", " "),)
+    text = normalise_sentence(sentence)
+    mentioned = False
+    for alias in aliases:
+        alias = normalise_sentence(alias)
+        if alias and alias in text:
+            text = text.replace(alias, " ")
+            mentioned = True
+    return mentioned and all(word in PROVIDER_FILLER for word in text.split())
+
+
+def turn_digest(turn):
+    return hashlib.blake2b(f"{turn.get('role')}\x1f{turn.get('content')}".encode("utf-8"), digest_size=8).digest()
+
+
+def deduplicate_turns(turns, provider):
+    """Drop repeated sentences and provider context.
+
+    Returns (digest of the original turn, cleaned turn) pairs; turns left
+    empty are removed. The digest identifies a turn across requests, since
+    what is cleaned out of it depends on the turns around it.
+    """
+    seen = set()
+    cleaned = []
+    # Newest first, so a repeated sentence survives in its latest turn, the one most likely kept verbatim
+    for turn in reversed(turns):
+        kept = []
+        for sentence in reversed(split_sentences(turn.get("content"))):
+            key = normalise_sentence(sentence)
+            if provider and is_provider_context(sentence, provider):
+                continue
+            # Only long-ish sentences count as boilerplate; "Yes." may legitimately repeat
+            if turn.get("role") == "assistant" and len(key) > 20:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(sentence)
+        content = "".join(reversed(kept)).strip()
+        if content:
+            cleaned.append((turn_digest(turn), {**turn, "content": content}))
+    cleaned.reverse()
+    return cleaned
+
+
+def summary_line(question, answer):
+    """One summary line for a folded question/answer pair."""
+    question = " ".join((question or "").split())
+    if len(question) > SUMMARY_QUESTION_CHARS:
+        question = question[:SUMMARY_QUESTION_CHARS - 1] + "…"
+    first = " ".join(next(iter(split_sentences(answer)), "").split())
+    if len(first) > 2 * SUMMARY_QUESTION_CHARS:
+        first = first[:2 * SUMMARY_QUESTION_CHARS - 1] + "…"
+    if question and first:
+        return f"- Q: {question} A: {first}"
+    return f"- {question or first}"
+
+
+def truncate_to_tokens(text, budget):
+    """The start of `text` cut to about `budget` tokens."""
+    if count_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "…"
+
+
+class SummaryCache:
+    """Rolling summaries per session: the folded turn digests and the summary lines, LRU + TTL."""
+
+    def __init__(self, max_sessions, ttl):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # session_id -> (expires_at, folded digests, lines)
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self.entries.pop(session_id, None)
+                return set(), []
+            self.entries.move_to_end(session_id)
+            return set(entry[1]), list(entry[2])
+
+    def put(self, session_id, folded, lines):
+        with self.lock:
+            self.entries[session_id] = (time.monotonic() + self.ttl, frozenset(folded), tuple(lines))
+            self.entries.move_to_end(session_id)
+            while len(self.entries) > self.max_sessions:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def fold_into_summary(turns, folded, lines, summary_tokens):
+    """Add the not-yet-folded (digest, turn) pairs to the summary lines. Returns (folded, lines)."""
+    question = None
+    for digest, turn in turns:
+        if digest in folded:
+            question = None
+            continue
+        folded.add(digest)
+        if turn.get("role") == "user":
+            if question is not None:
+                lines.append(summary_line(question, ""))
+            question = turn.get("content")
+        else:
+            lines.append(summary_line(question, turn.get("content")))
+            question = None
+    if question is not None:
+        lines.append(summary_line(question, ""))
+    # Rolling: the oldest lines go first once the summary outgrows its budget
+    while len(lines) > 1 and count_tokens("\n".join([SUMMARY_PREFIX] + lines)) > summary_tokens:
+        lines.pop(0)
+    return folded, lines
+
+
+def compact_history(history, provider="", session_id="", budget=HISTORY_BUDGET_TOKENS,
+                    summary_tokens=SUMMARY_TOKENS, summaries=None):
+    """Fit `history` into `budget` tokens. Returns (new history, report dict).
+
+    `summaries` is a SummaryCache; without one (or without a session_id)
+    the summary covers only the turns in this request.
+    """
+    before_tokens = sum(count_tokens(turn.get("content")) for turn in history)
+    before_bytes = len(json.dumps(history, ensure_ascii=False).encode("utf-8"))
+    turns = deduplicate_turns(history, provider)
+    cached = summaries is not None and session_id
+    folded, lines = summaries.get(session_id) if cached else (set(), [])
+
+    # Whole exchanges (a user turn and the answers after it), so a question is never split from its answer
+    exchanges = []
+    for item in turns:
+        if not exchanges or item[1].get("role") == "user":
+            exchanges.append([])
+        exchanges[-1].append(item)
+
+    # Newest exchanges verbatim, leaving room for the summary; anything already summarised stays there
+    verbatim_budget = max(budget - summary_tokens, budget // 2)
+    first_unfolded = max((i + 1 for i, exchange in enumerate(exchanges)
+                          if any(digest in folded for digest, _ in exchange)), default=0)
+    split, used = len(exchanges), 0
+    while split > first_unfolded:
+        tokens = sum(count_tokens(turn["content"]) for _, turn in exchanges[split - 1])
+        if used + tokens > verbatim_budget:
+            break
+        split -= 1
+        used += tokens
+    kept = [turn for exchange in exchanges[split:] for _, turn in exchange]
+    if not kept and len(exchanges) > first_unfolded:
+        # The newest exchange alone is over the budget: keep the beginning of each of its turns
+        split = len(exchanges) - 1
+        share = verbatim_budget // len(exchanges[-1])
+        kept = [{**turn, "content": truncate_to_tokens(turn["content"], share)} for _, turn in exchanges[-1]]
+        used = sum(count_tokens(turn["content"]) for turn in kept)
+    older = [item for exchange in exchanges[:split] for item in exchange]
+
+    if older:
+        folded, lines = fold_into_summary(older, folded, lines, min(summary_tokens, budget - used))
+        if cached:
+            # Digests of turns that left the backend's window can't come back; keep the set bounded
+            summaries.put(session_id, folded & {digest for digest, _ in turns}, lines)
+    summary = []
+    if lines:
+        text = truncate_to_tokens("\n".join([SUMMARY_PREFIX] + lines), max(budget - used, 0))
+        summary = [{"role": "assistant", "content": text}]
+    compacted = summary + kept
+
+    after_tokens = sum(count_tokens(turn["content"]) for turn in compacted)
+    after_bytes = len(json.dumps(compacted, ensure_ascii=False).encode("utf-8"))
+    return compacted, {
+        "turns": [len(history), len(compacted)],
+        "tokens": [before_tokens, after_tokens],
+        "bytes": [before_bytes, after_bytes],
+        "folded_turns": len(older),
+    }
+
+
+class CompactorStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = dict.fromkeys(("requests", "compacted", "tokens_in", "tokens_out", "bytes_in", "bytes_out",
+                                     "max_tokens_out", "upstream_errors"), 0)
+
+    def error(self):
+        with self.lock:
+            self.totals["upstream_errors"] += 1
+
+    def record(self, report):
+        with self.lock:
+            self.totals["requests"] += 1
+            self.totals["compacted"] += report["tokens"][1] < report["tokens"][0]
+            self.totals["tokens_in"] += report["tokens"][0]
+            self.totals["tokens_out"] += report["tokens"][1]
+            self.totals["bytes_in"] += report["bytes"][0]
+            self.totals["bytes_out"] += report["bytes"][1]
+            self.totals["max_tokens_out"] = max(self.totals["max_tokens_out"], report["tokens"][1])
+
+    def snapshot(self, sessions):
+        with self.lock:
+            totals = dict(self.totals)
+        saved = totals["tokens_in"] - totals["tokens_out"]
+        return {
+            **totals,
+            "tokens_saved": saved,
+            "bytes_saved": totals["bytes_in"] - totals["bytes_out"],
+            "saved_fraction": round(saved / totals["tokens_in"], 4) if totals["tokens_in"] else 0.0,
+            "sessions": sessions,
+            "tokenizer": "tiktoken cl100k_base" if _ENCODING is not None else "estimate",
+        }
+
+
+class CompactorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "rag-history-compactor"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def send_body(self, status, body, content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def forward(self, body=None, headers=()):
+        request_headers = {"Content-Type": self.headers.get("Content-Type", "application/json")} if body is not None else {}
+        try:
+            status, data, content_type = self.server.upstream.request(self.command, self.path, body, request_headers)
+        except OSError as e:
+            self.server.stats.error()
+            return self.send_json(502, {"detail": f"RAG upstream unavailable: {e}"})
+        self.send_body(status, data, content_type, headers)
+
+    def do_GET(self):
+        if self.path == "/compactor/stats":
+            return self.send_json(200, self.server.stats.snapshot(len(self.server.summaries)))
+        self.forward()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path != "/ask":
+            return self.forward(body)
+        try:
+            request = json.loads(body or b"{}")
+            history = request.get("chat_history") or []
+            if not isinstance(history, list) or not all(isinstance(turn, dict) for turn in history):
+                raise TypeError("chat_history must be a list of turns")
+        except (ValueError, TypeError, AttributeError):
+            return self.forward(body)  # let the RAG service produce its validation error
+
+        server = self.server
+        compacted, report = compact_history(history, request.get("provider") or "", request.get("session_id") or "",
+                                            server.budget, server.summary_tokens, server.summaries)
+        server.stats.record(report)
+        if compacted:
+            request["chat_history"] = compacted
+        else:
+            request.pop("chat_history", None)
+        headers = [("X-History-Tokens", "{}->{}".format(*report["tokens"])),
+                   ("X-History-Bytes", "{}->{}".format(*report["bytes"]))]
+        if server.verbose:
+            print(f"session {request.get('session_id') or '-'}: turns {report['turns'][0]}->{report['turns'][1]}, "
+                  f"tokens {headers[0][1]}, bytes {headers[1][1]}")
+        self.forward(json.dumps(request, ensure_ascii=False).encode("utf-8"), headers)
+
+
+class CompactorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, upstream, budget, summary_tokens, summaries, verbose=False):
+        super().__init__(address, CompactorHandler)
+        self.upstream = upstream
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.summaries = summaries
+        self.stats = CompactorStats()
+        self.verbose = verbose
+
+
+def compact_file(path, budget, summary_tokens):
+    """Compact one /ask request body from a file (or - for stdin) and print it with its report."""
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        request = json.load(f)
+    compacted, report = compact_history(request.get("chat_history") or [], request.get("provider") or "",
+                                        budget=budget, summary_tokens=summary_tokens)
+    print(json.dumps({**request, "chat_history": compacted}, ensure_ascii=False, indent=2))
+    print(f"turns {report['turns'][0]}->{report['turns'][1]}, tokens {report['tokens'][0]}->{report['tokens'][1]}, "
+          f"bytes {report['bytes'][0]}->{report['bytes'][1]}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact chat_history in RAG /ask requests to a token budget.")
+    sub = parser.add_subparsers(dest="command")
+    compact = sub.add_parser("compact", help="compact one request body and print it")
+    compact.add_argument("request", help="JSON file with an /ask body, or - for stdin")
+    # Accepted before or after `compact`; SUPPRESS keeps the subcommand from resetting a value given before it
+    for command, budget, summary_tokens in ((parser, HISTORY_BUDGET_TOKENS, SUMMARY_TOKENS),
+                                            (compact, argparse.SUPPRESS, argparse.SUPPRESS)):
+        command.add_argument("--budget", type=int, default=budget,
+                             help=f"chat_history token budget per request (default: {HISTORY_BUDGET_TOKENS})")
+        command.add_argument("--summary-tokens", type=int, default=summary_tokens,
+                             help=f"most of the budget the rolling summary may use (default: {SUMMARY_TOKENS})")
+
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help=f"RAG service URL (default: {UPSTREAM_URL})")
+    parser.add_argument("--timeout", type=float, default=60, help="upstream timeout in seconds (default: 60)")
+    parser.add_argument("--sessions", type=int, default=10000, help="sessions whose summaries are kept (default: 10000)")
+    parser.add_argument("--ttl", type=float, default=3600, help="summary lifetime in seconds (default: 3600)")
+    parser.add_argument("--verbose", action="store_true", help="log every request and its savings")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        return compact_file(args.request, args.budget, args.summary_tokens)
+
+    server = CompactorServer((args.host, args.port), Upstream(args.upstream, args.timeout), args.budget,
+                             args.summary_tokens, SummaryCache(args.sessions, args.ttl), args.verbose)
+    print(f"RAG history compactor on http://{args.host}:{args.port} -> {args.upstream} "
+          f"(budget {args.budget} tokens, summary {args.summary_tokens}, "
+          f"{'tiktoken' if _ENCODING is not None else 'estimated'} token counts)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {json.dumps(server.stats.snapshot(len(server.summaries)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the RAG service
+
+Serves the same API the Go backend's rag.Client calls (POST /ask with a
+ChatRequest, GET /providers) so the chat path can be run and profiled
+offline. Upstream behaviour is configurable and reproducible:
+
+- latency per endpoint from a distribution (fixed, uniform, normal,
+  lognormal), plus an optional cost per chat_history turn and per KB of
+  chat_history received (prompt processing grows with its size)
+- answer size and number of sources
+- failure rates: HTTP 500, malformed JSON, and hangs that outlast the
+  caller's timeout
+
+Random draws come from one generator per request, seeded with --seed and
+the request's arrival number, so the same seed and request order give the
+same timings. GET /stats reports what the stub has received, including the
+largest chat_history seen, to check LastNTurns truncation.
+
+Point the backend at it with RAG_SERVICE_URL=http://localhost:8001.
+
+Usage:
+    python3 scripts/rag_stub_server.py [--profile typical] [--port 8001] [--seed 0]
+        [--ask-latency lognormal:800:0.5] [--error-rate 0.02] [--answer-bytes 600:2400]
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8001
+
+PROVIDERS = [
+    {"id": "bluecross", "name": "Blue Cross"},
+    {"id": "one_degree", "name": "OneDegree"},
+    {"id": "prudential", "name": "Prudential"},
+    {"id": "bolttech", "name": "bolttech"},
+    {"id": "msig", "name": "MSIG"},
+]
+
+FILLER = ("The policy covers eligible veterinary expenses up to the annual limit, subject to the "
+          "waiting period, sub-limits and the coinsurance shown in the schedule of benefits. ")
+
+
+@dataclass(frozen=True)
+class Latency:
+    """A latency distribution in milliseconds, parsed from `kind:arg[:arg]`."""
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, text):
+        kind, *args = text.split(":")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(args) != expected[kind]:
+            raise argparse.ArgumentTypeError(
+                f"invalid latency '{text}' (use fixed:MS, uniform:MIN:MAX, normal:MEAN:SD or lognormal:MEDIAN:SIGMA)")
+        values = [float(arg) for arg in args] + [0.0]
+        return cls(kind, values[0], values[1])
+
+    def sample(self, rng):
+        if self.kind == "uniform":
+            ms = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            ms = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            ms = self.a * math.exp(rng.gauss(0, self.b))
+        else:
+            ms = self.a
+        return max(ms, 0.0)
+
+    def __str__(self):
+        return self.kind + "".join(f":{value:g}" for value in ((self.a,) if self.kind == "fixed" else (self.a, self.b)))
+
+
+@dataclass(frozen=True)
+class Profile:
+    ask_latency: Latency = field(default_factory=Latency)
+    providers_latency: Latency = field(default_factory=Latency)
+    per_turn_ms: float = 0.0
+    per_history_kb_ms: float = 0.0
+    answer_bytes: tuple = (400, 1200)
+    sources: int = 3
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_seconds: float = 60.0
+
+
+PROFILES = {
+    "instant": Profile(answer_bytes=(200, 200), sources=1),
+    "fast": Profile(Latency("uniform", 50, 150), Latency("fixed", 5), per_turn_ms=2),
+    "typical": Profile(Latency("lognormal", 900, 0.45), Latency("uniform", 10, 40), per_turn_ms=15,
+                       answer_bytes=(600, 2400)),
+    "slow": Profile(Latency("lognormal", 3000, 0.6), Latency("uniform", 50, 200), per_turn_ms=40,
+                    answer_bytes=(1500, 6000), sources=5),
+    "flaky": Profile(Latency("lognormal", 900, 0.8), Latency("uniform", 10, 40), per_turn_ms=15,
+                     answer_bytes=(600, 2400), error_rate=0.05, malformed_rate=0.01, hang_rate=0.01),
+}
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.by_outcome = {}
+        self.max_history_turns = 0
+        self.history_turns = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def next_request(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def record(self, outcome, bytes_in=0, bytes_out=0, history_turns=None):
+        with self.lock:
+            self.by_outcome[outcome] = self.by_outcome.get(outcome, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if history_turns is not None:
+                self.history_turns += history_turns
+                self.max_history_turns = max(self.max_history_turns, history_turns)
+
+    def snapshot(self):
+        with self.lock:
+            asks = sum(count for outcome, count in self.by_outcome.items() if outcome.startswith("ask") and outcome != "ask_invalid")
+            return {
+                "requests": self.requests,
+                "outcomes": dict(self.by_outcome),
+                "max_history_turns": self.max_history_turns,
+                "mean_history_turns": round(self.history_turns / asks, 2) if asks else 0,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+
+def make_answer(rng, query, provider, size):
+    intro = f"Answer for '{query}'" + (f" ({provider})" if provider else "") + ": "
+    body = (FILLER * (size // len(FILLER) + 1))[:max(size - len(intro), 0)]
+    return intro + body
+
+
+class RAGStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like uvicorn
+    server_version = "rag-stub"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def send_body(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def send_json(self, status, payload):
+        return self.send_body(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def draw_failure(self, rng, profile):
+        """Return 'error', 'malformed', 'hang' or None for this request."""
+        roll = rng.random()
+        for outcome, rate in (("error", profile.error_rate), ("malformed", profile.malformed_rate),
+                              ("hang", profile.hang_rate)):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return None
+
+    def fail(self, endpoint, failure, profile, bytes_in=0, history_turns=None):
+        stats = self.server.stats
+        if failure == "hang":
+            time.sleep(profile.hang_seconds)
+            sent = self.send_json(504, {"detail": "stub upstream hang"})
+        elif failure == "malformed":
+            sent = self.send_body(200, b'{"answer": "truncated')
+        else:
+            sent = self.send_json(500, {"detail": "stub injected failure"})
+        stats.record(f"{endpoint}_{failure}", bytes_in, sent, history_turns)
+
+    def do_GET(self):
+        server = self.server
+        rng = random.Random(f"{server.seed}:{server.stats.next_request()}")
+        profile = server.profile
+        if self.path == "/providers":
+            time.sleep(profile.providers_latency.sample(rng) / 1000)
+            failure = self.draw_failure(rng, profile)
+            if failure:
+                return self.fail("providers", failure, profile)
+            sent = self.send_json(200, {"providers": PROVIDERS})
+            server.stats.record("providers_ok", 0, sent)
+        elif self.path == "/stats":
+            self.send_json(200, server.stats.snapshot())
+        elif self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path != "/ask":
+            return self.send_json(404, {"detail": "Not Found"})
+
+        rng = random.Random(f"{server.seed}:{server.stats.next_request()}")
+        profile = server.profile
+        try:
+            request = json.loads(raw or b"{}")
+            query = request["query"]
+            if not isinstance(query, str):
+                raise TypeError("query must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            # FastAPI answers validation errors with 422
+            self.send_json(422, {"detail": [{"loc": ["body", "query"], "msg": str(e), "type": "value_error"}]})
+            server.stats.record("ask_invalid", len(raw))
+            return
+
+        history = request.get("chat_history") or []
+        history_kb = len(json.dumps(history, ensure_ascii=False).encode("utf-8")) / 1024 if history else 0
+        delay_ms = (profile.ask_latency.sample(rng) + profile.per_turn_ms * len(history)
+                    + profile.per_history_kb_ms * history_kb)
+        time.sleep(delay_ms / 1000)
+
+        failure = self.draw_failure(rng, profile)
+        if failure:
+            return self.fail("ask", failure, profile, len(raw), len(history))
+
+        provider = request.get("provider") or ""
+        low, high = profile.answer_bytes
+        sources = rng.sample(PROVIDERS, min(profile.sources, len(PROVIDERS)))
+        response = {
+            "answer": make_answer(rng, query, provider, rng.randint(low, high)),
+            "sources": [f"{source['id']}/policy_wording.pdf#p{rng.randint(1, 60)}" for source in sources],
+        }
+        if provider:
+            response["active_provider"] = provider
+        if request.get("session_id"):
+            response["session_id"] = request["session_id"]
+        sent = self.send_json(200, response)
+        server.stats.record("ask_ok", len(raw), sent, len(history))
+
+
+class RAGStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profile, seed=0, verbose=False):
+        super().__init__(address, RAGStubHandler)
+        self.profile = profile
+        self.seed = seed
+        self.verbose = verbose
+        self.stats = StubStats()
+
+
+def parse_range(text):
+    low, _, high = text.partition(":")
+    low = int(low)
+    high = int(high or low)
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"invalid range '{text}' (use N or MIN:MAX)")
+    return low, high
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the RAG service.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical",
+                        help="base latency/failure profile (default: typical)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--ask-latency", type=Latency.parse, help="/ask latency, e.g. lognormal:900:0.45")
+    parser.add_argument("--providers-latency", type=Latency.parse, help="/providers latency, e.g. fixed:20")
+    parser.add_argument("--per-turn-ms", type=float, help="extra /ask latency per chat_history turn")
+    parser.add_argument("--per-history-kb-ms", type=float, help="extra /ask latency per KB of chat_history")
+    parser.add_argument("--answer-bytes", type=parse_range, help="answer size as N or MIN:MAX characters")
+    parser.add_argument("--sources", type=int, help="sources per answer")
+    parser.add_argument("--error-rate", type=float, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, help="fraction answered with truncated JSON")
+    parser.add_argument("--hang-rate", type=float, help="fraction that hang for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, help="how long a hanging request stalls")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+def build_profile(args):
+    """The chosen profile with any command-line overrides applied."""
+    overrides = {name: getattr(args, name) for name in (
+        "ask_latency", "providers_latency", "per_turn_ms", "per_history_kb_ms", "answer_bytes", "sources",
+        "error_rate", "malformed_rate", "hang_rate", "hang_seconds") if getattr(args, name) is not None}
+    return replace(PROFILES[args.profile], **overrides)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = build_profile(args)
+    if profile.error_rate + profile.malformed_rate + profile.hang_rate > 1:
+        print("Error: error, malformed and hang rates add up to more than 1.")
+        sys.exit(1)
+
+    server = RAGStubServer((args.host, args.port), profile, args.seed, args.verbose)
+    print(f"RAG stub listening on http://{args.host}:{args.port} (profile {args.profile}, seed {args.seed})")
+    print(f"  /ask latency {profile.ask_latency} ms + {profile.per_turn_ms:g} ms/turn "
+          f"+ {profile.per_history_kb_ms:g} ms/KB of history, "
+          f"answers {profile.answer_bytes[0]}-{profile.answer_bytes[1]} chars, {profile.sources} sources")
+    print(f"  /providers latency {profile.providers_latency} ms")
+    print(f"  failures: error {profile.error_rate:.1%}, malformed {profile.malformed_rate:.1%}, "
+          f"hang {profile.hang_rate:.1%} ({profile.hang_seconds:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {json.dumps(server.stats.snapshot())}")
+
+
+if __name__ == "__main__":
+    main()
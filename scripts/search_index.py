@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Full-text search over plans and coverages in pet_insurance.db
+
+Builds `insurance_search`, an FTS5 index with one document per product
+(name, company, tags, remarks, coinsurance) and one per product coverage
+(coverage type, limit remark, sub-coverage names and remarks, plus the
+product name), each with its `_zh` counterpart, and answers keyword
+queries ranked by BM25 with title matches weighted above body matches.
+
+English text uses the `porter unicode61` tokenizer, so "surgeries" finds
+"Surgery". Chinese has no spaces to split on, so `_zh` text is indexed as
+overlapping character bigrams (牙科治療 -> 牙科 科治 治療, plus the run's
+last character); queries are split the same way and matched as phrases,
+so 2-character words like 牙科 work, which the trigram tokenizer can't do.
+
+Terms are ANDed; if nothing matches every term the query is retried
+with OR.
+
+Like the comparison tables, the index records a fingerprint of its source
+tables and build_insurance_db.py only rebuilds it when they changed.
+
+Run by build_insurance_db.py after each build, or on its own:
+    python3 scripts/search_index.py build [--db PATH]
+    python3 scripts/search_index.py query "MRI" [--kind coverage] [--limit 10]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+import comparison_tables
+import instrumentation
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+
+# BM25 column weights, in table column order (unindexed columns get 0)
+BM25_WEIGHTS = (0, 0, 0, 0, 0, 10.0, 10.0, 1.0, 1.0)
+
+CJK_RUN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿\U00020000-\U0002ebef]+")
+# Tables product_documents and coverage_documents read
+SOURCE_TABLES = ("product", "insurance_provider", "coverage_list", "coverage_limit", "sub_coverage_limit")
+
+QUERY_TOKEN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿\U00020000-\U0002ebef]+|[^\W_]+")
+
+
+def cjk_bigrams(run):
+    """Bigram tokens for one run of CJK characters, plus its last character."""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def segment_zh(text):
+    """Rewrite Chinese text so the unicode61 tokenizer sees bigrams instead of whole runs."""
+    if not text:
+        return ""
+    return CJK_RUN_RE.sub(lambda m: " " + " ".join(cjk_bigrams(m.group(0))) + " ", text)
+
+
+def join_text(*parts):
+    return "\n".join(part for part in parts if part)
+
+
+def create_search_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS insurance_search")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE insurance_search USING fts5(
+            kind UNINDEXED,
+            product_id UNINDEXED,
+            coverage_id UNINDEXED,
+            label UNINDEXED,
+            label_zh UNINDEXED,
+            title,
+            title_zh,
+            body,
+            body_zh,
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    """)
+
+
+def product_documents(conn):
+    rows = conn.execute("""
+        SELECT p.insurance_id, p.insurance_name, p.insurance_name_zh,
+               ip.company_name, ip.company_name_zh, p.tag, p.tag_zh,
+               p.remark, p.remark_zh, p.coinsurance, p.coinsurance_zh, p.suitable_pet_type, p.suitable_pet_type_zh
+        FROM product p
+        LEFT JOIN insurance_provider ip ON ip.company_id = p.provider_id
+    """)
+    for (product_id, name, name_zh, company, company_zh, tag, tag_zh,
+         remark, remark_zh, coinsurance, coinsurance_zh, pets, pets_zh) in rows:
+        # "#HighLimitSurgical" -> "High Limit Surgical" so tag words are searchable
+        tag_words = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", (tag or "").replace("#", " "))
+        yield (
+            "product", product_id, None, name, name_zh,
+            join_text(name, company),
+            segment_zh(join_text(name_zh, company_zh)),
+            join_text(tag, tag_words, remark, coinsurance, pets),
+            segment_zh(join_text(tag_zh, remark_zh, coinsurance_zh, pets_zh)),
+        )
+
+
+def coverage_documents(conn):
+    rows = conn.execute("""
+        SELECT cl.product_id, cl.coverage_id, p.insurance_name, p.insurance_name_zh,
+               lst.coverage_type, lst.coverage_type_zh, cl.remark, cl.remark_zh,
+               (SELECT group_concat(COALESCE(s.sub_coverage_name, '') || ' ' || COALESCE(s.sub_coverage_remark, ''),
+                                    char(10))
+                FROM sub_coverage_limit s
+                WHERE s.product_id = cl.product_id AND s.parent_coverage_id = cl.coverage_id),
+               (SELECT group_concat(COALESCE(s.sub_coverage_name_zh, '') || ' ' || COALESCE(s.sub_coverage_remark_zh, ''),
+                                    char(10))
+                FROM sub_coverage_limit s
+                WHERE s.product_id = cl.product_id AND s.parent_coverage_id = cl.coverage_id)
+        FROM coverage_limit cl
+        LEFT JOIN product p ON p.insurance_id = cl.product_id
+        LEFT JOIN coverage_list lst ON lst.coverage_id = cl.coverage_id
+    """)
+    for (product_id, coverage_id, name, name_zh, coverage_type, coverage_type_zh,
+         remark, remark_zh, sub_text, sub_text_zh) in rows:
+        yield (
+            "coverage", product_id, coverage_id,
+            join_text(name, coverage_type), join_text(name_zh, coverage_type_zh),
+            coverage_type,
+            segment_zh(coverage_type_zh),
+            join_text(name, remark, sub_text),
+            segment_zh(join_text(name_zh, remark_zh, sub_text_zh)),
+        )
+
+
+def populate_search_table(conn):
+    """Index every product and product coverage. Returns the document count."""
+    insert = """
+        INSERT INTO insurance_search
+        (kind, product_id, coverage_id, label, label_zh, title, title_zh, body, body_zh)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    cursor = conn.cursor()
+    cursor.executemany(insert, product_documents(conn))
+    cursor.executemany(insert, coverage_documents(conn))
+    cursor.execute("INSERT INTO insurance_search (insurance_search) VALUES ('optimize')")
+    cursor.execute("SELECT COUNT(*) FROM insurance_search")
+    return cursor.fetchone()[0]
+
+
+def build_search_index(conn):
+    """Rebuild the search index in one transaction."""
+    start = time.perf_counter()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        create_search_table(conn)
+        count = populate_search_table(conn)
+        comparison_tables.record_sources(conn, "insurance_search", SOURCE_TABLES)
+    print(f"Indexed {count} search documents in {time.perf_counter() - start:.2f}s.")
+    return count
+
+
+@instrumentation.staged(name="search_index")
+def materialize(db_path=DB_PATH, only_if_stale=False):
+    """Build the search index in `db_path` if it exists.
+
+    With `only_if_stale`, nothing is written when the source tables are unchanged since the last build.
+    """
+    if not os.path.exists(db_path):
+        print(f"Skipping search index: {db_path} not found.")
+        return None
+    conn = instrumentation.trace_connection(sqlite3.connect(db_path))
+    try:
+        if only_if_stale and comparison_tables.is_up_to_date(conn, "insurance_search", SOURCE_TABLES):
+            print("Search index is up to date.")
+            return None
+        return build_search_index(conn)
+    finally:
+        conn.close()
+
+
+def query_terms(text):
+    """FTS5 terms for free text: quoted English words and bigram phrases for Chinese runs."""
+    terms = []
+    for token in QUERY_TOKEN_RE.findall(text):
+        if CJK_RUN_RE.fullmatch(token):
+            if len(token) == 1:
+                # Prefix of the bigrams it starts; the run-final unigram covers the rest
+                terms.append(f'"{token}"*')
+            else:
+                terms.append('"' + " ".join(token[i:i + 2] for i in range(len(token) - 1)) + '"')
+        else:
+            terms.append(f'"{token}"')
+    # The last word may still be being typed
+    if terms and not CJK_RUN_RE.fullmatch(QUERY_TOKEN_RE.findall(text)[-1]):
+        terms[-1] += "*"
+    return terms
+
+
+def search(conn, text, limit=10, kind=None):
+    """BM25-ranked matches for `text`, best first.
+
+    Returns dicts with kind, product_id, coverage_id, label, label_zh and score
+    (lower is better, as FTS5 reports it).
+    """
+    terms = query_terms(text)
+    if not terms:
+        return []
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = f"""
+        SELECT kind, product_id, coverage_id, label, label_zh, bm25(insurance_search, {weights}) AS score
+        FROM insurance_search
+        WHERE insurance_search MATCH ? {"AND kind = ?" if kind else ""}
+        ORDER BY score
+        LIMIT ?
+    """
+    for operator in (" AND ", " OR "):
+        params = [operator.join(terms)] + ([kind] if kind else []) + [limit]
+        rows = conn.execute(sql, params).fetchall()
+        if rows or len(terms) == 1:
+            break
+    columns = ("kind", "product_id", "coverage_id", "label", "label_zh", "score")
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the insurance full-text search index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="rebuild the index")
+    build.add_argument("--db", default=DB_PATH, help=f"database path (default: {DB_PATH})")
+    query = sub.add_parser("query", help="search the index")
+    query.add_argument("text")
+    query.add_argument("--db", default=DB_PATH, help=f"database path (default: {DB_PATH})")
+    query.add_argument("--kind", choices=("product", "coverage"), help="only this kind of document")
+    query.add_argument("--limit", type=int, default=10, help="maximum results (default: 10)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        with instrumentation.run("search_index"):
+            materialize(args.db)
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        start = time.perf_counter()
+        results = search(conn, args.text, args.limit, args.kind)
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+    for result in results:
+        ids = f"product {result['product_id']}" + (
+            f", coverage {result['coverage_id']}" if result["coverage_id"] is not None else "")
+        label = " / ".join(part.replace("\n", " · ") for part in (result["label"], result["label_zh"]) if part)
+        print(f"{result['score']:8.3f}  [{result['kind']}] {label} ({ids})")
+    print(f"{len(results)} results in {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Versioned delta sync feed
+
+Gives every data release of the synced endpoints (/insurance-products,
+/coverage-limits, /sub-coverage-limits) a monotonic version and
+records what changed in it, so clients that already hold version N can
+fetch `?since=N` and apply a few upserts and deletes instead of
+downloading the full payload again.
+
+`release` reads the rows from the artifact the Go handlers serve
+(database/pet_insurance.db, written by publish_served_db.py) exactly as
+they serialize them (same field order, NULL-scan drops and
+number-to-string conversions), diffs
+them by key against the previous release and, if anything changed,
+records the change set under the next version in data/sync_feed.db:
+
+    release(version, created_at, source, counts)
+    row_state(dataset, key, hash)                 -- state after the latest release
+    change(dataset, version, key, op, body)       -- op: upsert (with body) or delete
+
+Keys are `insurance_id`, (`coverage_id`, `product_id`) and
+`sub_coverage_id`. `changes_between()` merges the change sets between any
+two versions: the last change per key wins, and deletes of rows that did
+not exist at `since` are dropped.
+
+For the last RETAIN_VERSIONS versions the merged "since N -> latest"
+deltas are pre-serialized (Go JSON encoding, gzip/brotli variants,
+content-addressed) into data/sync with a manifest in the snapshot format,
+so handlers/sync.go serves them straight from disk. Older clients get the
+full payload. The manifest also records the size and mtime of the
+artifact the release read; sync.go only sends X-Data-Version (and
+deltas) while the served file still matches them, so a full payload is
+never labelled with a version that describes other data. A delta body
+looks like:
+
+    {"dataset": "coverage-limits", "since": 4, "version": 6,
+     "upserts": [{...full row...}], "deletes": [{"coverage_id": 3, "product_id": 17}]}
+
+/clinics is not synced: the Go clinics service enriches the rows from
+Google Places at startup and adds MAPS_API_KEY to photo URLs, so a feed
+built from clinics.csv would be stale and would persist the key. Rows and
+files of datasets that are no longer synced are purged on the next release.
+
+Run `release` after every publish_served_db.py publish. Until it has
+run, clients get full payloads without a version.
+
+Usage:
+    python3 scripts/sync_feed.py release [--db PATH] [--feed PATH] [--out-dir DIR]
+    python3 scripts/sync_feed.py status
+    python3 scripts/sync_feed.py changes DATASET --since N [--until M]
+    python3 scripts/sync_feed.py bench [--products N] [--releases N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from export_static_snapshots import go_json, prune, write_atomic, write_variants
+from publish_served_db import SERVED_PATH
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNC_DIR = os.path.join(REPO_ROOT, "data", "sync")
+FEED_PATH = os.path.join(REPO_ROOT, "data", "sync_feed.db")
+MANIFEST_NAME = "manifest.json"
+
+# Versions a client may lag behind and still get a delta
+RETAIN_VERSIONS = 30
+
+FEED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS release (
+    version INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    source TEXT,
+    counts TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS row_state (
+    dataset TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (dataset, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS change (
+    dataset TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('upsert', 'delete')),
+    body TEXT,
+    PRIMARY KEY (dataset, version, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_change_key ON change (dataset, key, version);
+"""
+
+INTEGER_RE = re.compile(r"^[+-]?\d+$")
+
+
+@dataclass(frozen=True)
+class Dataset:
+    name: str          # endpoint path without the slash
+    key: tuple         # key fields, in order
+    fields: tuple      # (json field, kind) in Go struct order; kind: int, str or nstr (NullJsonString)
+    sql: str           # the handler's query
+
+
+DATASETS = (
+    Dataset(
+        "insurance-products", ("insurance_id",),
+        (("insurance_id", "int"), ("provider_id", "int"), ("insurance_name", "str"))
+        + tuple((name, "nstr") for name in (
+            "insurance_name_zh", "remark", "remark_zh", "min_age", "min_age_zh", "max_age", "max_age_zh",
+            "coinsurance", "coinsurance_zh", "suitable_pet_type", "suitable_pet_type_zh",
+            "cat_breed_type", "cat_breed_type_zh", "dog_breed_type", "dog_breed_type_zh",
+            "breed_type_remark", "breed_type_remark_zh", "payment_mode", "payment_mode_zh",
+            "waiting_period", "waiting_period_zh", "information_link", "information_link_zh",
+            "update_time", "tag", "tag_zh")),
+        """SELECT insurance_id, provider_id, insurance_name, insurance_name_zh, remark, remark_zh,
+            min_age, min_age_zh, max_age, max_age_zh, coinsurance, coinsurance_zh, suitable_pet_type,
+            suitable_pet_type_zh, cat_breed_type, cat_breed_type_zh, dog_breed_type, dog_breed_type_zh,
+            breed_type_remark, breed_type_remark_zh, payment_mode, payment_mode_zh, waiting_period,
+            waiting_period_zh, information_link, information_link_zh, update_time, tag, tag_zh
+            FROM product"""),
+    Dataset(
+        "coverage-limits", ("coverage_id", "product_id"),
+        (("coverage_id", "int"), ("product_id", "int"), ("coverage_limit", "nstr"),
+         ("remark", "nstr"), ("remark_zh", "nstr")),
+        "SELECT coverage_id, product_id, coverage_limit, remark, remark_zh FROM coverage_limit"),
+    Dataset(
+        "sub-coverage-limits", ("sub_coverage_id",),
+        (("sub_coverage_id", "int"), ("parent_coverage_id", "int"), ("product_id", "int"),
+         ("sub_coverage_name", "nstr"), ("sub_coverage_name_zh", "nstr"), ("sub_limit", "nstr"),
+         ("sub_coverage_remark", "nstr"), ("sub_coverage_remark_zh", "nstr")),
+        """SELECT sub_coverage_id, parent_coverage_id, product_id, sub_coverage_name, sub_coverage_name_zh,
+            sub_limit, sub_coverage_remark, sub_coverage_remark_zh FROM sub_coverage_limit"""),
+)
+DATASETS_BY_NAME = {dataset.name: dataset for dataset in DATASETS}
+
+
+# --- Rows as the handlers serve them ---
+
+def go_float_string(value):
+    """strconv.FormatFloat(value, 'g', -1, 64), which database/sql uses to scan a REAL into a string."""
+    sign, digits, exponent = Decimal(repr(value)).normalize().as_tuple()
+    if digits == (0,):
+        return "-0" if sign else "0"
+    point = len(digits) + exponent  # decimal point position, as Go's digs.dp
+    exp = point - 1
+    mantissa = "".join(map(str, digits))
+    if exp < -4 or exp >= 6:
+        text = mantissa[0] + ("." + mantissa[1:] if len(mantissa) > 1 else "")
+        text += f"e{'-' if exp < 0 else '+'}{abs(exp):02d}"
+    else:
+        text = f"{abs(value):.{max(len(digits) - point, 0)}f}"
+    return ("-" if sign else "") + text
+
+
+def go_string(value):
+    """A column value scanned into a Go string."""
+    if isinstance(value, float):
+        return go_float_string(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def scan_row(fields, row):
+    """Convert one result row like rows.Scan into the model struct. None if Scan would fail."""
+    record = {}
+    for (name, kind), value in zip(fields, row):
+        if kind == "nstr":
+            record[name] = None if value is None else go_string(value)
+        elif value is None:
+            return None  # NULL into int/string: the handler skips the row
+        elif kind == "int":
+            if isinstance(value, int):
+                record[name] = value
+            elif INTEGER_RE.match(go_string(value)):
+                record[name] = int(go_string(value))
+            else:
+                return None
+        else:
+            record[name] = go_string(value)
+    return record
+
+
+def load_rows(dataset, conn):
+    """{key: row dict} for one dataset, in the order the endpoint returns them."""
+    records = (record for record in (scan_row(dataset.fields, row) for row in conn.execute(dataset.sql))
+               if record is not None)
+    rows = {}
+    for record in records:
+        key = row_key(dataset, record)
+        if key in rows:
+            print(f"  Warning: duplicate {dataset.name} key {key}; keeping the last row.")
+        rows[key] = record
+    return rows
+
+
+def row_key(dataset, record):
+    return json.dumps([record[field] for field in dataset.key], ensure_ascii=False, separators=(",", ":"))
+
+
+def row_body(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def row_hash(body):
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+
+
+def collect_rows(db_path, names):
+    """{dataset name: {key: row}}, or {} if the database does not exist."""
+    if not os.path.exists(db_path):
+        print(f"Skipping release: {db_path} not found.")
+        return {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return {name: load_rows(DATASETS_BY_NAME[name], conn) for name in names}
+    finally:
+        conn.close()
+
+
+# --- Feed database ---
+
+def open_feed(feed_path):
+    os.makedirs(os.path.dirname(feed_path), exist_ok=True)
+    conn = sqlite3.connect(feed_path, isolation_level=None)
+    conn.executescript(FEED_SCHEMA)
+    return conn
+
+
+def drop_retired_datasets(conn):
+    """Delete the recorded rows of datasets no longer in DATASETS. Returns how many were deleted."""
+    placeholders = ", ".join("?" for _ in DATASETS)
+    names = list(DATASETS_BY_NAME)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        deleted = conn.execute(f"DELETE FROM change WHERE dataset NOT IN ({placeholders})", names).rowcount
+        conn.execute(f"DELETE FROM row_state WHERE dataset NOT IN ({placeholders})", names)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if deleted:
+        print(f"Purged {deleted:,} recorded changes of datasets that are no longer synced.")
+    return deleted
+
+
+def latest_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM release").fetchone()[0]
+
+
+def diff_dataset(conn, name, rows):
+    """[(key, op, body)] turning the recorded state of `name` into `rows`."""
+    state = dict(conn.execute("SELECT key, hash FROM row_state WHERE dataset = ?", (name,)))
+    changes = []
+    for key, record in rows.items():
+        body = row_body(record)
+        if state.get(key) != row_hash(body):
+            changes.append((key, "upsert", body))
+    changes.extend((key, "delete", None) for key in state.keys() - rows.keys())
+    return changes
+
+
+def record_release(conn, collected, source):
+    """Store the changes in `collected` as a new version. Returns (version, {dataset: changes})."""
+    changes = {name: diff_dataset(conn, name, rows) for name, rows in collected.items()}
+    version = latest_version(conn)
+    if not any(changes.values()):
+        return version, changes
+
+    version += 1
+    counts = {name: len(rows) for name, rows in collected.items()}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT INTO release VALUES (?, ?, ?, ?)",
+                     (version, datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                      json.dumps(source), json.dumps(counts)))
+        for name, dataset_changes in changes.items():
+            conn.executemany("INSERT INTO change VALUES (?, ?, ?, ?, ?)",
+                             [(name, version, key, op, body) for key, op, body in dataset_changes])
+            conn.executemany("INSERT OR REPLACE INTO row_state VALUES (?, ?, ?)",
+                             [(name, key, row_hash(body)) for key, op, body in dataset_changes if op == "upsert"])
+            conn.executemany("DELETE FROM row_state WHERE dataset = ? AND key = ?",
+                             [(name, key) for key, op, _ in dataset_changes if op == "delete"])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return version, changes
+
+
+def changes_between(conn, dataset, since, until=None):
+    """Merge the change sets of `dataset` in (since, until] into one delta.
+
+    The last change per key wins; a delete is kept only if the row existed
+    at `since`. `since` 0 yields every row as an upsert.
+    """
+    latest = latest_version(conn)
+    until = latest if until is None else until
+    if not 0 <= since <= until <= latest:
+        raise ValueError(f"versions must satisfy 0 <= since <= until <= {latest}, got {since}..{until}")
+
+    key_fields = DATASETS_BY_NAME[dataset].key
+    # Bare columns in a MAX() aggregate come from the row holding the maximum
+    rows = conn.execute("""
+        SELECT c.key, c.op, c.body, MAX(c.version),
+            (SELECT p.op FROM change p WHERE p.dataset = c.dataset AND p.key = c.key AND p.version <= ?
+             ORDER BY p.version DESC LIMIT 1)
+        FROM change c
+        WHERE c.dataset = ? AND c.version > ? AND c.version <= ?
+        GROUP BY c.key
+        ORDER BY c.key
+    """, (since, dataset, since, until))
+
+    upserts, deletes = [], []
+    for key, op, body, _, op_at_since in rows:
+        if op == "upsert":
+            upserts.append(json.loads(body))
+        elif op_at_since == "upsert":
+            deletes.append(dict(zip(key_fields, json.loads(key))))
+    return {"dataset": dataset, "since": since, "version": until, "upserts": upserts, "deletes": deletes}
+
+
+def apply_delta(rows, delta):
+    """Apply a delta to {key: row}, as a client would. Returns the new dict."""
+    dataset = DATASETS_BY_NAME[delta["dataset"]]
+    merged = dict(rows)
+    for key_obj in delta["deletes"]:
+        merged.pop(row_key(dataset, key_obj), None)
+    for record in delta["upserts"]:
+        merged[row_key(dataset, record)] = record
+    return merged
+
+
+def rows_at(conn, dataset, version):
+    """{key: row} of `dataset` as of `version`, rebuilt from the change log."""
+    delta = changes_between(conn, dataset, 0, version)
+    return apply_delta({}, delta)
+
+
+# --- Served files ---
+
+def file_identity(path):
+    """What sync.go compares against the served file: size and mtime in nanoseconds."""
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_manifest(out_dir):
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_feed_files(conn, out_dir, version, source, retain=RETAIN_VERSIONS):
+    """Pre-serialize the since-N deltas of every retained version and replace the manifest.
+
+    `source` is the file_identity() of the artifact `version` was read from.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    previous = load_manifest(out_dir)
+
+    recorded = {name for (name,) in conn.execute("SELECT DISTINCT dataset FROM change")}
+    datasets = [name for name in DATASETS_BY_NAME if name in recorded]
+    oldest = max(1, version - retain)
+    endpoints = {}
+    for name in datasets:
+        for since in range(oldest, version + 1):
+            body = go_json(changes_between(conn, name, since, version))
+            endpoints[f"{name}.since-{since}"] = write_variants(out_dir, f"{name}.since-{since}", body)
+
+    manifest = {
+        "version": version,
+        "oldest_since": oldest,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "endpoints": endpoints,
+    }
+    write_atomic(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    removed = prune(out_dir, manifest, previous)
+    return manifest, removed
+
+
+def release(db_path=SERVED_PATH, feed_path=FEED_PATH, out_dir=SYNC_DIR, names=None):
+    """Diff the served data against the feed and publish a new version if anything changed.
+
+    Returns the latest version, or None if `db_path` is missing or was
+    replaced while it was read.
+    """
+    names = names or [dataset.name for dataset in DATASETS]
+    if not os.path.exists(db_path):
+        print(f"Skipping release: {db_path} not found.")
+        return None
+    source = file_identity(db_path)
+    collected = collect_rows(db_path, names)
+    if file_identity(db_path) != source:
+        print(f"{db_path} was replaced while it was read; run release again.")
+        return None
+    conn = open_feed(feed_path)
+    try:
+        retired = drop_retired_datasets(conn)
+        version, changes = record_release(conn, collected, source)
+        if not any(changes.values()):
+            print(f"Data unchanged (version {version}).")
+            manifest = load_manifest(out_dir)
+            # A republish with the same rows is a new file: point the manifest at it
+            if version and (retired or manifest is None or manifest.get("source") != source):
+                write_feed_files(conn, out_dir, version, source)
+            return version
+
+        print(f"Released version {version}:")
+        for name, dataset_changes in changes.items():
+            upserts = sum(op == "upsert" for _, op, _ in dataset_changes)
+            print(f"  - /{name}: {len(collected[name]):,} rows, "
+                  f"{upserts:,} upserts, {len(dataset_changes) - upserts:,} deletes")
+
+        manifest, removed = write_feed_files(conn, out_dir, version, source)
+        print(f"Delta files for since {manifest['oldest_since']}..{version} written to {out_dir}"
+              + (f" ({removed} stale files removed)." if removed else "."))
+        print_sizes(collected, manifest, version)
+        return version
+    finally:
+        conn.close()
+
+
+def print_sizes(collected, manifest, version):
+    """Full payload vs one-version delta size per dataset, identity and gzip."""
+    for name, rows in collected.items():
+        full = go_json(list(rows.values()) or None)
+        entry = manifest["endpoints"].get(f"{name}.since-{version - 1}")
+        if entry is None:
+            continue
+        print(f"  /{name}?since={version - 1}: {entry['bytes']['identity']:,}B "
+              f"(gzip {entry['bytes']['gzip']:,}B) vs full {len(full):,}B")
+
+
+# --- Commands ---
+
+def print_status(feed_path):
+    conn = open_feed(feed_path)
+    try:
+        releases = conn.execute("""
+            SELECT r.version, r.created_at, r.counts,
+                (SELECT COUNT(*) FROM change c WHERE c.version = r.version)
+            FROM release r ORDER BY r.version
+        """).fetchall()
+    finally:
+        conn.close()
+    if not releases:
+        print("No releases yet.")
+        return
+    for version, created_at, counts, changed in releases:
+        rows = ", ".join(f"{name} {count:,}" for name, count in json.loads(counts).items())
+        print(f"v{version}  {created_at}  {changed:,} changes  ({rows})")
+
+
+def mutate_served_db(path, rng, products):
+    """Edit a synthetic served DB the way a data refresh would: a few edits, a delete and an insert."""
+    conn = sqlite3.connect(path)
+    with conn:
+        for insurance_id in rng.sample(range(1, products + 1), max(1, products // 50)):
+            conn.execute("UPDATE product SET remark = remark || ' Updated.' WHERE insurance_id = ?", (insurance_id,))
+        conn.execute("""UPDATE coverage_limit SET coverage_limit = coverage_limit + 500
+                        WHERE rowid IN (SELECT rowid FROM coverage_limit ORDER BY random() LIMIT 5)""")
+        victim = conn.execute("SELECT sub_coverage_id FROM sub_coverage_limit ORDER BY random() LIMIT 1").fetchone()
+        if victim:
+            conn.execute("DELETE FROM sub_coverage_limit WHERE sub_coverage_id = ?", victim)
+        conn.execute("""INSERT INTO sub_coverage_limit (parent_coverage_id, product_id, sub_coverage_name,
+                            sub_coverage_name_zh, sub_limit, sub_coverage_remark, sub_coverage_remark_zh)
+                        VALUES (1, 1, 'New sub-limit', '新分項', '2500', NULL, NULL)""")
+    conn.close()
+
+
+def run_bench(args):
+    """Release a synthetic DB several times with small edits and check every delta reproduces the target."""
+    from publish_served_db import generate_served_db
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, "pet_insurance.db")
+        feed_path = os.path.join(work_dir, "sync_feed.db")
+        out_dir = os.path.join(work_dir, "sync")
+        print(f"Generating a synthetic served DB with {args.products:,} products...")
+        generate_served_db(db_path, args.products, args.seed)
+
+        names = [dataset.name for dataset in DATASETS]
+        snapshots = {0: {name: {} for name in names}}
+        for step in range(args.releases):
+            if step:
+                mutate_served_db(db_path, rng, args.products)
+            version = release(db_path, feed_path, out_dir, names)
+            snapshots[version] = collect_rows(db_path, names)
+
+        conn = open_feed(feed_path)
+        try:
+            start = time.perf_counter()
+            checked = 0
+            for since in range(0, version + 1):
+                for until in range(since, version + 1):
+                    for name in names:
+                        if apply_delta(snapshots[since][name], changes_between(conn, name, since, until)) != snapshots[until][name]:
+                            raise SystemExit(f"Delta mismatch for {name} {since}..{until}")
+                        if since and rows_at(conn, name, since) != snapshots[since][name]:
+                            raise SystemExit(f"Replay mismatch for {name} at {since}")
+                        checked += 1
+            elapsed = time.perf_counter() - start
+        finally:
+            conn.close()
+        print(f"Checked {checked:,} merged deltas against full snapshots in {elapsed:.2f}s: all match.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versioned delta sync feed for the insurance endpoints.")
+    parser.add_argument("--feed", default=FEED_PATH, help=f"feed database (default: {FEED_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    release_parser = sub.add_parser("release", help="record a new version if the data changed")
+    release_parser.add_argument("--db", default=SERVED_PATH, help=f"served insurance database (default: {SERVED_PATH})")
+    release_parser.add_argument("--out-dir", default=SYNC_DIR, help=f"delta file directory (default: {SYNC_DIR})")
+    release_parser.add_argument("--dataset", action="append", choices=list(DATASETS_BY_NAME),
+                                help="only release these datasets (repeatable; default: all)")
+
+    sub.add_parser("status", help="list releases")
+
+    changes_parser = sub.add_parser("changes", help="print the merged delta between two versions")
+    changes_parser.add_argument("dataset", choices=list(DATASETS_BY_NAME))
+    changes_parser.add_argument("--since", type=int, required=True)
+    changes_parser.add_argument("--until", type=int, help="default: latest version")
+
+    bench_parser = sub.add_parser("bench", help="check merged deltas on a synthetic DB across releases")
+    bench_parser.add_argument("--products", type=int, default=200)
+    bench_parser.add_argument("--releases", type=int, default=4)
+    bench_parser.add_argument("--seed", type=int, default=7)
+
+    args = parser.parse_args(argv)
+    if args.command == "release":
+        release(args.db, args.feed, args.out_dir, args.dataset)
+    elif args.command == "status":
+        print_status(args.feed)
+    elif args.command == "changes":
+        conn = open_feed(args.feed)
+        try:
+            delta = changes_between(conn, args.dataset, args.since, args.until)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        finally:
+            conn.close()
+        print(json.dumps(delta, indent=2, ensure_ascii=False))
+    else:
+        run_bench(args)
+
+
+if __name__ == "__main__":
+    main()
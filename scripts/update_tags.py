@@ -1,66 +1,193 @@
-import sqlite3
+#!/usr/bin/env python3
+"""
+Update product tags in pet_insurance.db
+
+Reads plan tags (EN `tag` and `tag_zh`) from a mapping file, loads them
+into a temp table and applies them with a single UPDATE...FROM joined on
+an index over product.insurance_name, instead of one full-scan UPDATE per
+plan.
+
+Mapping files:
+- CSV with columns insurance_name, tag, tag_zh (data/product_tags.csv)
+- JSON: {"<insurance_name>": "<tag>"} or {"<insurance_name>": {"tag": ..., "tag_zh": ...}},
+  or a list of {"insurance_name": ..., "tag": ..., "tag_zh": ...}
+An empty tag_zh leaves the existing tag_zh unchanged.
+
+Usage:
+    python3 scripts/update_tags.py [--db PATH] [--mapping PATH] [--dry-run] [--metrics PATH] [--trace-sql]
+"""
+
+import argparse
+import csv
+import json
 import os
+import sqlite3
+import sys
+import time
+
+import instrumentation
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+MAPPING_PATH = os.path.join(REPO_ROOT, "data", "product_tags.csv")
+
 
-# Connect to the SQLite database
-# Using absolute path to ensure correct file is accessed
-db_path = '/Users/vfzzz/Downloads/Petwell_Backend_Repo/pet_insurance.db'
-
-if not os.path.exists(db_path):
-    print(f"Error: Database file not found at {db_path}")
-    exit(1)
-
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# Mapping of insurance plan names to their descriptive tags
-tag_mapping = {
-    # bolttech Plans
-    'Pet Care - Plan 1': '#BudgetStarter #FixedPremium',
-    'Pet Care - Plan 2': '#MidTierBalanced #SurgicalProtection',
-    'Pet Care - Plan 3': '#MaxPetCare #ComprehensiveBasic',
-    
-    # MSIG Plans
-    'HappyTail - Dog Standard Plan': '#SurgicalSpecialist #EarlyEnrollmentReward',
-    'HappyTail - Dog Premier Plan': '#HereditarySupport #MidTierSurgery',
-    'HappyTail - Dog Ultimate Plan': '#HighLimitSurgical #LifetimeProtection',
-    'HappyTail - Cat Plan': '#FelineFocus #NoSubLimitSurgery',
-    
-    # OneDegree Plans
-    'Essential Plan': '#NoSubLimitEntry #HospitalizationFocus',
-    'Plus Plan': '#ValueChoice #ConsultationIncluded',
-    'Ultra Plan': '#HKHighestLimit #FlexibleMedical',
-    'Prestige Plan': '#AdvancedDiagnostics #MRICover',
-    
-    # Blue Cross Plans
-    'Love Pet - Type C': '#OverseasLiability #NoMicrochipForCats',
-    'Love Pet - Type B': '#EmergencyBoarding #FuneralSupport',
-    'Love Pet - Type A': '#BehavioralTherapy #MaximumMedical',
-    'Love Pet Outpatient - Sharing Plan': '#MultiPetSharing #VetVisitFocus',
-    'Love Pet Outpatient - Basic Plan': '#VetVisitFocus #OutpatientFocus',
-    
-    # Prudential Plans
-    'PRUChoice Furkid Care - A': '#HighLiability #TravelDelaySupport',
-    'PRUChoice Furkid Care - B': '#AdvancedImaging #WaitingPeriodWaiver'
-}
-
-print("Starting database update...")
-
-# Iterate through the mapping and update the database
-updated_count = 0
-for plan_name, tags in tag_mapping.items():
-    cursor.execute(
-        "UPDATE product SET tag = ? WHERE insurance_name = ?", 
-        (tags, plan_name)
-    )
-    
-    if cursor.rowcount > 0:
-        updated_count += 1
-        # print(f"Updated '{plan_name}'")
+def mapping_row(name, tag, tag_zh=None):
+    """Normalize one mapping entry to (insurance_name, tag, tag_zh-or-None)."""
+    return (name.strip(), (tag or "").strip(), (tag_zh or "").strip() or None)
+
+
+@instrumentation.staged
+def load_mapping(path=MAPPING_PATH):
+    """Return the mapping as a list of (insurance_name, tag, tag_zh) tuples."""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            rows = [mapping_row(name, value) if isinstance(value, str)
+                    else mapping_row(name, value.get("tag"), value.get("tag_zh"))
+                    for name, value in data.items()]
+        else:
+            rows = [mapping_row(item["insurance_name"], item.get("tag"), item.get("tag_zh"))
+                    for item in data]
     else:
-        print(f"Warning: Product '{plan_name}' not found.")
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = [mapping_row(row["insurance_name"], row.get("tag"), row.get("tag_zh"))
+                    for row in csv.DictReader(f)]
+
+    # Later entries win, as assignments in the old hard-coded dict did
+    by_name = {}
+    for row in rows:
+        if row[0] in by_name:
+            print(f"Warning: '{row[0]}' appears more than once in {path}; using the last entry.")
+        by_name[row[0]] = row
+    return list(by_name.values())
+
+
+@instrumentation.staged
+def ensure_name_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_product_insurance_name ON product(insurance_name)")
+
+
+@instrumentation.staged
+def load_tag_updates(conn, rows):
+    conn.execute("DROP TABLE IF EXISTS temp.tag_update")
+    conn.execute("""
+        CREATE TEMP TABLE tag_update (
+            insurance_name TEXT PRIMARY KEY,
+            tag TEXT,
+            tag_zh TEXT
+        ) WITHOUT ROWID
+    """)
+    conn.executemany("INSERT INTO temp.tag_update VALUES (?, ?, ?)", rows)
+
+
+@instrumentation.staged
+def tag_changes(conn):
+    """Products whose tags differ from the mapping: (id, name, old tag, new tag, old tag_zh, new tag_zh)."""
+    return conn.execute("""
+        SELECT p.insurance_id, p.insurance_name, p.tag, t.tag, p.tag_zh, COALESCE(t.tag_zh, p.tag_zh)
+        FROM temp.tag_update t
+        JOIN product p ON p.insurance_name = t.insurance_name
+        WHERE p.tag IS NOT t.tag OR (t.tag_zh IS NOT NULL AND p.tag_zh IS NOT t.tag_zh)
+        ORDER BY p.insurance_id
+    """).fetchall()
+
+
+@instrumentation.staged
+def unmatched_plans(conn):
+    return [name for (name,) in conn.execute("""
+        SELECT t.insurance_name FROM temp.tag_update t
+        WHERE NOT EXISTS (SELECT 1 FROM product p WHERE p.insurance_name = t.insurance_name)
+        ORDER BY t.insurance_name
+    """)]
+
+
+@instrumentation.staged
+def apply_tag_updates(conn):
+    """Apply temp.tag_update to product in one statement. Returns the number of rows changed."""
+    changed = "(product.tag IS NOT t.tag OR (t.tag_zh IS NOT NULL AND product.tag_zh IS NOT t.tag_zh))"
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        cursor = conn.execute(f"""
+            UPDATE product
+            SET tag = t.tag, tag_zh = COALESCE(t.tag_zh, product.tag_zh)
+            FROM temp.tag_update t
+            WHERE product.insurance_name = t.insurance_name AND {changed}
+        """)
+    else:
+        # UPDATE...FROM needs SQLite 3.33; correlated lookups on the temp table's key instead
+        cursor = conn.execute("""
+            UPDATE product
+            SET tag = (SELECT t.tag FROM temp.tag_update t WHERE t.insurance_name = product.insurance_name),
+                tag_zh = COALESCE((SELECT t.tag_zh FROM temp.tag_update t
+                                   WHERE t.insurance_name = product.insurance_name), tag_zh)
+            WHERE insurance_id IN (
+                SELECT p.insurance_id FROM temp.tag_update t
+                JOIN product p ON p.insurance_name = t.insurance_name
+                WHERE p.tag IS NOT t.tag OR (t.tag_zh IS NOT NULL AND p.tag_zh IS NOT t.tag_zh)
+            )
+        """)
+    return cursor.rowcount
+
+
+def print_diff(changes):
+    for insurance_id, name, old_tag, new_tag, old_zh, new_zh in changes:
+        print(f"  #{insurance_id} {name}")
+        if old_tag != new_tag:
+            print(f"    tag:    {old_tag!r} -> {new_tag!r}")
+        if old_zh != new_zh:
+            print(f"    tag_zh: {old_zh!r} -> {new_zh!r}")
+
+
+def update_tags(db_path=DB_PATH, mapping_path=MAPPING_PATH, dry_run=False):
+    """Apply the mapping to `db_path`. Returns (changed rows, unmatched plan names)."""
+    if not os.path.exists(db_path):
+        print(f"Error: Database file not found at {db_path}")
+        sys.exit(1)
+
+    rows = load_mapping(mapping_path)
+    start = time.perf_counter()
+    conn = instrumentation.trace_connection(sqlite3.connect(db_path))
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(product)")}
+        missing = {"tag", "tag_zh"} - columns
+        if missing:
+            print(f"Error: product is missing column(s): {', '.join(sorted(missing))}")
+            sys.exit(1)
+
+        with conn:
+            if not dry_run:
+                ensure_name_index(conn)
+            load_tag_updates(conn, rows)
+            changes = tag_changes(conn)
+            unmatched = unmatched_plans(conn)
+            updated = len(changes) if dry_run else apply_tag_updates(conn)
+    finally:
+        conn.close()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"{len(rows)} plans in {mapping_path}, {len(changes)} products to retag:")
+    print_diff(changes)
+    for name in unmatched:
+        print(f"Warning: Product '{name}' not found.")
+    if dry_run:
+        print(f"Dry run: no changes written ({elapsed:.1f} ms).")
+    else:
+        print(f"Database updated successfully. Updated {updated} products in {elapsed:.1f} ms.")
+    return updated, unmatched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply plan tags from a mapping file to pet_insurance.db.")
+    parser.add_argument("--db", default=DB_PATH, help=f"database path (default: {DB_PATH})")
+    parser.add_argument("--mapping", default=MAPPING_PATH, help=f"CSV or JSON tag mapping (default: {MAPPING_PATH})")
+    parser.add_argument("--dry-run", action="store_true", help="show the diff and unmatched plans without writing")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    with instrumentation.run("update_tags", args):
+        update_tags(args.db, args.mapping, args.dry_run)
 
-# Save (commit) the changes and close the connection
-conn.commit()
-conn.close()
 
-print(f"Database updated successfully. Updated {updated_count} products.")
+if __name__ == "__main__":
+    main()
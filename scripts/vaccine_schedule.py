@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Vaccine schedule engine over data/vaccines.json
+
+data/vaccines.json describes each schedule in prose ("Start at 6–8
+weeks. Repeat every 3–4 weeks until 16 weeks old.", "Booster 1 year
+after the last puppy dose, then every 3 years."). compile_rules() turns
+each entry into a VaccineRule:
+
+    first_dose_days      earliest age for the first dose (latest kept too)
+    repeat_every_days    interval of the puppy/kitten series, if any
+    repeat_until_days    age the series runs to
+    first_booster_days   first booster after the primary doses
+    booster_every_days   booster interval after that (0: no boosters)
+
+Where the text gives a range ("every 1–3 years") the low end is used, so
+reminders are never late.
+
+next_due() then computes, for a cohort of pets (pet type, birth date)
+and their dose history, the next due date of every vaccine that applies
+to each pet's type:
+
+- no dose yet: birth + first dose age
+- last dose inside the series (before repeat_until): last + repeat interval
+- last dose in the primary window (series end, or first dose age + 4
+  weeks without a series): last + first booster
+- otherwise the last dose was a booster: last + booster interval
+
+Cohorts are processed in chunks as NumPy datetime64[D] arrays: one pass
+of gathers and np.where per chunk, no per-pet Python. Without NumPy the
+same rules run in a pure-Python loop.
+
+Usage:
+    python3 scripts/vaccine_schedule.py rules
+    python3 scripts/vaccine_schedule.py due --pets pets.csv [--doses doses.csv] [--as-of 2026-01-31]
+        [--within 30] [--output due.csv] [--chunk-size 100000]
+    python3 scripts/vaccine_schedule.py bench [--pets 500000] [--check]
+
+pets.csv has pet_id,pet_type,birth_date; doses.csv has pet_id,vaccine_id,dose_date.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # optional: schedules fall back to a pure-Python loop
+    np = None
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VACCINES_JSON = os.path.join(REPO_ROOT, "data", "vaccines.json")
+
+PET_TYPES = ("dog", "cat")
+CHUNK_SIZE = 100_000
+DUE_WINDOW_DAYS = 30
+# Without a repeat series, a dose this long after the latest first-dose age still counts as the first dose
+PRIMARY_GRACE_DAYS = 28
+
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+AGE_RE = re.compile(r"(\d+)(?:\s*[–-]\s*(\d+))?\s*(day|week|month|year)s?", re.IGNORECASE)
+REPEAT_RE = re.compile(r"repeat every (\d+)(?:\s*[–-]\s*\d+)?\s*(day|week|month|year)s?\s+until\s+(\d+)\s*"
+                       r"(day|week|month|year)s?", re.IGNORECASE)
+FIRST_BOOSTER_RE = re.compile(r"booster (\d+)(?:\s*[–-]\s*\d+)?\s*(day|week|month|year)s? (?:later|after)",
+                              re.IGNORECASE)
+BOOSTER_EVERY_RE = re.compile(r"every (?:(\d+)(?:\s*[–-]\s*\d+)?\s*(day|week|month|year)s?|(day|week|month|year))\b",
+                              re.IGNORECASE)
+
+STATUSES = ("overdue", "due", "upcoming", "none")
+
+
+@dataclass(frozen=True)
+class VaccineRule:
+    vaccine_id: int
+    name: str
+    pet_types: tuple
+    first_dose_days: int
+    first_dose_latest_days: int
+    repeat_every_days: int
+    repeat_until_days: int
+    first_booster_days: int
+    booster_every_days: int
+    is_core: bool
+    is_mandatory: bool
+
+    @property
+    def primary_end_days(self):
+        """Age before which a dose belongs to the primary series."""
+        if self.repeat_every_days:
+            return self.repeat_until_days + self.repeat_every_days
+        return self.first_dose_latest_days + PRIMARY_GRACE_DAYS
+
+
+def _days(number, unit):
+    return int(number) * UNIT_DAYS[unit.lower()]
+
+
+def compile_rule(entry):
+    """A VaccineRule from one vaccines.json entry. Raises ValueError if the first dose age is missing."""
+    young, adult = entry.get("youngInfo") or "", entry.get("adultInfo") or ""
+    first = AGE_RE.search(young)
+    if first is None:
+        raise ValueError(f"vaccine {entry.get('id')} ({entry.get('name')}): no first dose age in {young!r}")
+    first_days = _days(first.group(1), first.group(3))
+    latest_days = _days(first.group(2) or first.group(1), first.group(3))
+
+    repeat_every = repeat_until = 0
+    repeat = REPEAT_RE.search(young)
+    if repeat:
+        repeat_every = _days(repeat.group(1), repeat.group(2))
+        repeat_until = _days(repeat.group(3), repeat.group(4))
+
+    booster_every = 0
+    every = BOOSTER_EVERY_RE.search(adult)
+    if every:
+        booster_every = _days(every.group(1), every.group(2)) if every.group(1) else UNIT_DAYS[every.group(3).lower()]
+    first_booster = FIRST_BOOSTER_RE.search(adult)
+    first_booster_days = _days(first_booster.group(1), first_booster.group(2)) if first_booster else booster_every
+
+    return VaccineRule(
+        vaccine_id=int(entry["id"]),
+        name=entry.get("name", ""),
+        pet_types=tuple(t.strip().lower() for t in (entry.get("petType") or "").split("/") if t.strip()),
+        first_dose_days=first_days,
+        first_dose_latest_days=latest_days,
+        repeat_every_days=repeat_every,
+        repeat_until_days=repeat_until,
+        first_booster_days=first_booster_days,
+        booster_every_days=booster_every,
+        is_core=bool(entry.get("isCore")),
+        is_mandatory=bool(entry.get("isMandatory")),
+    )
+
+
+def compile_rules(path=VACCINES_JSON):
+    with open(path, encoding="utf-8") as f:
+        return [compile_rule(entry) for entry in json.load(f)]
+
+
+# --- Pure-Python reference ---
+
+def next_due_one(rule, birth, last=None):
+    """Next due date for one pet and vaccine, or None if no further dose is due."""
+    if last is None:
+        return birth + timedelta(days=rule.first_dose_days)
+    age = (last - birth).days
+    if rule.repeat_every_days and age < rule.repeat_until_days:
+        return last + timedelta(days=rule.repeat_every_days)
+    if age < rule.primary_end_days:
+        return last + timedelta(days=rule.first_booster_days) if rule.first_booster_days else None
+    return last + timedelta(days=rule.booster_every_days) if rule.booster_every_days else None
+
+
+def status_for(days_until, within):
+    if days_until is None:
+        return "none"
+    if days_until < 0:
+        return "overdue"
+    return "due" if days_until <= within else "upcoming"
+
+
+def next_due_python(rules, pets, doses, as_of, within=DUE_WINDOW_DAYS):
+    """Yield (pet_id, vaccine_id, due date or None, status) for every pet and applicable vaccine."""
+    last_dose = {}
+    for pet_id, vaccine_id, dose_date in doses:
+        key = (pet_id, vaccine_id)
+        if key not in last_dose or dose_date > last_dose[key]:
+            last_dose[key] = dose_date
+    for pet_id, pet_type, birth in pets:
+        for rule in rules:
+            if pet_type not in rule.pet_types:
+                continue
+            due = next_due_one(rule, birth, last_dose.get((pet_id, rule.vaccine_id)))
+            days_until = (due - as_of).days if due is not None else None
+            yield pet_id, rule.vaccine_id, due, status_for(days_until, within)
+
+
+# --- NumPy ---
+
+class RuleTable:
+    """The rules as parallel NumPy arrays, plus the rule indexes that apply to each pet type."""
+
+    FIELDS = ("vaccine_id", "first_dose_days", "repeat_every_days", "repeat_until_days",
+              "first_booster_days", "booster_every_days", "primary_end_days")
+
+    def __init__(self, rules):
+        self.rules = rules
+        for field in self.FIELDS:
+            setattr(self, field, np.array([getattr(rule, field) for rule in rules], dtype=np.int64))
+        self.by_type = [np.array([i for i, rule in enumerate(rules) if pet_type in rule.pet_types], dtype=np.int64)
+                        for pet_type in PET_TYPES]
+
+
+class DoseIndex:
+    """Last dose date per (pet_id, vaccine_id), sorted for np.searchsorted lookups."""
+
+    DAY_BITS = 20  # days since 1970 fit in 20 bits after shifting by DAY_OFFSET (years 535 to 3405)
+    DAY_OFFSET = 1 << 19
+
+    def __init__(self, pet_ids, vaccine_ids, dose_dates):
+        pet_ids = np.asarray(pet_ids, dtype=np.int64)
+        vaccine_ids = np.asarray(vaccine_ids, dtype=np.int64)
+        dates = np.asarray(dose_dates, dtype="datetime64[D]")
+        self.vaccine_span = int(vaccine_ids.max()) + 1 if len(vaccine_ids) else 1
+        keys = pet_ids * self.vaccine_span + vaccine_ids
+        # One int64 sort on (key, day) packed together, then keep the last row of each key: its latest dose
+        days = dates.astype(np.int64) + self.DAY_OFFSET
+        packed = np.sort((keys << self.DAY_BITS) | days)
+        keys = packed >> self.DAY_BITS
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        self.keys = keys[last]
+        self.dates = ((packed[last] & ((1 << self.DAY_BITS) - 1)) - self.DAY_OFFSET).astype("datetime64[D]")
+
+    def lookup(self, pet_ids, vaccine_ids):
+        """Latest dose dates for the given pairs, NaT where there is none."""
+        result = np.full(len(pet_ids), np.datetime64("NaT"), dtype="datetime64[D]")
+        if not len(self.keys):
+            return result
+        in_range = vaccine_ids < self.vaccine_span
+        keys = pet_ids * self.vaccine_span + vaccine_ids
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = in_range & (self.keys[pos] == keys)
+        result[found] = self.dates[pos[found]]
+        return result
+
+
+def next_due_chunk(table, doses, pet_ids, type_codes, births, as_of, within):
+    """Schedules for one chunk of pets. Returns a dict of arrays, one row per pet and applicable vaccine.
+
+    type_codes index PET_TYPES; births are datetime64[D]; as_of is a datetime64[D].
+    """
+    pair_pets, pair_rules = [], []
+    for code, rule_indexes in enumerate(table.by_type):
+        pets = np.flatnonzero(type_codes == code)
+        if len(pets) and len(rule_indexes):
+            pair_pets.append(np.repeat(pets, len(rule_indexes)))
+            pair_rules.append(np.tile(rule_indexes, len(pets)))
+    if not pair_pets:
+        empty = np.array([], dtype=np.int64)
+        return {"pet_id": empty, "vaccine_id": empty, "due": empty.astype("datetime64[D]"),
+                "days_until": empty, "status": empty}
+    pets, rules = np.concatenate(pair_pets), np.concatenate(pair_rules)
+    # Pet order, then rule order, like the pure-Python loop
+    order = np.lexsort((rules, pets))
+    pets, rules = pets[order], rules[order]
+
+    pet_id, birth = pet_ids[pets], births[pets]
+    vaccine_id = table.vaccine_id[rules]
+    last = doses.lookup(pet_id, vaccine_id) if doses is not None else \
+        np.full(len(pets), np.datetime64("NaT"), dtype="datetime64[D]")
+    has_dose = ~np.isnat(last)
+    age = (last - birth).astype(np.int64)  # garbage where NaT; masked below
+
+    repeat_every = table.repeat_every_days[rules]
+    in_series = has_dose & (repeat_every > 0) & (age < table.repeat_until_days[rules])
+    in_primary = has_dose & ~in_series & (age < table.primary_end_days[rules])
+    offset = np.where(in_series, repeat_every,
+                      np.where(in_primary, table.first_booster_days[rules], table.booster_every_days[rules]))
+    start = np.where(has_dose, last, birth)
+    offset = np.where(has_dose, offset, table.first_dose_days[rules])
+    due = start + offset.astype("timedelta64[D]")
+    due[has_dose & (offset == 0)] = np.datetime64("NaT")  # no booster rule: nothing more is due
+
+    days_until = (due - as_of).astype(np.int64)
+    no_due = np.isnat(due)
+    status = np.where(days_until < 0, 0, np.where(days_until <= within, 1, 2))
+    status[no_due] = 3
+    return {"pet_id": pet_id, "vaccine_id": vaccine_id, "due": due, "days_until": days_until, "status": status}
+
+
+def next_due(rules, pets, doses=(), as_of=None, within=DUE_WINDOW_DAYS, chunk_size=CHUNK_SIZE):
+    """Yield schedule chunks (dicts of arrays) for `pets` = (pet_ids, pet_types, birth_dates) columns.
+
+    `doses` = (pet_ids, vaccine_ids, dose_dates) columns. Needs NumPy.
+    """
+    as_of = np.datetime64(as_of or date.today(), "D")
+    table = RuleTable(rules)
+    dose_index = DoseIndex(*doses) if doses and len(doses[0]) else None
+    pet_ids = np.asarray(pets[0], dtype=np.int64)
+    types = np.asarray(pets[1])
+    type_codes = np.full(len(types), -1, dtype=np.int64)
+    for code, pet_type in enumerate(PET_TYPES):
+        type_codes[types == pet_type] = code
+    births = np.asarray(pets[2], dtype="datetime64[D]")
+    for start in range(0, len(pet_ids), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        yield next_due_chunk(table, dose_index, pet_ids[chunk], type_codes[chunk], births[chunk], as_of, within)
+
+
+# --- I/O ---
+
+def parse_date(text):
+    return date.fromisoformat(iso_date(text))
+
+
+def iso_date(text):
+    return text.strip()[:10]
+
+
+def read_pets(path):
+    """(pet_id, pet_type, birth_date) rows. Dates stay ISO strings; see columns() and with_dates()."""
+    pets = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            pets.append((int(row["pet_id"]), row["pet_type"].strip().lower(), iso_date(row["birth_date"])))
+    return pets
+
+
+def read_doses(path):
+    """(pet_id, vaccine_id, dose_date) rows, dates as ISO strings."""
+    if not path:
+        return []
+    with open(path, encoding="utf-8", newline="") as f:
+        return [(int(row["pet_id"]), int(row["vaccine_id"]), iso_date(row["dose_date"])) for row in csv.DictReader(f)]
+
+
+def with_dates(rows):
+    """Rows with their last field (an ISO string) parsed into a date, for the pure-Python loop."""
+    return [(*row[:-1], date.fromisoformat(row[-1])) for row in rows]
+
+
+def columns(rows, count):
+    """Parallel NumPy arrays of `rows`; the last one is datetime64[D].
+
+    The dates must be ISO strings: NumPy parses those in C, while
+    converting datetime.date objects goes through Python per element
+    and takes about 20x longer.
+    """
+    arrays = [np.array([row[i] for row in rows]) for i in range(count - 1)]
+    dates = np.array([row[count - 1] for row in rows], dtype="datetime64[D]")
+    return (*arrays, dates)
+
+
+def write_schedule(rules, pets, doses, as_of, within, only_due, out, chunk_size):
+    """Stream the schedule as CSV. Returns counts by status."""
+    names = {rule.vaccine_id: rule.name for rule in rules}
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["pet_id", "vaccine_id", "vaccine", "due_date", "days_until", "status"])
+    counts = dict.fromkeys(STATUSES, 0)
+    if np is None:
+        for pet_id, vaccine_id, due, status in next_due_python(rules, with_dates(pets), with_dates(doses), as_of, within):
+            counts[status] += 1
+            if only_due and status not in ("overdue", "due"):
+                continue
+            writer.writerow([pet_id, vaccine_id, names[vaccine_id], due or "",
+                             (due - as_of).days if due else "", status])
+        return counts
+    pet_columns = columns(pets, 3)
+    dose_columns = columns(doses, 3) if doses else ()
+    for chunk in next_due(rules, pet_columns, dose_columns, as_of, within, chunk_size):
+        status = chunk["status"]
+        for code, name in enumerate(STATUSES):
+            counts[name] += int(np.count_nonzero(status == code))
+        keep = status <= 1 if only_due else slice(None)
+        due_text = np.datetime_as_string(chunk["due"][keep], unit="D")
+        days_until = chunk["days_until"][keep]
+        for pet_id, vaccine_id, due, days, code in zip(chunk["pet_id"][keep].tolist(),
+                                                       chunk["vaccine_id"][keep].tolist(), due_text.tolist(),
+                                                       days_until.tolist(), status[keep].tolist()):
+            none = code == 3
+            writer.writerow([pet_id, vaccine_id, names[vaccine_id], "" if none else due,
+                             "" if none else days, STATUSES[code]])
+    return counts
+
+
+def synthetic_cohort(count, as_of, rules, seed=0):
+    """Pets born up to 15 years before `as_of`, each with a plausible dose history."""
+    rng = random.Random(seed)
+    pets, doses = [], []
+    for pet_id in range(1, count + 1):
+        pet_type = "dog" if rng.random() < 0.6 else "cat"
+        birth = as_of - timedelta(days=rng.randint(30, 15 * 365))
+        pets.append((pet_id, pet_type, birth))
+        for rule in rules:
+            if pet_type not in rule.pet_types or rng.random() < 0.3:
+                continue
+            day = birth + timedelta(days=rule.first_dose_days + rng.randint(0, 14))
+            while day < as_of and rng.random() < 0.9:
+                doses.append((pet_id, rule.vaccine_id, day))
+                day = next_due_one(rule, birth, day) or as_of
+                day += timedelta(days=rng.randint(-7, 30))
+    return pets, doses
+
+
+def run_bench(pet_count, as_of, within, chunk_size, check, seed):
+    rules = compile_rules()
+    start = time.perf_counter()
+    pets, doses = synthetic_cohort(pet_count, as_of, rules, seed)
+    print(f"{len(pets)} pets, {len(doses)} doses generated in {time.perf_counter() - start:.1f}s")
+
+    if np is not None:
+        # As read_pets/read_doses return them: dates as ISO strings
+        pet_rows = [(pet_id, pet_type, birth.isoformat()) for pet_id, pet_type, birth in pets]
+        dose_rows = [(pet_id, vaccine_id, day.isoformat()) for pet_id, vaccine_id, day in doses]
+        start = time.perf_counter()
+        pet_arrays, dose_arrays = columns(pet_rows, 3), columns(dose_rows, 3)
+        converted = time.perf_counter() - start
+        chunks = list(next_due(rules, pet_arrays, dose_arrays, as_of, within, chunk_size))
+        elapsed = time.perf_counter() - start
+        rows = sum(len(chunk["pet_id"]) for chunk in chunks)
+        print(f"  numpy          {elapsed:.2f}s for {rows} schedules ({rows / elapsed / 1e6:.1f}M/s, "
+              f"{len(chunks)} chunks of {chunk_size}; {converted:.2f}s of it building the arrays)")
+
+    if np is None or check:
+        start = time.perf_counter()
+        reference = list(next_due_python(rules, pets, doses, as_of, within))
+        elapsed = time.perf_counter() - start
+        print(f"  pure Python    {elapsed:.2f}s for {len(reference)} schedules ({len(reference) / elapsed / 1e6:.2f}M/s)")
+        if np is not None:
+            due = np.concatenate([chunk["due"] for chunk in chunks])
+            expected = np.array([d or "NaT" for _, _, d, _ in reference], dtype="datetime64[D]")
+            status = np.concatenate([chunk["status"] for chunk in chunks])
+            expected_status = np.array([STATUSES.index(s) for *_, s in reference])
+            mismatches = int(np.count_nonzero((due != expected) & ~(np.isnat(due) & np.isnat(expected)))
+                             + np.count_nonzero(status != expected_status))
+            print(f"  check          {'OK' if not mismatches else f'{mismatches} mismatches'}")
+            if mismatches:
+                sys.exit(1)
+
+
+def print_rules(rules):
+    for rule in rules:
+        print(json.dumps(asdict(rule), ensure_ascii=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile vaccines.json into schedule rules and compute due dates.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rules_cmd = sub.add_parser("rules", help="print the compiled rules")
+    rules_cmd.add_argument("--vaccines", default=VACCINES_JSON, help=f"vaccines JSON (default: {VACCINES_JSON})")
+
+    due = sub.add_parser("due", help="next due date of every applicable vaccine for each pet")
+    due.add_argument("--pets", required=True, help="CSV with pet_id,pet_type,birth_date")
+    due.add_argument("--doses", help="CSV with pet_id,vaccine_id,dose_date")
+    due.add_argument("--vaccines", default=VACCINES_JSON, help=f"vaccines JSON (default: {VACCINES_JSON})")
+    due.add_argument("--output", help="output CSV (default: stdout)")
+    due.add_argument("--all", action="store_true", help="include upcoming vaccines, not just overdue and due ones")
+
+    bench = sub.add_parser("bench", help="time a synthetic cohort")
+    bench.add_argument("--pets", type=int, default=500_000, help="synthetic pets (default: 500000)")
+    bench.add_argument("--check", action="store_true", help="compare with the pure-Python reference")
+    bench.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+
+    for command in (due, bench):
+        command.add_argument("--as-of", type=parse_date, default=date.today(), help="reference date (default: today)")
+        command.add_argument("--within", type=int, default=DUE_WINDOW_DAYS,
+                             help=f"days ahead that count as due (default: {DUE_WINDOW_DAYS})")
+        command.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                             help=f"pets per vectorized chunk (default: {CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    if args.command == "rules":
+        print_rules(compile_rules(args.vaccines))
+    elif args.command == "bench":
+        run_bench(args.pets, args.as_of, args.within, args.chunk_size, args.check, args.seed)
+    else:
+        rules = compile_rules(args.vaccines)
+        start = time.perf_counter()
+        pets, doses = read_pets(args.pets), read_doses(args.doses)
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            counts = write_schedule(rules, pets, doses, args.as_of, args.within, not args.all, out, args.chunk_size)
+        finally:
+            if args.output:
+                out.close()
+        summary = ", ".join(f"{count} {status}" for status, count in counts.items())
+        print(f"{len(pets)} pets: {summary} in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Validate insurance.db and pet_insurance.db
+
+Runs a declarative list of RULES, each one set-based SQL query that
+returns the violating rows, and writes a machine-readable report.
+build_insurance_db.py runs it on every build, inside the build
+transaction, and fails the build (leaving the published DB untouched)
+when a severity's violation count exceeds its threshold.
+
+Rules only run against the tables they name; a rule whose tables or
+columns are missing is reported as skipped. That way one rule list
+covers both the build DB (pet_insurance_comparison, coverage_limits) and
+the served DB (product, coverage_limit, ...).
+
+Keeping it fast on 10M-row limit tables:
+- Row-level rules come with a partial index over just the violating rows,
+  built once with the other indexes (create_rule_indexes), so the check
+  reads nothing when the data is clean.
+- Cross-table rules can have a `probe`, a cheaper count that must be 0
+  for the full query to be skipped (orphan limits: compare per-provider
+  index range counts with the table count).
+- Duplicate limits are only grouped for (provider, limit item) pairs the
+  build's row keys already mark as occurring more than once.
+- The CLI opens the DB read-only with a large mmap, so every rule reads
+  the same mapped pages instead of copying the DB into memory first.
+
+Severities are "error", "warning" and "info"; THRESHOLDS gives the
+number of violating rows each may have before validation fails.
+
+Usage:
+    python3 scripts/validate_insurance_db.py [--db PATH ...] [--report report.json]
+                                             [--max-errors N] [--max-warnings N] [--create-indexes]
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import instrumentation
+
+# Paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUILD_DB_PATH = os.path.join(REPO_ROOT, "insurance.db")
+SERVED_DB_PATH = os.path.join(REPO_ROOT, "pet_insurance.db")
+
+SEVERITIES = ("error", "warning", "info")
+# Violating rows allowed per severity; None means unlimited
+THRESHOLDS = {"error": 0, "warning": None, "info": None}
+SAMPLES = 5
+MMAP_SIZE = 1 << 32
+
+INDEX_NAME_RE = re.compile(r"INDEX\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+class ValidationError(RuntimeError):
+    """Raised when a severity's violation count exceeds its threshold."""
+
+    def __init__(self, report):
+        self.report = report
+        exceeded = ", ".join(f"{n} {severity}s (max {report['thresholds'][severity]})"
+                             for severity, n in report["exceeded"].items())
+        super().__init__(f"validation failed: {exceeded}")
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A check whose `sql` returns one row per violation.
+
+    `columns` are the table.column pairs it reads (checked before running),
+    `index` an optional partial index covering exactly the violating rows,
+    and `probe` an optional cheaper query returning the violation count, so
+    `sql` only has to produce samples.
+    """
+    name: str
+    severity: str
+    description: str
+    columns: tuple
+    sql: str
+    index: str = None
+    probe: str = None
+
+
+def zh_missing_rule(table, column, key, severity="warning"):
+    """`column_zh` empty while `column` has text, for one served-DB table."""
+    return Rule(
+        f"{table}_{column}_zh_missing", severity,
+        f"{table}.{column} is filled but {column}_zh is empty",
+        tuple(f"{table}.{c}" for c in (*key, column, f"{column}_zh")),
+        f"""
+            SELECT {', '.join(key)}, {column}
+            FROM {table}
+            WHERE TRIM(COALESCE({column}, '')) <> '' AND TRIM(COALESCE({column}_zh, '')) = ''
+        """,
+    )
+
+
+RULES = (
+    # Build DB: insurance.db
+    Rule("limits_orphan_provider", "error",
+         "coverage_limits.provider_key has no row in pet_insurance_comparison",
+         ("coverage_limits.provider_key", "pet_insurance_comparison.provider_key"),
+         """
+            SELECT cl.id, cl.provider_key, cl.limit_item
+            FROM coverage_limits cl
+            LEFT JOIN pet_insurance_comparison pic ON pic.provider_key = cl.provider_key
+            WHERE pic.provider_key IS NULL
+         """,
+         # One index range count per provider instead of a lookup per limit row
+         probe="""
+            SELECT (SELECT COUNT(*) FROM coverage_limits)
+                 - (SELECT COALESCE(SUM((SELECT COUNT(*) FROM coverage_limits cl
+                                         WHERE cl.provider_key = pic.provider_key)), 0)
+                    FROM pet_insurance_comparison pic)
+         """),
+    Rule("limits_duplicate_item", "warning",
+         "the same limit_item appears more than once for a provider at the same level",
+         ("coverage_limits.provider_key", "coverage_limits.limit_item", "coverage_limits.level",
+          "build_row_hashes.row_key", "build_row_hashes.row_id"),
+         # Row keys end in the occurrence number of (provider_key, limit_item) (see
+         # build_insurance_db.limit_row_key), so only pairs with a second occurrence are grouped
+         """
+            WITH repeated AS (
+                SELECT DISTINCT cl.provider_key, cl.limit_item
+                FROM build_row_hashes h INDEXED BY idx_rule_limits_repeated_pair
+                JOIN coverage_limits cl ON cl.id = h.row_id
+                WHERE h.table_name = 'coverage_limits' AND substr(h.row_key, -2) <> char(31) || '0'
+            )
+            SELECT cl.provider_key, cl.limit_item, cl.level, COUNT(*) AS copies
+            FROM repeated r
+            JOIN coverage_limits cl ON cl.provider_key = r.provider_key AND cl.limit_item = r.limit_item
+            GROUP BY cl.provider_key, cl.limit_item, cl.level
+            HAVING COUNT(*) > 1
+         """,
+         index="""
+            CREATE INDEX IF NOT EXISTS idx_rule_limits_repeated_pair ON build_row_hashes(row_id)
+            WHERE table_name = 'coverage_limits' AND substr(row_key, -2) <> char(31) || '0'
+         """),
+    Rule("limits_empty_item", "error",
+         "coverage_limits.limit_item is blank",
+         ("coverage_limits.id", "coverage_limits.limit_item"),
+         "SELECT id, provider_key FROM coverage_limits WHERE TRIM(limit_item) = ''",
+         index="CREATE INDEX IF NOT EXISTS idx_rule_limits_empty_item ON coverage_limits(id) "
+               "WHERE TRIM(limit_item) = ''"),
+    Rule("limits_unparsed_amount", "warning",
+         "coverage_amount_hkd has text that numeric_fields.parse_amount could not read",
+         ("coverage_limits.coverage_amount_hkd", "coverage_limits.coverage_amount_value"),
+         """
+            SELECT id, provider_key, limit_item, coverage_amount_hkd
+            FROM coverage_limits
+            WHERE coverage_amount_value IS NULL AND TRIM(COALESCE(coverage_amount_hkd, '')) NOT IN ('', 'N/A', '-')
+         """,
+         index="""
+            CREATE INDEX IF NOT EXISTS idx_rule_limits_unparsed_amount ON coverage_limits(id)
+            WHERE coverage_amount_value IS NULL AND TRIM(COALESCE(coverage_amount_hkd, '')) NOT IN ('', 'N/A', '-')
+         """),
+    Rule("limits_negative_amount", "error",
+         "coverage_amount_value is negative",
+         ("coverage_limits.coverage_amount_value",),
+         "SELECT id, provider_key, limit_item, coverage_amount_hkd FROM coverage_limits WHERE coverage_amount_value < 0",
+         index="CREATE INDEX IF NOT EXISTS idx_rule_limits_negative_amount ON coverage_limits(id) "
+               "WHERE coverage_amount_value < 0"),
+    Rule("providers_unparsed_percentage", "warning",
+         "coverage_percentage has text that numeric_fields.parse_percentage could not read",
+         ("pet_insurance_comparison.coverage_percentage", "pet_insurance_comparison.coverage_percentage_value"),
+         """
+            SELECT provider_key, coverage_percentage
+            FROM pet_insurance_comparison
+            WHERE coverage_percentage_value IS NULL
+              AND TRIM(COALESCE(coverage_percentage, '')) NOT IN ('', 'N/A', '-')
+         """),
+    Rule("providers_percentage_range", "error",
+         "coverage_percentage_value is outside 0-100",
+         ("pet_insurance_comparison.coverage_percentage_value",),
+         """
+            SELECT provider_key, coverage_percentage
+            FROM pet_insurance_comparison
+            WHERE coverage_percentage_value < 0 OR coverage_percentage_value > 100
+         """),
+    Rule("providers_missing_company", "warning",
+         "company_name could not be split out of insurance_provider",
+         ("pet_insurance_comparison.company_name",),
+         "SELECT provider_key, insurance_provider FROM pet_insurance_comparison "
+         "WHERE TRIM(COALESCE(company_name, '')) = ''"),
+
+    # Served DB: pet_insurance.db
+    Rule("product_orphan_provider", "error",
+         "product.provider_id has no row in insurance_provider",
+         ("product.provider_id", "insurance_provider.company_id"),
+         """
+            SELECT p.insurance_id, p.insurance_name, p.provider_id
+            FROM product p
+            WHERE p.provider_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM insurance_provider ip WHERE ip.company_id = p.provider_id)
+         """),
+    Rule("coverage_limit_orphan_product", "error",
+         "coverage_limit.product_id has no row in product",
+         ("coverage_limit.product_id", "product.insurance_id"),
+         """
+            SELECT cl.product_id, cl.coverage_id
+            FROM coverage_limit cl
+            WHERE NOT EXISTS (SELECT 1 FROM product p WHERE p.insurance_id = cl.product_id)
+         """),
+    Rule("coverage_limit_orphan_coverage", "error",
+         "coverage_limit.coverage_id has no row in coverage_list",
+         ("coverage_limit.coverage_id", "coverage_list.coverage_id"),
+         """
+            SELECT cl.product_id, cl.coverage_id
+            FROM coverage_limit cl
+            WHERE NOT EXISTS (SELECT 1 FROM coverage_list lst WHERE lst.coverage_id = cl.coverage_id)
+         """),
+    Rule("sub_coverage_orphan_limit", "error",
+         "sub_coverage_limit has no parent row in coverage_limit",
+         ("sub_coverage_limit.product_id", "sub_coverage_limit.parent_coverage_id", "coverage_limit.product_id"),
+         """
+            SELECT s.sub_coverage_id, s.product_id, s.parent_coverage_id
+            FROM sub_coverage_limit s
+            WHERE NOT EXISTS (SELECT 1 FROM coverage_limit cl
+                              WHERE cl.product_id = s.product_id AND cl.coverage_id = s.parent_coverage_id)
+         """),
+    Rule("product_tag_zh_missing", "info",
+         "product has a tag but no tag_zh",
+         ("product.tag", "product.tag_zh"),
+         """
+            SELECT insurance_id, insurance_name, tag
+            FROM product
+            WHERE TRIM(COALESCE(tag, '')) <> '' AND TRIM(COALESCE(tag_zh, '')) = ''
+         """),
+    zh_missing_rule("insurance_provider", "company_name", ("company_id",)),
+    zh_missing_rule("product", "insurance_name", ("insurance_id",)),
+    zh_missing_rule("product", "remark", ("insurance_id",)),
+    zh_missing_rule("product", "coinsurance", ("insurance_id",)),
+    zh_missing_rule("coverage_list", "coverage_type", ("coverage_id",)),
+    zh_missing_rule("coverage_limit", "remark", ("product_id", "coverage_id")),
+    zh_missing_rule("sub_coverage_limit", "sub_coverage_name", ("sub_coverage_id",)),
+    zh_missing_rule("sub_coverage_limit", "sub_coverage_remark", ("sub_coverage_id",)),
+)
+
+
+def index_name(rule):
+    return INDEX_NAME_RE.search(rule.index).group(1) if rule.index else None
+
+
+def schema_columns(conn):
+    """{"table.column", ...} for every column of every table in `conn`."""
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return {f"{table}.{row[1]}" for table in tables for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def create_rule_indexes(conn, rules=RULES):
+    """Create the partial indexes of the rules whose columns exist. Called with the other build indexes."""
+    available = schema_columns(conn)
+    for rule in rules:
+        if rule.index and set(rule.columns) <= available:
+            conn.execute(rule.index)
+
+
+def run_rule(conn, rule, samples=SAMPLES):
+    """Returns (violation count, up to `samples` example rows as dicts)."""
+    if rule.probe is not None:
+        count = conn.execute(rule.probe).fetchone()[0]
+        if not count:
+            return 0, []
+        # The probe already counted; stop reading at the last sample
+        cursor = conn.execute(f"SELECT * FROM ({rule.sql}) LIMIT {samples}")
+        names = [d[0] for d in cursor.description]
+        return count, [dict(zip(names, row)) for row in cursor.fetchall()]
+    # The window count comes out of the same pass as the samples
+    cursor = conn.execute(f"SELECT COUNT(*) OVER () AS violations, * FROM ({rule.sql}) LIMIT {samples}")
+    names = [d[0] for d in cursor.description][1:]
+    rows = cursor.fetchall()
+    count = rows[0][0] if rows else 0
+    return count, [dict(zip(names, row[1:])) for row in rows]
+
+
+def validate(conn, rules=RULES, thresholds=THRESHOLDS, samples=SAMPLES, database=None):
+    """Run every applicable rule on `conn` and return the report dict."""
+    start = time.perf_counter()
+    available = schema_columns(conn)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    results = []
+    counts = {severity: 0 for severity in SEVERITIES}
+    for rule in rules:
+        result = {"rule": rule.name, "severity": rule.severity, "description": rule.description}
+        missing = sorted(set(rule.columns) - available)
+        if missing:
+            result.update(skipped=True, missing_columns=missing)
+        elif rule.index and index_name(rule) not in indexes:
+            # Without it the rule is a full scan; builds create it, as does --create-indexes
+            result.update(skipped=True, missing_index=index_name(rule))
+        else:
+            rule_start = time.perf_counter()
+            with instrumentation.stage(f"rule:{rule.name}"):
+                violations, examples = run_rule(conn, rule, samples)
+            result.update(skipped=False, violations=violations, samples=examples,
+                          elapsed_ms=round((time.perf_counter() - rule_start) * 1000, 3))
+            counts[rule.severity] += violations
+        results.append(result)
+
+    exceeded = {severity: n for severity, n in counts.items()
+                if thresholds.get(severity) is not None and n > thresholds[severity]}
+    return {
+        "database": database,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "ok": not exceeded,
+        "counts": counts,
+        "thresholds": dict(thresholds),
+        "exceeded": exceeded,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        "rules": results,
+    }
+
+
+def print_report(report):
+    ran = [r for r in report["rules"] if not r["skipped"]]
+    unindexed = [r["missing_index"] for r in report["rules"] if r.get("missing_index")]
+    print(f"Validation: {len(ran)} rules in {report['elapsed_ms']:.1f} ms "
+          f"({len(report['rules']) - len(ran)} skipped: tables not in this DB"
+          + (f" or index missing: {', '.join(unindexed)}; run with --create-indexes" if unindexed else "") + ").")
+    for result in ran:
+        if result["violations"]:
+            print(f"  {result['severity'].upper():<7} {result['rule']}: {result['violations']} rows - "
+                  f"{result['description']}")
+            for sample in result["samples"]:
+                print(f"            {sample}")
+    counts = ", ".join(f"{n} {severity}s" for severity, n in report["counts"].items())
+    print(f"Validation {'passed' if report['ok'] else 'FAILED'}: {counts}.")
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+
+@instrumentation.staged(name="validate")
+def gate(conn, thresholds=THRESHOLDS, report_path=None, database=None):
+    """Validate, print and optionally save the report; raise ValidationError if a threshold is exceeded."""
+    report = validate(conn, thresholds=thresholds, database=database)
+    print_report(report)
+    if report_path:
+        write_report(report, report_path)
+    if not report["ok"]:
+        raise ValidationError(report)
+    return report
+
+
+def thresholds_from_args(args):
+    return {**THRESHOLDS, "error": args.max_errors, "warning": args.max_warnings}
+
+
+def add_threshold_arguments(parser):
+    parser.add_argument("--max-errors", type=int, default=THRESHOLDS["error"],
+                        help=f"error-severity rows allowed (default: {THRESHOLDS['error']})")
+    parser.add_argument("--max-warnings", type=int, default=THRESHOLDS["warning"],
+                        help="warning-severity rows allowed (default: unlimited)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the insurance databases.")
+    parser.add_argument("--db", action="append",
+                        help=f"database to validate, repeatable (default: {BUILD_DB_PATH} and {SERVED_DB_PATH})")
+    parser.add_argument("--report", help="write the JSON report (a list, one entry per DB) to this path")
+    parser.add_argument("--create-indexes", action="store_true",
+                        help="create missing rule indexes first (opens the DB read-write)")
+    add_threshold_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    reports = []
+    with instrumentation.run("validate_insurance_db", args):
+        for db_path in args.db or [BUILD_DB_PATH, SERVED_DB_PATH]:
+            if not os.path.exists(db_path):
+                print(f"Skipping {db_path}: not found.")
+                continue
+            print(f"\n{db_path}")
+            mode = "rw" if args.create_indexes else "ro"
+            conn = instrumentation.trace_connection(sqlite3.connect(f"file:{db_path}?mode={mode}", uri=True))
+            try:
+                if args.create_indexes:
+                    with conn:
+                        create_rule_indexes(conn)
+                conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+                report = validate(conn, thresholds=thresholds_from_args(args), database=db_path)
+            finally:
+                conn.close()
+            print_report(report)
+            reports.append(report)
+
+    if args.report:
+        write_report(reports, args.report)
+        print(f"\nReport written to {args.report}")
+    if not all(report["ok"] for report in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
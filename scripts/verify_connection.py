@@ -1,17 +1,81 @@
-import requests
+#!/usr/bin/env python3
+"""
+Verify the backend connection, or load-test it
+
+With no arguments, sends one OPTIONS and one POST to /api/chat and checks
+the CORS header and the response shape (the original smoke test).
+
+`load` runs an asyncio load generator over a pool of keep-alive
+connections. It replays a weighted mix of requests against /api/chat,
+/api/chat/ask (with pre-created sessions), /clinics and the insurance
+endpoints, either closed-loop at a fixed concurrency or open-loop at a
+target RPS, and reports p50/p95/p99 latency, throughput and error rates
+per endpoint. In RPS mode latency is measured from each request's
+scheduled start, so a slow server is not hidden by the generator falling
+behind.
+
+Usage:
+    python3 scripts/verify_connection.py
+    python3 scripts/verify_connection.py load [--concurrency 20 | --rps 50] [--duration 30]
+        [--mix clinics=4,insurance-companies=2,ask=1] [--output report.json]
+"""
+
+import argparse
+import asyncio
 import json
+import random
+import ssl
 import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+try:
+    import requests
+except ImportError:  # only the smoke test needs it
+    requests = None
+
+BASE_URL = "http://localhost:8000"
+
+SAMPLE_QUERIES = [
+    "Do you cover dental?",
+    "What is the waiting period for illness?",
+    "Are hereditary conditions covered for dogs?",
+    "How much is the surgery limit?",
+    "Does the plan cover MRI scans?",
+    "Is there an age limit for cats?",
+]
+
+# name: (method, path, needs a session)
+SCENARIOS = {
+    "chat": ("POST", "/api/chat", False),
+    "ask": ("POST", "/api/chat/ask", True),
+    "providers": ("GET", "/api/chat/providers", False),
+    "clinics": ("GET", "/clinics", False),
+    "emergency-clinics": ("GET", "/emergency-clinics", False),
+    "insurance-companies": ("GET", "/insurance-companies", False),
+    "insurance-products": ("GET", "/insurance-products", False),
+    "coverage-list": ("GET", "/coverage-list", False),
+    "coverage-limits": ("GET", "/coverage-limits", False),
+    "insurance-comparison": ("GET", "/insurance-comparison?pet_type=dog", False),
+}
+
+DEFAULT_MIX = "clinics=4,emergency-clinics=1,insurance-companies=2,insurance-products=2,coverage-limits=1,ask=1"
+
 
 def test_rag_connection():
     url = "http://localhost:8000/api/chat"
-    
+    if requests is None:
+        print("❌ FAILURE: the requests package is required for the connection check")
+        return False
+
     # 1. Test OPTIONS (CORS Preflight)
     print("Testing OPTIONS (CORS)...")
     try:
         options_resp = requests.options(url)
         print(f"Status: {options_resp.status_code}")
         print(f"Headers: {dict(options_resp.headers)}")
-        
+
         if options_resp.headers.get("Access-Control-Allow-Origin") != "*":
             print("❌ FAILURE: Missing Access-Control-Allow-Origin header")
             return False
@@ -26,33 +90,377 @@ def test_rag_connection():
     print("\nTesting POST (Chat Request)...")
     payload = {"query": "Do you cover dental?"}
     try:
-        # Note: requests.post doesn't automatically send OPTIONS unless configured, 
+        # Note: requests.post doesn't automatically send OPTIONS unless configured,
         # but browsers will. We check if POST succeeds with payload.
         post_resp = requests.post(url, json=payload)
         print(f"Status: {post_resp.status_code}")
-        
+
         if post_resp.status_code != 200:
             print(f"❌ FAILURE: Expected 200, got {post_resp.status_code}")
             print(f"Response: {post_resp.text}")
             return False
-            
+
         data = post_resp.json()
-        
+
         # Verify JSON structure
         if "answer" not in data:
             print("❌ FAILURE: Response JSON missing 'answer' field")
             return False
-            
+
         print(f"Response Body: {json.dumps(data, indent=2)}")
         print("✅ SUCCESS: Backend is ready for frontend connection!")
         return True
-        
+
     except Exception as e:
         print(f"❌ FAILURE: Error during POST request: {e}")
         return False
 
-if __name__ == "__main__":
-    if test_rag_connection():
-        sys.exit(0)
+
+class HTTPConnection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, reader, writer, host):
+        self.reader = reader
+        self.writer = writer
+        self.host = host
+        self.reusable = True
+
+    @classmethod
+    async def open(cls, host, port, use_tls):
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl.create_default_context() if use_tls else None)
+        return cls(reader, writer, host)
+
+    async def request(self, method, path, body=None):
+        """Send one request and return (status, body bytes)."""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", "Accept-Encoding: identity"]
+        if body is not None:
+            lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("connection", "").lower() == "close":
+            self.reusable = False
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return status, b""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            return status, await self._read_chunked()
+        if "content-length" in headers:
+            return status, await self.reader.readexactly(int(headers["content-length"]))
+        self.reusable = False
+        return status, await self.reader.read()
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                while await self.reader.readuntil(b"\r\n") != b"\r\n":  # trailers
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """At most `size` connections to one origin, reused across requests."""
+
+    def __init__(self, base_url, size):
+        parts = urlsplit(base_url)
+        self.use_tls = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.use_tls else 80)
+        self.prefix = parts.path.rstrip("/")
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def request(self, method, path, body=None):
+        async with self.slots:
+            for attempt in range(2):
+                reused = bool(self.idle)
+                conn = self.idle.pop() if reused else await self._open()
+                try:
+                    status, data = await conn.request(method, self.prefix + path, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    # The server may have closed an idle keep-alive connection; retry once on a new one
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                if conn.reusable:
+                    self.idle.append(conn)
+                else:
+                    conn.close()
+                return status, data
+
+    async def _open(self):
+        self.opened += 1
+        return await HTTPConnection.open(self.host, self.port, self.use_tls)
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+
+def parse_mix(text):
+    """Parse `name=weight,...` into a list of (scenario, weight)."""
+    mix = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix.append((name, float(weight or 1)))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError("the mix needs at least one scenario with a positive weight")
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, scenario, latency_ms, status=None, error=None):
+        self.latencies.setdefault(scenario, []).append(latency_ms)
+        if error is not None:
+            counts = self.errors.setdefault(scenario, {})
+            counts[error] = counts.get(error, 0) + 1
+        else:
+            counts = self.statuses.setdefault(scenario, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def summary(self, elapsed):
+        def summarize(latencies, statuses, errors):
+            latencies = sorted(latencies)
+            failed = sum(count for status, count in statuses.items() if status >= 400) + sum(errors.values())
+            return {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+                "error_rate": round(failed / len(latencies), 4) if latencies else 0.0,
+                "latency_ms": {
+                    "p50": percentile(latencies, 50),
+                    "p95": percentile(latencies, 95),
+                    "p99": percentile(latencies, 99),
+                    "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                    "max": latencies[-1] if latencies else None,
+                },
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "errors": errors,
+            }
+
+        scenarios = {name: summarize(self.latencies[name], self.statuses.get(name, {}), self.errors.get(name, {}))
+                     for name in sorted(self.latencies)}
+        all_statuses, all_errors = {}, {}
+        for counts, merged in ((self.statuses, all_statuses), (self.errors, all_errors)):
+            for per_scenario in counts.values():
+                for key, count in per_scenario.items():
+                    merged[key] = merged.get(key, 0) + count
+        overall = summarize([ms for values in self.latencies.values() for ms in values], all_statuses, all_errors)
+        return overall, scenarios
+
+
+class LoadTest:
+    def __init__(self, args, mix):
+        self.args = args
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.rng = random.Random(args.seed)
+        self.pool = ConnectionPool(args.base_url, args.connections)
+        self.stats = LoadStats()
+        self.sessions = []
+        self.recording = False
+
+    async def create_sessions(self):
+        for _ in range(self.args.sessions):
+            status, data = await self.pool.request("POST", "/api/chat/session", b"")
+            if status != 200:
+                raise RuntimeError(f"creating a chat session returned HTTP {status}")
+            session_id = json.loads(data)["session_id"]
+            if self.args.provider:
+                body = json.dumps({"provider": self.args.provider}).encode()
+                status, _ = await self.pool.request("POST", f"/api/chat/session/{session_id}/provider", body)
+                if status != 200:
+                    raise RuntimeError(f"selecting provider '{self.args.provider}' returned HTTP {status}")
+            self.sessions.append(session_id)
+
+    def build_request(self, scenario):
+        method, path, needs_session = SCENARIOS[scenario]
+        if method != "POST":
+            return method, path, None
+        payload = {"query": self.rng.choice(SAMPLE_QUERIES)}
+        if needs_session:
+            payload["session_id"] = self.rng.choice(self.sessions)
+        return method, path, json.dumps(payload).encode()
+
+    async def fire(self, scenario, scheduled=None):
+        method, path, body = self.build_request(scenario)
+        start = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(self.pool.request(method, path, body), self.args.timeout)
+            status, error = status, None
+        except asyncio.TimeoutError:
+            status, error = None, "timeout"
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            status, error = None, type(e).__name__
+        if self.recording:
+            self.stats.record(scenario, round((time.perf_counter() - start) * 1000, 3), status, error)
+
+    def pick(self):
+        return self.rng.choices(self.names, self.weights)[0]
+
+    async def run_closed_loop(self, deadline):
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.fire(self.pick())
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def run_open_loop(self, deadline):
+        interval = 1.0 / self.args.rps
+        next_at = time.perf_counter()
+        tasks = set()
+        while next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self.fire(self.pick(), scheduled=next_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += interval
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run(self):
+        if "ask" in self.names:
+            await self.create_sessions()
+        run = self.run_open_loop if self.args.rps else self.run_closed_loop
+        try:
+            if self.args.warmup > 0:
+                await run(time.perf_counter() + self.args.warmup)
+            self.recording = True
+            start = time.perf_counter()
+            await run(start + self.args.duration)
+            return time.perf_counter() - start
+        finally:
+            self.pool.close()
+
+
+def print_summary(overall, scenarios):
+    print(f"{'endpoint':<22} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for name, result in list(scenarios.items()) + [("TOTAL", overall)]:
+        latency = result["latency_ms"]
+        print(f"{name:<22} {result['requests']:>7} {result['throughput_rps'] or 0:>8.1f} "
+              f"{result['error_rate'] * 100:>6.2f} " +
+              " ".join(f"{latency[key] if latency[key] is not None else float('nan'):>8.1f}"
+                       for key in ("p50", "p95", "p99")))
+    if overall["errors"]:
+        print(f"Errors: {overall['errors']}")
+
+
+def run_load_test(args):
+    mix = parse_mix(args.mix)
+    with_sessions = [name for name, weight in mix if weight > 0 and SCENARIOS[name][2]]
+    if with_sessions and args.sessions < 1:
+        raise ValueError(f"--sessions must be at least 1 for {', '.join(with_sessions)}")
+    mode = f"{args.rps} rps" if args.rps else f"concurrency {args.concurrency}"
+    print(f"Load testing {args.base_url} for {args.duration}s ({mode}, {args.connections} connections)...")
+
+    test = LoadTest(args, mix)
+    try:
+        elapsed = asyncio.run(test.run())
+    except (OSError, RuntimeError) as e:
+        print(f"❌ FAILURE: {e}")
+        return False
+    overall, scenarios = test.stats.summary(elapsed)
+    print_summary(overall, scenarios)
+
+    if args.output:
+        report = {
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {
+                "base_url": args.base_url, "mode": "open" if args.rps else "closed",
+                "rps": args.rps, "concurrency": None if args.rps else args.concurrency,
+                "connections": args.connections, "duration_s": args.duration, "warmup_s": args.warmup,
+                "mix": dict(mix), "sessions": len(test.sessions), "provider": args.provider,
+                "seed": args.seed,
+            },
+            "elapsed_s": round(elapsed, 3),
+            "connections_opened": test.pool.opened,
+            "overall": overall,
+            "endpoints": scenarios,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return overall["error_rate"] <= args.max_error_rate
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or load-test the PetWell backend.")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("check", help="one-shot CORS and /api/chat check (default)")
+
+    load = sub.add_parser("load", help="run a load test")
+    load.add_argument("--base-url", default=BASE_URL, help=f"server URL (default: {BASE_URL})")
+    rate = load.add_mutually_exclusive_group()
+    rate.add_argument("--concurrency", type=int, default=10, help="closed-loop workers (default: 10)")
+    rate.add_argument("--rps", type=float, help="open-loop target requests per second")
+    load.add_argument("--connections", type=int, help="connection pool size (default: concurrency, or 64 with --rps)")
+    load.add_argument("--duration", type=float, default=30, help="measured seconds (default: 30)")
+    load.add_argument("--warmup", type=float, default=2, help="unmeasured seconds first (default: 2)")
+    load.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted scenarios (default: {DEFAULT_MIX}; "
+                                                         f"available: {', '.join(SCENARIOS)})")
+    load.add_argument("--sessions", type=int, default=20, help="chat sessions for 'ask' (default: 20)")
+    load.add_argument("--provider", help="provider selected on each chat session")
+    load.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds (default: 30)")
+    load.add_argument("--max-error-rate", type=float, default=0.01,
+                      help="exit non-zero above this error rate (default: 0.01)")
+    load.add_argument("--seed", type=int, default=0, help="random seed for the mix (default: 0)")
+    load.add_argument("--output", help="write a JSON report here")
+
+    args = parser.parse_args(argv)
+    if args.command == "load" and args.connections is None:
+        args.connections = 64 if args.rps else args.concurrency
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "load":
+        try:
+            ok = run_load_test(args)
+        except ValueError as e:
+            print(f"❌ FAILURE: {e}")
+            ok = False
     else:
-        sys.exit(1)
+        ok = test_rag_connection()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import csv
+import os
+import sqlite3
+
+import pytest
+
+import build_insurance_db as build
+from bench_insurance_pipeline import generate_csvs
+from publish_served_db import generate_served_db
+
+NO_SERVED = ["--no-comparisons", "--no-search"]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Synthetic CSVs in a temp Data/ dir, with the build pointed at them."""
+    directory = tmp_path / "Data"
+    directory.mkdir()
+    insurance_csv, limits_csv = generate_csvs(str(directory), providers=50, limit_rows=200, seed=1)
+    monkeypatch.setattr(build, "DATA_DIR", str(directory))
+    monkeypatch.setattr(build, "INSURANCE_CSV", insurance_csv)
+    monkeypatch.setattr(build, "LIMITS_CSV", limits_csv)
+    monkeypatch.setattr(build, "DB_PATH", str(tmp_path / "insurance.db"))
+    return directory
+
+
+@pytest.fixture
+def served_db(tmp_path):
+    path = str(tmp_path / "pet_insurance.db")
+    generate_served_db(path, products=10, seed=1)
+    return path
+
+
+def test_unchanged_incremental_leaves_served_db_alone(data_dir, served_db):
+    build.main(["--served-db", served_db])
+    before = os.stat(served_db).st_mtime_ns
+
+    build.main(["--incremental", "--served-db", served_db])
+
+    assert os.stat(served_db).st_mtime_ns == before
+
+
+def test_full_build_skips_current_served_tables(data_dir, served_db, capsys):
+    build.main(["--served-db", served_db])
+    capsys.readouterr()
+
+    build.main(["--served-db", served_db])
+
+    out = capsys.readouterr().out
+    assert "Comparison tables are up to date." in out
+    assert "Search index is up to date." in out
+
+
+@pytest.mark.parametrize("mode", [[], ["--incremental"]])
+def test_served_tables_rebuilt_when_sources_change(data_dir, served_db, capsys, mode):
+    build.main(["--served-db", served_db])
+    conn = sqlite3.connect(served_db)
+    with conn:
+        conn.execute("UPDATE product SET insurance_name = 'Renamed' WHERE insurance_id = 1")
+    conn.close()
+    capsys.readouterr()
+
+    build.main(mode + ["--served-db", served_db])
+
+    out = capsys.readouterr().out
+    assert "Materialized" in out and "Indexed" in out
+    conn = sqlite3.connect(served_db)
+    names = {row[0] for row in conn.execute(
+        "SELECT insurance_name FROM product_coverage_comparison WHERE product_id = 1")}
+    conn.close()
+    assert names == {"Renamed"}
+
+
+def edit_first_provider(path, column, value):
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    rows[1][rows[0].index(column)] = value
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def provider_diff(path):
+    conn = sqlite3.connect(build.DB_PATH)
+    try:
+        return build.diff_rows(conn, "pet_insurance_comparison",
+                               build.keyed_provider_rows(build.iter_csv_rows(path, build.parse_provider_row)))
+    finally:
+        conn.close()
+
+
+def test_unchanged_csv_diffs_clean(data_dir):
+    build.main(NO_SERVED)
+
+    assert provider_diff(build.INSURANCE_CSV) == ([], [], [])
+
+
+def test_one_row_edit_is_one_change(data_dir, capsys):
+    build.main(NO_SERVED)
+    edit_first_provider(build.INSURANCE_CSV, "Cancer Cash (HKD)", "12,345")
+
+    inserted, changed, deleted = provider_diff(build.INSURANCE_CSV)
+    assert (len(inserted), len(changed), len(deleted)) == (0, 1, 0)
+
+    capsys.readouterr()
+    build.main(["--incremental"] + NO_SERVED)
+    assert "Providers: 0 inserted, 1 changed, 0 deleted." in capsys.readouterr().out
+
+    conn = sqlite3.connect(build.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM pet_insurance_comparison WHERE cancer_cash_hkd = 12345").fetchone()[0] == 1
+    conn.close()
+
+
+def test_one_row_edit_writes_only_that_row(data_dir, capsys):
+    build.main(NO_SERVED)
+    conn = sqlite3.connect(build.DB_PATH)
+    with conn:
+        conn.execute("CREATE TABLE written (tbl TEXT, row_key TEXT)")
+        for table, key in build.ROW_KEY_COLUMNS.items():
+            for event in ("INSERT", "UPDATE"):
+                conn.execute(f"""CREATE TRIGGER audit_{table}_{event.lower()} AFTER {event} ON {table}
+                                 BEGIN INSERT INTO written VALUES ('{table}', NEW.{key}); END""")
+    conn.close()
+    edit_first_provider(build.INSURANCE_CSV, "Coverage Percentage", "55%")
+
+    build.main(["--incremental"] + NO_SERVED)
+
+    conn = sqlite3.connect(build.DB_PATH)
+    try:
+        written = conn.execute("SELECT DISTINCT tbl, row_key FROM written").fetchall()
+        value = conn.execute("SELECT coverage_percentage_value FROM pet_insurance_comparison WHERE provider_key = ?",
+                             (written[0][1],)).fetchone()[0]
+    finally:
+        conn.close()
+    assert len(written) == 1 and written[0][0] == "pet_insurance_comparison"
+    assert value == 55.0
+
+
+def provider_count():
+    conn = sqlite3.connect(build.DB_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM pet_insurance_comparison").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_incremental_after_data_dir_build_rebuilds_from_default(data_dir, tmp_path, capsys):
+    drops = tmp_path / "drops"
+    drops.mkdir()
+    generate_csvs(str(drops), providers=5, limit_rows=20, seed=2)
+    build.main(["--data-dir", str(drops), "--workers", "1"] + NO_SERVED)
+    assert provider_count() == 5
+    capsys.readouterr()
+
+    build.main(["--incremental"] + NO_SERVED)
+
+    assert "running a full rebuild" in capsys.readouterr().out
+    assert provider_count() == 50
+
+
+def test_incremental_after_default_build_diffs(data_dir, capsys):
+    build.main(NO_SERVED)
+    capsys.readouterr()
+
+    build.main(["--incremental"] + NO_SERVED)
+
+    assert "No source changes" in capsys.readouterr().out
@@ -0,0 +1,23 @@
+import pytest
+
+import clinic_pipeline as clinics
+
+DAY = clinics.MINUTES_PER_DAY
+
+
+@pytest.mark.parametrize("text, start", [("Mon: 6:00 PM – 12:00 AM", 18 * 60), ("Mon 12:00 PM - 12:00 AM", 12 * 60)])
+def test_range_ending_at_midnight_closes_that_day(text, start):
+    assert clinics.parse_opening_hours(text) == ([(start, DAY)], True)
+
+
+def test_overnight_range_runs_into_the_next_day():
+    intervals, _ = clinics.parse_opening_hours("Sun: 10:00 PM - 2:00 AM")
+
+    assert intervals == [(0, 2 * 60), (6 * DAY + 22 * 60, 7 * DAY)]
+
+
+def test_midnight_closing_every_day_is_not_open_all_week(capsys):
+    clinics.print_hours("Mon-Sun 12:00 PM - 12:00 AM")
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Mon 12:00 - Mon 24:00" and len(lines) == 7
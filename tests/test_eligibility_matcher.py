@@ -0,0 +1,24 @@
+import eligibility_matcher as matcher
+
+BLUE_CROSS = ("Insured age at Age 1 or above: Network Clinic 90% | Non-Network Clinic 70%\n"
+              "13 weeks to 11 months: All HK registered vets 50%")
+
+
+def product(insurance_id, coinsurance):
+    return {"insurance_id": insurance_id, "provider_id": insurance_id, "insurance_name": f"Plan {insurance_id}",
+            "min_age": "8 weeks", "max_age": "9 years", "suitable_pet_type": "cat, dog", "coinsurance": coinsurance}
+
+
+def test_reimbursement_rates_rank_as_the_owner_share():
+    rules = [matcher.compile_rule(product(1, "20% - Pet enrolled before Age 4")),
+             matcher.compile_rule(product(2, BLUE_CROSS))]
+    network = matcher.make_profile("p1", "dog", "Poodle", 3, "network")
+    non_network = matcher.make_profile("p2", "dog", "Poodle", 3, "non-network")
+    puppy = matcher.make_profile("p3", "dog", "Poodle", 0.5, "network")
+
+    results = {profile.profile_id: [(rule.insurance_id, coinsurance) for rule, coinsurance, _ in plans]
+               for profile, plans in matcher.match_profiles(rules, [network, non_network, puppy])}
+
+    assert results == {"p1": [(2, 10.0), (1, 20.0)], "p2": [(1, 20.0), (2, 30.0)], "p3": [(1, 20.0), (2, 50.0)]}
+    assert [(rule.insurance_id, band.percentage) for rule, band in matcher.match_profile(rules, network)] \
+        == results["p1"]
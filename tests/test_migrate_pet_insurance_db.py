@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+import migrate_pet_insurance_db as migrations
+from bench_insurance_pipeline import generate_legacy_db
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = str(tmp_path / "pet_insurance.db")
+    generate_legacy_db(path, rows=100, seed=1)
+    return path
+
+
+def connect(path):
+    return sqlite3.connect(path)
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def migrated_by_old_scripts(path, version):
+    """A DB the old scripts brought to `version`, with bilingual data and a column added later."""
+    migrations.migrate(path, target=version, backup=False)
+    conn = connect(path)
+    with conn:
+        conn.execute("UPDATE product SET insurance_name_zh = '產品'")
+        conn.execute("UPDATE insurance_provider SET company_name_zh = '甲'")
+        conn.execute("ALTER TABLE product ADD COLUMN tag TEXT")
+        conn.execute("UPDATE product SET tag = '#Popular'")
+    conn.execute("PRAGMA user_version = 0")
+    conn.close()
+
+
+def test_detects_pre_migration_shape(legacy_db):
+    conn = connect(legacy_db)
+    assert migrations.detect_version(conn) == 0
+    conn.close()
+
+
+def test_migrates_legacy_db_and_keeps_rows(legacy_db):
+    conn = connect(legacy_db)
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("product", "sub_coverage")}
+    conn.close()
+
+    assert migrations.migrate(legacy_db, backup=False) == migrations.LATEST_VERSION
+
+    conn = connect(legacy_db)
+    assert "Field4" not in columns(conn, "sub_coverage")
+    assert "insurance_name_zh" in columns(conn, "product")
+    for table, count in counts.items():
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == count
+    conn.close()
+
+
+@pytest.mark.parametrize("version", [1, 2, 3])
+def test_detects_version_with_extra_columns(legacy_db, version):
+    migrated_by_old_scripts(legacy_db, version)
+    conn = connect(legacy_db)
+    assert migrations.detect_version(conn) == version
+    conn.close()
+
+
+@pytest.mark.parametrize("version", [1, 3])
+def test_migrate_keeps_bilingual_data_and_extra_columns(legacy_db, version):
+    migrated_by_old_scripts(legacy_db, version)
+
+    assert migrations.migrate(legacy_db, backup=False) == migrations.LATEST_VERSION
+
+    conn = connect(legacy_db)
+    assert set(conn.execute("SELECT insurance_name_zh, tag FROM product")) == {("產品", "#Popular")}
+    assert set(conn.execute("SELECT company_name_zh FROM insurance_provider")) == {("甲",)}
+    conn.close()
+
+
+def test_rebuild_carries_unknown_columns(legacy_db):
+    conn = connect(legacy_db)
+    with conn:
+        conn.execute("ALTER TABLE product ADD COLUMN coinsurance TEXT")
+        conn.execute("UPDATE product SET coinsurance = '80%'")
+    conn.close()
+
+    migrations.migrate(legacy_db, backup=False)
+
+    conn = connect(legacy_db)
+    assert set(conn.execute("SELECT coinsurance FROM product")) == {("80%",)}
+    conn.close()
+
+
+def test_refuses_unrecognised_shape(legacy_db):
+    conn = connect(legacy_db)
+    with conn:
+        # Bilingual columns present but foreign keys of no known version
+        conn.execute("ALTER TABLE product ADD COLUMN insurance_name_zh TEXT")
+    conn.close()
+
+    with pytest.raises(SystemExit):
+        migrations.migrate(legacy_db, backup=False)
+
+    conn = connect(legacy_db)
+    assert migrations.get_version(conn) == 0
+    assert "Field4" in columns(conn, "sub_coverage")
+    conn.close()
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+from numeric_fields import (UNLIMITED_AGE, UNLIMITED_AMOUNT, parse_age_years, parse_amount, parse_percentage,
+                            register_functions)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("50,000", 50_000),
+    ("HK$8k", 8_000),
+    ("3萬", 30_000),
+    ("1.5 million", 1_500_000),
+    ("Unlimited", UNLIMITED_AMOUNT),
+    ("As charged", UNLIMITED_AMOUNT),
+    ("不設上限", UNLIMITED_AMOUNT),
+    ("HK$50,000 per lifetime", 50_000),
+    ("終身 HK$8萬", 80_000),
+    ("5000HKD", 5_000),
+    ("HK$20000hkd", 20_000),
+    ("20000hkd per year", 20_000),
+    ("HK$50,000.", 50_000),
+    ("5m", 5_000_000),
+    ("12 months", 12),
+    ("", None),
+    ("N/A", None),
+    ("Not covered", None),
+    (None, None),
+    (12000.0, 12_000),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("80%", 80.0),
+    ("90% | 70%", 90.0),
+    ("0.8", 80.0),
+    (0.8, 80.0),
+    (70, 70.0),
+    ("", None),
+])
+def test_parse_percentage(text, expected):
+    assert parse_percentage(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("13 weeks", 0.2491),
+    ("6 months", 0.5),
+    ("11歲", 11.0),
+    ("9 years", 9.0),
+    ("8", 8.0),
+    ("Lifetime", UNLIMITED_AGE),
+    ("終身", UNLIMITED_AGE),
+    ("No limit", UNLIMITED_AGE),
+    ("", None),
+])
+def test_parse_age_years(text, expected):
+    assert parse_age_years(text) == expected
+
+
+def test_sql_functions():
+    conn = sqlite3.connect(":memory:")
+    register_functions(conn)
+    assert conn.execute("SELECT parse_amount('HK$50,000 per lifetime'), parse_percentage('80%'), "
+                        "parse_age_years('Lifetime')").fetchone() == (50_000, 80.0, UNLIMITED_AGE)
+    conn.close()
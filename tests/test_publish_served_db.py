@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import stat
+
+import publish_served_db as publish
+
+
+def schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(conn.execute("SELECT type, name, sql FROM sqlite_master"
+                                   " WHERE name NOT LIKE 'sqlite_%' AND name != 'publish_info'"))
+    finally:
+        conn.close()
+
+
+def test_artifact_keeps_the_schema_and_rows(tmp_path):
+    source = str(tmp_path / "pet_insurance.db")
+    served = str(tmp_path / "database" / "pet_insurance.db")
+    publish.generate_served_db(source, products=10, seed=1)
+
+    publish.publish(source, served)
+
+    assert schema(served) == schema(source)
+    assert not os.stat(served).st_mode & stat.S_IWUSR
+    assert publish.file_stats(served)["freelist_count"] == 0
+    _, mismatches = publish.replay(source, served, rounds=1)
+    assert mismatches == []
@@ -0,0 +1,67 @@
+import rag_answer_cache as cache_module
+from rag_answer_cache import AnswerCache, history_key, normalize_query
+
+HISTORY = [
+    {"role": "user", "content": "Which plans cover cats?"},
+    {"role": "assistant", "content": "Plans A and B."},
+    {"role": "user", "content": "What about dental?"},
+    {"role": "assistant", "content": "Plan B covers dental."},
+]
+
+
+def key(query, provider="", history="[]"):
+    return (provider, normalize_query(query), history)
+
+
+def fetcher(answer):
+    return lambda: {"answer": answer}
+
+
+def test_history_key_uses_the_last_exchange():
+    other_opening = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello."}] + HISTORY[2:]
+
+    assert history_key(HISTORY) == history_key(other_opening)
+    assert history_key(HISTORY) != history_key(HISTORY[:2])
+    assert history_key(HISTORY, "full") != history_key(other_opening, "full")
+    assert history_key(HISTORY, "none") == history_key([]) == "[]"
+
+
+def test_similar_query_hits_within_the_same_provider_and_history():
+    cache = AnswerCache(100, 3600, similarity=0.8)
+    cache.get_or_fetch(key("Do you cover dental cleaning?", "blue_cross"), fetcher("yes"))
+
+    response, outcome = cache.get_or_fetch(key("do you cover dental cleanings", "blue_cross"), fetcher("fresh"))
+    assert (response["answer"], outcome) == ("yes", "semantic_hit")
+
+    _, outcome = cache.get_or_fetch(key("do you cover dental cleanings", "prudential"), fetcher("fresh"))
+    assert outcome == "miss"
+    _, outcome = cache.get_or_fetch(key("do you cover dental cleanings", "blue_cross", history_key(HISTORY)),
+                                    fetcher("fresh"))
+    assert outcome == "miss"
+
+
+def test_evicted_and_cleared_entries_leave_the_index():
+    cache = AnswerCache(2, 3600, similarity=0.99)
+    for query in ("do you cover dental", "what is the waiting period", "is my old cat eligible"):
+        cache.get_or_fetch(key(query), fetcher(query))
+
+    indexed = {k for postings in cache.index.values() for keys in postings.values() for k in keys}
+    assert indexed == set(cache.entries) and len(indexed) == 2
+
+    cache.clear()
+    assert cache.index == {}
+
+
+def test_index_scores_match_a_full_cosine_scan():
+    queries = [f"does plan {n} cover {pet} {item}" for n in range(10)
+               for pet in ("cats", "dogs") for item in ("dental", "surgery", "cancer")]
+    cache = AnswerCache(1000, 3600, similarity=0.01)
+    for query in queries:
+        cache._store(key(query), {"answer": query}, cache_module.trigram_vector(key(query)[1]))
+
+    probe = normalize_query("does plan 3 cover cat dental care")
+    vector = cache_module.trigram_vector(probe)
+    expected = max(queries, key=lambda q: sum(value * cache.entries[key(q)][2].get(bucket, 0.0)
+                                              for bucket, value in vector.items()))
+    response, outcome = cache.get_or_fetch(("", probe, "[]"), fetcher("fresh"))
+    assert (response["answer"], outcome) == (expected, "semantic_hit")
@@ -0,0 +1,37 @@
+import json
+
+import rag_history_compactor as compactor
+
+DISCLAIMER = "Please check the policy wording for full details."
+HISTORY = [
+    {"role": "user", "content": "What does plan A cover?"},
+    {"role": "assistant", "content": f"Plan A covers surgery. {DISCLAIMER}"},
+    {"role": "user", "content": "And plan B?"},
+    {"role": "assistant", "content": f"Plan B covers dental. {DISCLAIMER}"},
+]
+
+
+def test_repeated_sentence_is_kept_in_the_newest_turn():
+    turns = [turn for _, turn in compactor.deduplicate_turns(HISTORY, "")]
+
+    assert turns[1]["content"] == "Plan A covers surgery."
+    assert turns[3]["content"] == f"Plan B covers dental. {DISCLAIMER}"
+
+
+def test_verbatim_window_keeps_the_repeated_sentence():
+    compacted, report = compactor.compact_history(HISTORY, budget=40, summary_tokens=15)
+
+    assert report["folded_turns"] == 2
+    assert compacted[-1]["content"].endswith(DISCLAIMER)
+
+
+def test_compact_accepts_budget_after_the_subcommand(tmp_path, capsys):
+    request = tmp_path / "request.json"
+    request.write_text(json.dumps({"question": "q", "chat_history": HISTORY}), encoding="utf-8")
+
+    compactor.main(["compact", str(request), "--budget", "40", "--summary-tokens", "15"])
+    after = capsys.readouterr()
+    compactor.main(["--budget", "40", "--summary-tokens", "15", "compact", str(request)])
+
+    assert capsys.readouterr().out == after.out
+    assert json.loads(after.out)["chat_history"][0]["content"].startswith(compactor.SUMMARY_PREFIX)
@@ -0,0 +1,158 @@
+import json
+import os
+import random
+
+import pytest
+
+import sync_feed
+from publish_served_db import generate_served_db
+
+SUB_LIMITS = "sub-coverage-limits"
+
+
+def sub_limit(sub_coverage_id, sub_limit="1000"):
+    return {"sub_coverage_id": sub_coverage_id, "parent_coverage_id": 1, "product_id": 1,
+            "sub_coverage_name": "Surgery", "sub_coverage_name_zh": None, "sub_limit": sub_limit,
+            "sub_coverage_remark": None, "sub_coverage_remark_zh": None}
+
+
+def rows_of(*records):
+    dataset = sync_feed.DATASETS_BY_NAME[SUB_LIMITS]
+    return {sync_feed.row_key(dataset, record): record for record in records}
+
+
+@pytest.fixture
+def feed(tmp_path):
+    conn = sync_feed.open_feed(str(tmp_path / "feed" / "sync_feed.db"))
+    yield conn
+    conn.close()
+
+
+def release(conn, *records):
+    version, _ = sync_feed.record_release(conn, {SUB_LIMITS: rows_of(*records)}, {})
+    return version
+
+
+def test_merges_to_the_last_change_per_key(feed):
+    release(feed, sub_limit(1), sub_limit(2))                 # v1
+    release(feed, sub_limit(1, "2000"), sub_limit(2))         # v2
+    release(feed, sub_limit(1, "3000"))                       # v3: 2 deleted
+
+    delta = sync_feed.changes_between(feed, SUB_LIMITS, 1)
+
+    assert delta["since"] == 1 and delta["version"] == 3
+    assert delta["upserts"] == [sub_limit(1, "3000")]
+    assert delta["deletes"] == [{"sub_coverage_id": 2}]
+
+
+def test_row_created_and_deleted_inside_the_window_is_dropped(feed):
+    release(feed, sub_limit(1))                               # v1
+    release(feed, sub_limit(1), sub_limit(2))                 # v2: 2 created
+    release(feed, sub_limit(1))                               # v3: 2 deleted
+
+    delta = sync_feed.changes_between(feed, SUB_LIMITS, 1, 3)
+
+    assert delta["upserts"] == [] and delta["deletes"] == []
+
+
+def test_delete_then_recreate_is_an_upsert(feed):
+    release(feed, sub_limit(1))                               # v1
+    release(feed, sub_limit(2))                               # v2: 1 deleted
+    release(feed, sub_limit(1, "5000"), sub_limit(2))         # v3: 1 back
+
+    delta = sync_feed.changes_between(feed, SUB_LIMITS, 1, 3)
+
+    assert delta["upserts"] == [sub_limit(1, "5000"), sub_limit(2)]
+    assert delta["deletes"] == []
+
+
+def test_unchanged_data_records_no_version(feed):
+    assert release(feed, sub_limit(1)) == 1
+    assert release(feed, sub_limit(1)) == 1
+
+
+def test_since_zero_is_the_full_dataset(feed):
+    release(feed, sub_limit(1), sub_limit(2))
+    release(feed, sub_limit(2), sub_limit(3))
+
+    assert sync_feed.rows_at(feed, SUB_LIMITS, 2) == rows_of(sub_limit(2), sub_limit(3))
+    assert sync_feed.changes_between(feed, SUB_LIMITS, 0)["deletes"] == []
+
+
+@pytest.mark.parametrize("since, until", [(-1, None), (2, 1), (0, 5)])
+def test_rejects_versions_outside_the_feed(feed, since, until):
+    release(feed, sub_limit(1))
+    release(feed, sub_limit(2))
+
+    with pytest.raises(ValueError):
+        sync_feed.changes_between(feed, SUB_LIMITS, since, until)
+
+
+def test_every_delta_reproduces_the_served_db(tmp_path):
+    db_path = str(tmp_path / "pet_insurance.db")
+    feed_path = str(tmp_path / "sync_feed.db")
+    out_dir = str(tmp_path / "sync")
+    generate_served_db(db_path, products=20, seed=1)
+    rng = random.Random(1)
+    names = [dataset.name for dataset in sync_feed.DATASETS]
+
+    snapshots = {0: {name: {} for name in names}}
+    for step in range(4):
+        if step:
+            sync_feed.mutate_served_db(db_path, rng, 20)
+        version = sync_feed.release(db_path, feed_path, out_dir)
+        snapshots[version] = sync_feed.collect_rows(db_path, names)
+    assert version == 4
+
+    conn = sync_feed.open_feed(feed_path)
+    try:
+        for since in range(version + 1):
+            for until in range(since, version + 1):
+                for name in names:
+                    delta = sync_feed.changes_between(conn, name, since, until)
+                    assert sync_feed.apply_delta(snapshots[since][name], delta) == snapshots[until][name]
+    finally:
+        conn.close()
+
+
+def test_release_purges_datasets_that_are_no_longer_synced(tmp_path):
+    db_path = str(tmp_path / "pet_insurance.db")
+    feed_path = str(tmp_path / "sync_feed.db")
+    out_dir = str(tmp_path / "sync")
+    generate_served_db(db_path, products=5, seed=1)
+    sync_feed.release(db_path, feed_path, out_dir)
+    conn = sync_feed.open_feed(feed_path)
+    conn.execute("""INSERT INTO change VALUES ('clinics', 1, '["1"]', 'upsert', '{"clinic_id":"1"}')""")
+    conn.execute("""INSERT INTO row_state VALUES ('clinics', '["1"]', 'abc')""")
+    conn.close()
+    with open(os.path.join(out_dir, sync_feed.MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    manifest["endpoints"]["clinics.since-1"] = next(iter(manifest["endpoints"].values()))
+    with open(os.path.join(out_dir, sync_feed.MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+
+    sync_feed.release(db_path, feed_path, out_dir)
+
+    conn = sync_feed.open_feed(feed_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM change WHERE dataset = 'clinics'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM row_state WHERE dataset = 'clinics'").fetchone()[0] == 0
+    finally:
+        conn.close()
+    with open(os.path.join(out_dir, sync_feed.MANIFEST_NAME)) as f:
+        assert not any(name.startswith("clinics") for name in json.load(f)["endpoints"])
+
+
+def test_manifest_follows_a_republish_of_the_same_rows(tmp_path):
+    db_path = str(tmp_path / "pet_insurance.db")
+    feed_path = str(tmp_path / "sync_feed.db")
+    out_dir = str(tmp_path / "sync")
+    generate_served_db(db_path, products=5, seed=1)
+    assert sync_feed.release(db_path, feed_path, out_dir) == 1
+    os.utime(db_path, ns=(0, os.stat(db_path).st_mtime_ns + 10**9))
+
+    assert sync_feed.release(db_path, feed_path, out_dir) == 1
+
+    manifest = sync_feed.load_manifest(out_dir)
+    assert manifest["version"] == 1
+    assert manifest["source"] == sync_feed.file_identity(db_path)